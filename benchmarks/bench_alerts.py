@@ -0,0 +1,66 @@
+"""Alert engine cycle time over many tracked (user, product) pairs.
+
+Boards are written to a scratch SQLite store; the first cycle builds the pair
+arrays and simulates histories, later cycles reuse both and only re-evaluate.
+A sample of pairs is checked against the per-item rule the page would apply.
+
+    python benchmarks/bench_alerts.py --users 100000 --per-user 10 --products 100000
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from common import fmt_ms, timeit, write_synthetic_csv
+from utils import storage
+from utils.alerts import HISTORY_DAYS, AlertEngine, Outbox
+from utils.catalog import load_products
+from utils.price import configure_history_cache, price_history
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=100_000)
+    ap.add_argument("--per-user", type=int, default=10)
+    ap.add_argument("--products", type=int, default=100_000)
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp())
+    products = load_products(write_synthetic_csv(tmp / "products.csv", args.products))
+    ids = products["id"].astype(str).to_numpy()
+    rng = np.random.default_rng(0)
+    boards = {}
+    for u in range(args.users):
+        picks = rng.choice(len(ids), args.per_user, replace=False)
+        boards[f"user-{u}"] = {"saved": [], "tracked": {ids[p]: int(t) for p, t in
+                                                       zip(picks, rng.choice([5, 10, 15, 20], args.per_user))}}
+    boards["user-missing"] = {"saved": [], "tracked": {"P-0": 10}}
+    engine = storage.SqliteBackend(tmp / "wishdrop.db")
+    engine.put_many("boards", boards)
+    configure_history_cache(max_bytes=2 ** 30)
+
+    alerts = AlertEngine(engine=engine, outbox=Outbox(tmp / "wishdrop.db"), products=products)
+    cold = alerts.run_cycle()
+    print("cold cycle:", cold)
+    warm_t, warm = timeit(alerts.run_cycle, repeat=3)
+    print("warm cycle:", warm)
+    assert warm["queued"] == 0 and warm["triggered"] == cold["triggered"], "unchanged prices must not re-queue"
+    assert cold["unknown_products"] == 1
+
+    # Same answer as evaluating each pair on its own.
+    pairs = alerts.pairs()
+    _, _, _, hit = alerts.evaluate(pairs, products)
+    price = dict(zip(ids, products["price"].to_numpy(dtype=np.float32)))
+    for i in rng.choice(len(pairs) - 1, 2000, replace=False):
+        pid = pairs.product_ids[pairs.product[i]]
+        series = price_history(pid, price[pid], days=HISTORY_DAYS)
+        drop = max(0.0, (1 - price[pid] / series[-alerts.window:].max()) * 100)
+        assert hit[i] == (drop >= pairs.threshold[i]), (i, pid)
+
+    print(f"{len(pairs):,} pairs, {cold['triggered']:,} triggered: cold {fmt_ms(cold['total_s'])}, "
+          f"warm {fmt_ms(warm_t)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Per-click board persistence: whole-board saves vs the write-behind journal.
+
+Several processes (like Streamlit workers sharing one DB) each run threads
+that click save/unsave/track/untrack on their own boards. "rewrite" saves
+the whole board on every click, as the old Save Board button did; "journal"
+records each click with record_board_op() and lets the background writer
+flush and compact. The boards are checked against the clicks replayed in
+memory afterwards.
+
+    python benchmarks/bench_board_journal.py --processes 4 --threads 8 --clicks 2000 --board-size 50
+"""
+import argparse
+import multiprocessing
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from common import fmt_ms
+from utils import storage
+
+
+def clicks(board, n, size, seed):
+    rng = random.Random(str(seed))
+    for _ in range(n):
+        op = rng.choice(storage.BOARD_OPS)
+        yield board, op, f"P-{rng.randrange(1000, 1000 + 4 * size)}", (rng.randrange(5, 40) if op == "track" else None)
+
+
+def worker(db, mode, proc, threads, n, size, out):
+    storage.use_backend(storage.SqliteBackend(db))
+    latencies = [[] for _ in range(threads)]
+
+    def run(t):
+        for board, op, item, value in clicks(f"user-{proc}-{t}", n, size, (proc, t)):
+            t0 = time.perf_counter()
+            if mode == "rewrite":
+                storage.save_board(board, storage.apply_board_ops(storage.get_board(board), [(op, item, value)]))
+            else:
+                storage.record_board_op(board, op, item, value)
+            latencies[t].append(time.perf_counter() - t0)
+
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for th in pool:
+        th.start()
+    for th in pool:
+        th.join()
+    storage.flush_boards()
+    out.put(np.concatenate(latencies).tolist())
+
+
+def trial(mode, args):
+    db = Path(tempfile.mkdtemp()) / "boards.db"
+    engine = storage.SqliteBackend(db)
+    engine.put_many("boards", {
+        f"user-{p}-{t}": {"saved": [f"P-{1000 + i}" for i in range(args.board_size)],
+                          "tracked": {f"P-{1000 + i}": 10 for i in range(args.board_size // 5)}}
+        for p in range(args.processes) for t in range(args.threads)
+    })
+    start = engine.items("boards")
+    ctx = multiprocessing.get_context("fork")
+    out = ctx.Queue()
+    t0 = time.perf_counter()
+    procs = [ctx.Process(target=worker, args=(db, mode, p, args.threads, args.clicks, args.board_size, out))
+             for p in range(args.processes)]
+    for p in procs:
+        p.start()
+    latencies = np.array([x for _ in procs for x in out.get()])
+    for p in procs:
+        p.join()
+    wall = time.perf_counter() - t0
+
+    for p in range(args.processes):
+        for t in range(args.threads):
+            name = f"user-{p}-{t}"
+            ops = [(op, item, value) for _, op, item, value in clicks(name, args.clicks, args.board_size, (p, t))]
+            assert engine.get("boards", name) == storage.apply_board_ops(start[name], ops), (mode, name)
+    assert engine.pending_ops() == 0
+    return len(latencies) / wall, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--processes", type=int, default=4)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--clicks", type=int, default=2000, help="clicks per thread")
+    ap.add_argument("--board-size", type=int, default=50)
+    args = ap.parse_args()
+
+    total = args.processes * args.threads * args.clicks
+    print(f"{total:,} clicks from {args.processes} processes x {args.threads} threads, "
+          f"{args.board_size} saved items per board")
+    for mode in ("rewrite", "journal"):
+        rate, p50, p99 = trial(mode, args)
+        print(f"  {mode:<8} {rate:>10,.0f} clicks/s (until durable)   click p50 {fmt_ms(p50)}   p99 {fmt_ms(p99)}")
+    print("stored boards match the clicks")
+
+
+if __name__ == "__main__":
+    main()
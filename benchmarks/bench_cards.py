@@ -0,0 +1,120 @@
+"""Per-rerun cost of a 200-card grid: inline per-card elements vs shared prebuilt cards.
+
+"inline" is the grid as the pages built it before utils/cards.py: an image,
+title, caption and price block per card, formatted on every rerun. "cards"
+looks each card up in the shared CardSet and emits one element. Both keep
+the same buttons and expander per card. The card HTML is also timed on
+its own, cold (built) and warm (cached). Thumbnails are off
+(WISHDROP_THUMBNAILS=0): bench_images.py covers those.
+
+    python benchmarks/bench_cards.py --cards 200 --reruns 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from common import ROOT, fmt_ms, timeit, write_synthetic_csv
+
+GRID = r"""
+import streamlit as st
+from utils.cards import STORE_ICONS, get_cards
+from utils.catalog import load_products
+
+products = load_products()
+rows = list(range({cards}))
+df = products.take(rows)
+cols = st.columns(2, gap="large")
+cards = get_cards(products).render(rows) if {prebuilt} else [None] * len(rows)
+for i, (card, (_, row)) in enumerate(zip(cards, df.iterrows())):
+    pid = row["id"]
+    with cols[i % 2]:
+        if card is not None:
+            st.markdown(card, unsafe_allow_html=True)
+        else:
+            st.image(row["image_url"].replace("800x1000", "500x650"), use_container_width=True)
+            icon = STORE_ICONS.get(row["store"], "🛒")
+            st.markdown(f"### {{row['name']}}")
+            st.caption(f"{{icon}} {{row['store']}} • {{row['brand']}} • {{row['category']}}")
+            st.markdown(
+                f'''
+                <div style="font-size:18px; font-weight:600; margin-top:4px;">
+                    <span style="color:#d00000;">${{row['price']:.2f}}</span>
+                    &nbsp;&nbsp;
+                    <span style="color:gray; text-decoration: line-through;">${{row['msrp']:.2f}}</span>
+                    &nbsp;&nbsp;
+                    <span style="color:green;">-{{int(row['discount_pct'])}}%</span>
+                </div>
+                ''',
+                unsafe_allow_html=True
+            )
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            st.button("❤️ Save", key=f"save_{{pid}}")
+        with c2:
+            st.button("🔔 Track", key=f"track_{{pid}}")
+        with c3:
+            st.link_button("🛒 Buy", row["product_url"])
+        st.expander("📉 Best Price Trend & Recommendation", key=f"trend_{{pid}}", on_change="rerun")
+"""
+
+PROBE = r"""
+import json, statistics, sys, time
+sys.path.insert(0, {root!r})
+from streamlit.testing.v1 import AppTest
+out = {{}}
+for label, script in (("inline", {inline!r}), ("cards", {prebuilt!r})):
+    at = AppTest.from_string(script, default_timeout=600)
+    at.run()
+    assert not at.exception, [e.value for e in at.exception]
+    times = []
+    for _ in range({reruns}):
+        t0 = time.perf_counter(); at.run(); times.append(time.perf_counter() - t0)
+    out[label] = statistics.median(times)
+    out[label + "_elements"] = len(at.markdown) + len(at.caption)
+print(json.dumps(out))
+"""
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cards", type=int, default=200)
+    ap.add_argument("--reruns", type=int, default=10)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv = write_synthetic_csv(Path(tmp) / "products.csv", max(args.cards, 1000))
+        os.environ["WISHDROP_THUMBNAILS"] = "0"
+        env = dict(os.environ, PYTHONPATH=str(ROOT), WISHDROP_PRODUCTS=str(csv),
+                   WISHDROP_DB=str(Path(tmp) / "wishdrop.db"))
+        probe = PROBE.format(root=str(ROOT), reruns=args.reruns,
+                             inline=GRID.format(cards=args.cards, prebuilt=False),
+                             prebuilt=GRID.format(cards=args.cards, prebuilt=True))
+        out = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, env=env, check=True)
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{args.cards} cards, median rerun: inline {fmt_ms(r['inline'])} ({r['inline_elements']} text elements)   "
+              f"cards {fmt_ms(r['cards'])} ({r['cards_elements']} text elements)")
+
+        os.environ["WISHDROP_PRODUCTS"] = str(csv)
+        from utils.cards import CardSet
+        from utils.catalog import load_products
+
+        products = load_products(csv)
+        rows = np.arange(args.cards)
+        t_cold, html = timeit(lambda: CardSet(products, "500x650").render(rows), repeat=3)
+        cards = CardSet(products, "500x650")
+        cards.render(rows)
+        t_warm, warm = timeit(lambda: cards.render(rows))
+        assert warm == html
+        for row, card in zip(products.take(rows).itertuples(index=False), html):
+            assert f"&#36;{row.price:.2f}" in card and f"-{int(row.discount_pct)}%" in card, row.id
+        print(f"  card HTML only: build {fmt_ms(t_cold)}   cached {fmt_ms(t_warm)}")
+
+
+if __name__ == "__main__":
+    main()
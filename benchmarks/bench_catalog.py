@@ -0,0 +1,55 @@
+"""Cold/warm load time and RSS: pd.read_csv vs the memory-mapped catalog store.
+
+    python benchmarks/bench_catalog.py --rows 1000000
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from common import ROOT, write_synthetic_csv
+
+# Each measurement runs in a fresh interpreter so cold time and RSS are honest.
+PROBE = r"""
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+import pandas as pd
+from utils.catalog import load_products
+
+src, mode = {src!r}, {mode!r}
+load = (lambda: pd.read_csv(src)) if mode == "read_csv" else (lambda: load_products(src))
+t0 = time.perf_counter(); df = load(); cold = time.perf_counter() - t0
+t0 = time.perf_counter(); df = load(); warm = time.perf_counter() - t0
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({{"cold": cold, "warm": warm, "rss_mb": rss, "rows": len(df)}}))
+"""
+
+
+def probe(src, mode):
+    code = PROBE.format(root=str(ROOT), src=str(src), mode=mode)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = write_synthetic_csv(Path(tmp) / "products.csv", args.rows)
+        results = {"read_csv": probe(src, "read_csv")}
+        # First catalog probe pays the one-off CSV -> columnar conversion.
+        results["catalog (build)"] = probe(src, "catalog")
+        results["catalog"] = probe(src, "catalog")
+
+    print(f"{args.rows:,} rows")
+    print(f"{'path':<16}{'cold':>12}{'warm':>12}{'max RSS':>12}")
+    for name, r in results.items():
+        print(f"{name:<16}{r['cold'] * 1000:>9.1f} ms{r['warm'] * 1000:>9.3f} ms{r['rss_mb']:>9.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Discover rerun latency (headless AppTest) as the catalog grows.
+
+With paging, a rerun renders one page of cards whatever the feed size, so
+time-to-first-card should stay flat.
+
+    python benchmarks/bench_discover.py --sizes 1000,10000,100000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from common import ROOT, write_synthetic_csv
+
+PROBE = r"""
+import json, sys, time
+sys.path.insert(0, {root!r})
+from streamlit.testing.v1 import AppTest
+from utils import storage
+storage.save_profile("bench", {{"price_pref": "Mid-range", "brands": [], "stores": [], "categories": []}})
+at = AppTest.from_file({page!r}, default_timeout=600)
+at.run()
+t0 = time.perf_counter(); at.sidebar.selectbox[0].select("bench").run(); cold = time.perf_counter() - t0
+t0 = time.perf_counter(); at.sidebar.slider[0].set_value(15).run(); warm = time.perf_counter() - t0
+assert not at.exception, [e.value for e in at.exception]
+print(json.dumps({{"cold": cold, "warm": warm, "cards": len(at.expander), "caption": at.caption[0].value}}))
+"""
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,10000,100000")
+    args = ap.parse_args()
+    page = str(ROOT / "pages" / "2_🖼️_Discover.py")
+
+    for n in map(int, args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, PYTHONPATH=str(ROOT),
+                       WISHDROP_PRODUCTS=str(write_synthetic_csv(Path(tmp) / "products.csv", n)),
+                       WISHDROP_DB=str(Path(tmp) / "wishdrop.db"))
+            out = subprocess.run([sys.executable, "-c", PROBE.format(root=str(ROOT), page=page)],
+                                 capture_output=True, text=True, env=env, check=True)
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{n:>9,} products: first render {r['cold'] * 1000:8.1f} ms, rerun {r['warm'] * 1000:8.1f} ms, "
+              f"{r['cards']} cards ({r['caption']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Facet lists and counts: pandas per rerun vs the shared FacetCounts cube.
+
+"pandas" is what a rerun would otherwise do. For the option lists, that is
+the Profile page's three sorted(unique()) calls. For counts under filters,
+it is a masked value_counts per facet. "cube" is utils/facets.py answering
+from its bincount cube, and "scan" is its fallback over the rows, used for
+catalogs with too many distinct values for a cube. Counts are checked
+against pandas for random filter combinations.
+
+    python benchmarks/bench_facets.py --rows 10000000 --queries 20
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from common import fmt_ms, timeit
+import generate_products  # noqa: E402  (on sys.path via common)
+from utils.catalog import load_products
+from utils.facets import FACETS, FacetCounts
+from utils.index import PRICE_BANDS
+
+
+def pandas_counts(products, brands, stores, categories, price_pref, min_disc):
+    wanted = {"brand": brands, "store": stores, "category": categories}
+    base = products["discount_pct"].to_numpy() >= min_disc
+    if price_pref in PRICE_BANDS:
+        base &= PRICE_BANDS[price_pref](products)
+    out = {}
+    for col in FACETS:
+        mask = base.copy()
+        for other in FACETS:
+            if other != col and wanted[other]:
+                mask &= products[other].isin(wanted[other]).to_numpy()
+        out[col] = {k: int(v) for k, v in products[col][mask].value_counts().items() if v}
+    return out
+
+
+def random_filters(products, count, seed=0):
+    rng = np.random.default_rng(seed)
+    pick = lambda col: rng.choice(products[col].cat.categories, rng.integers(0, 4), replace=False).tolist()  # noqa: E731
+    return [(pick("brand"), pick("store"), pick("category"),
+             str(rng.choice(["Budget", "Mid-range", "Luxury Only"])), int(rng.integers(0, 60)))
+            for _ in range(count)]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=10_000_000)
+    ap.add_argument("--queries", type=int, default=20)
+    args = ap.parse_args()
+
+    store = Path(tempfile.mkdtemp()) / "catalog"
+    generate_products.main(["--rows", str(args.rows), "--format", "columnar", "--out", str(store)])
+    products = load_products(store)
+    print(f"{args.rows:,} products, {args.queries} filter combinations")
+
+    t_lists, lists = timeit(lambda: [sorted(products[col].unique().tolist()) for col in FACETS], repeat=3)
+    t_build, facets = timeit(lambda: FacetCounts(products), repeat=1)
+    t_cube, _ = timeit(lambda: facets.counts(), repeat=1)
+    assert [facets.values(col) for col in FACETS] == lists
+    print(f"  option lists: pandas {fmt_ms(t_lists)}   cube build {fmt_ms(t_build)} + first count {fmt_ms(t_cube)} "
+          f"({facets.cube.nbytes / 2 ** 20:.1f} MB)")
+
+    filters = random_filters(products, args.queries)
+    scan = FacetCounts(products)
+    scan.use_cube = False
+    t_pandas, expected = timeit(lambda: [pandas_counts(products, *f) for f in filters], repeat=1)
+    # Clearing the result cache times the counting itself.
+    t_cube, got = timeit(lambda: [facets.cache.clear() or facets.counts(*f) for f in filters], repeat=3)
+    t_scan, got_scan = timeit(lambda: [scan.cache.clear() or scan.counts(*f) for f in filters], repeat=1)
+    assert got == expected and got_scan == expected
+    t_cached, _ = timeit(lambda: [facets.counts(*f) for f in filters])
+    n = len(filters)
+    print(f"  counts per filter combination: pandas {fmt_ms(t_pandas / n)}   cube {fmt_ms(t_cube / n)}   "
+          f"scan {fmt_ms(t_scan / n)}   repeated {fmt_ms(t_cached / n)}")
+    print("facet lists and counts match pandas")
+
+
+if __name__ == "__main__":
+    main()
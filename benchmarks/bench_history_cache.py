@@ -0,0 +1,62 @@
+"""Shared price-history cache: miss vs memory hit vs disk hit from a fresh process.
+
+    python benchmarks/bench_history_cache.py --items 20000
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from common import ROOT, fmt_ms, timeit
+from utils import price
+
+PROBE = r"""
+import json, sys, time
+sys.path.insert(0, {root!r})
+import numpy as np
+from utils import price
+price.configure_history_cache(disk_path={disk!r})
+ids = [f"P-{{i}}" for i in range({n})]
+t0 = time.perf_counter(); price.price_histories(ids, np.full({n}, 100.0))
+print(json.dumps({{"seconds": time.perf_counter() - t0, "stats": price.history_cache_stats()}}))
+"""
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=20_000)
+    args = ap.parse_args()
+    n = args.items
+    ids = [f"P-{i}" for i in range(n)]
+    prices = np.full(n, 100.0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        disk = str(Path(tmp) / "histories.sqlite")
+        price.configure_history_cache(max_bytes=64 * 2 ** 20, disk_path=disk)
+        t_miss, (matrix, _) = timeit(lambda: price.price_histories(ids, prices), repeat=1)
+        t_hit, (again, _) = timeit(lambda: price.price_histories(ids, prices), repeat=3)
+        assert np.array_equal(matrix, again)
+        assert np.array_equal(matrix, price.simulate_price_histories(ids, prices)[0])
+        print(f"{n:,} histories x 60 days")
+        print(f"  miss (simulate + store)   {fmt_ms(t_miss)}")
+        print(f"  memory hit                {fmt_ms(t_hit)}   {price.history_cache_stats()['memory']}")
+
+        code = PROBE.format(root=str(ROOT), disk=disk, n=n)
+        out = json.loads(subprocess.run([sys.executable, "-c", code], capture_output=True,
+                                        text=True, check=True).stdout)
+        print(f"  disk hit (new process)    {fmt_ms(out['seconds'])}   {out['stats']['disk']}")
+
+        # A small memory cap keeps the cache bounded by evicting LRU entries.
+        price.configure_history_cache(max_bytes=2 ** 20)
+        price.price_histories(ids, prices)
+        stats = price.history_cache_stats()["memory"]
+        assert stats["bytes"] <= 2 ** 20
+        print(f"  1 MB cap                  entries={stats['entries']:,} evictions={stats['evictions']:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Thumbnail pipeline against a local stand-in image origin.
+
+A threaded HTTP/1.1 server serves generated 800x1000 JPEGs with a fixed
+latency per request. Some URLs are slow (longer than the page wait) and some
+return 404. The benchmark times a page of cards four ways: fetching it one
+image at a time the blocking way, fetching it through the pipeline cold,
+rendering it again warm from the cache, and rendering it with slow and dead
+images mixed in. It then browses page by page with next-page prefetch and
+reports the cache hit rate, p95 fetch latency and connections opened. It
+checks that served thumbnails are the card size, that failed URLs fall back
+to the placeholder without being refetched, and that eviction keeps the
+cache under its byte cap.
+
+    python benchmarks/bench_images.py --images 400 --page 20 --latency-ms 40
+"""
+import argparse
+import io
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from common import fmt_ms
+from utils.images import ImagePipeline, ThumbnailCache, make_thumbnail, placeholder
+
+SIZE = "500x650"
+
+
+class Origin(ThreadingHTTPServer):
+    """/img/<n>.jpg after `latency` seconds, /slow/<n>.jpg after `slow`, /gone/<n>.jpg 404."""
+
+    daemon_threads = True
+    request_queue_size = 128  # the default backlog of 5 drops a burst of connects
+
+    def __init__(self, images, latency, slow):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.images, self.latency, self.slow = images, latency, slow
+        self.connections = self.requests = 0
+
+    def url(self, kind, n):
+        return f"http://127.0.0.1:{self.server_address[1]}/{kind}/{n}.jpg"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests += 1
+        kind, name = self.path.strip("/").split("/")
+        n = int(name.split(".")[0])
+        if kind == "gone":
+            self.send_error(404)
+            return
+        time.sleep(self.server.slow if kind == "slow" else self.server.latency)
+        body = self.server.images[n % len(self.server.images)]
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def generate_images(n, seed=0):
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        # A coarse random mosaic scaled up: distinct per image and cheap to make.
+        tile = rng.integers(0, 256, (10, 8, 3), dtype=np.uint8)
+        img = Image.fromarray(tile).resize((800, 1000), Image.Resampling.BILINEAR)
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=85)
+        out.append(buf.getvalue())
+    return out
+
+
+def blocking_page(urls):
+    """One image after another, each on its own connection."""
+    return [make_thumbnail(urllib.request.urlopen(u, timeout=30).read(), SIZE) for u in urls]
+
+
+def file_of(cache, src):
+    return cache.path / src[len(cache.url_prefix) + 1:]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", type=int, default=400)
+    ap.add_argument("--page", type=int, default=20)
+    ap.add_argument("--latency-ms", type=float, default=40)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--wait-ms", type=float, default=500)
+    args = ap.parse_args()
+    wait = args.wait_ms / 1000
+
+    origin = Origin(generate_images(args.images), args.latency_ms / 1000, slow=4 * wait)
+    threading.Thread(target=origin.serve_forever, daemon=True).start()
+    tmp = Path(tempfile.mkdtemp())
+    cache = ThumbnailCache(tmp / "thumbs", max_bytes=2 ** 30, url_prefix="thumbs")
+    pipeline = ImagePipeline(cache, concurrency=args.concurrency)
+    urls = [origin.url("img", n) for n in range(args.images)]
+    page = urls[:args.page]
+    print(f"{args.images} images at {args.latency_ms:.0f} ms origin latency, pages of {args.page}, "
+          f"concurrency {args.concurrency}")
+
+    # One page: blocking fetches vs the pipeline, cold then warm.
+    origin.connections = 0
+    t0 = time.perf_counter()
+    blocking_page(page)
+    t_block, conns_block = time.perf_counter() - t0, origin.connections
+    origin.connections = 0
+    t0 = time.perf_counter()
+    srcs = pipeline.resolve(page, SIZE, wait=60)
+    t_cold, conns_cold = time.perf_counter() - t0, origin.connections
+    t0 = time.perf_counter()
+    warm = pipeline.resolve(page, SIZE, wait=60)
+    t_warm = time.perf_counter() - t0
+    assert warm == srcs and placeholder(SIZE) not in srcs
+    for src in srcs:
+        with Image.open(file_of(cache, src)) as img:
+            assert img.size == (500, 650), img.size
+    print(f"  page cold: one by one {fmt_ms(t_block)} ({conns_block} connections)   "
+          f"pipeline {fmt_ms(t_cold)} ({conns_cold} connections)")
+    print(f"  page warm: {fmt_ms(t_warm)}")
+
+    # Slow and dead images: the page waits no longer than `wait`.
+    mixed = urls[args.page:2 * args.page - 4] + [origin.url("slow", 0), origin.url("slow", 1),
+                                                   origin.url("gone", 0), origin.url("gone", 1)]
+    t0 = time.perf_counter()
+    srcs = pipeline.resolve(mixed, SIZE, wait=wait)
+    t_mixed = time.perf_counter() - t0
+    assert t_mixed < wait + 0.25 and srcs[-4:] == [placeholder(SIZE)] * 4
+    time.sleep(4 * wait + 0.5)
+    requests = origin.requests
+    srcs = pipeline.resolve(mixed, SIZE, wait=wait)
+    assert placeholder(SIZE) not in srcs[-4:-2], "slow images land on a later render"
+    assert srcs[-2:] == [placeholder(SIZE)] * 2 and origin.requests == requests, "dead URLs are not refetched"
+    print(f"  page with 2 slow and 2 dead images: {fmt_ms(t_mixed)} (wait cap {fmt_ms(wait)})")
+
+    # Browsing page by page, prefetching the next page.
+    hits0, misses0 = cache.hits, cache.misses
+    renders = []
+    start = 2 * args.page
+    for lo in range(start, args.images, args.page):
+        t0 = time.perf_counter()
+        pipeline.resolve(urls[lo:lo + args.page], SIZE, wait=wait)
+        renders.append(time.perf_counter() - t0)
+        pipeline.prefetch(urls[lo + args.page:lo + 2 * args.page], SIZE)
+        time.sleep(1.0)  # reading the page
+    lookups = cache.hits - hits0 + cache.misses - misses0
+    stats = pipeline.stats()
+    print(f"  browsing {len(renders)} pages with prefetch: hit rate {(cache.hits - hits0) / lookups:.0%}   "
+          f"render p95 {fmt_ms(np.percentile(renders, 95))}   fetch p50 {stats['fetch_p50_ms']:.1f} ms   "
+          f"p95 {stats['fetch_p95_ms']:.1f} ms   {stats['connections']} connections for {stats['fetched']} fetches")
+
+    # Eviction keeps the cache under its cap.
+    small = ThumbnailCache(tmp / "small", max_bytes=20 * 2 ** 10, url_prefix="thumbs")
+    ImagePipeline(small, concurrency=args.concurrency).resolve(urls[:args.page], SIZE, wait=60)
+    s = small.stats()
+    assert 0 < s["bytes"] <= s["max_bytes"] and s["evictions"] > 0
+    assert sum(1 for _ in (tmp / "small").glob("*/*.jpg")) == s["entries"]
+    print(f"  20 KB cap: {s['entries']} thumbnails kept, {s['evictions']} evicted")
+    print("thumbnails are the card size; slow and dead images fall back to the placeholder")
+    origin.shutdown()
+
+
+if __name__ == "__main__":
+    main()
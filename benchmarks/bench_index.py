@@ -0,0 +1,65 @@
+"""Discover profile filtering: chained pandas masks vs the inverted index.
+
+    python benchmarks/bench_index.py --sizes 10000,1000000,10000000
+"""
+import argparse
+
+import numpy as np
+
+from common import fmt_ms, synthetic_products, timeit
+from utils.index import CatalogIndex
+
+PROFILES = {
+    "narrow": dict(brands=["Chanel", "Burberry"], stores=["Chanel", "Burberry"],
+                   categories=["Women > Shoes", "Beauty > Fragrance"], price_pref="Mid-range", min_disc=10),
+    "luxury": dict(brands=["Gucci", "Prada", "Dior"], stores=[], categories=[],
+                   price_pref="Luxury Only", min_disc=30),
+    "broad": dict(brands=[], stores=[], categories=[], price_pref="Mid-range", min_disc=10),
+}
+
+
+def pandas_chain(products, brands, stores, categories, price_pref, min_disc):
+    df = products.copy()
+    if brands:
+        df = df[df["brand"].isin(brands)]
+    if stores:
+        df = df[df["store"].isin(stores)]
+    if categories:
+        df = df[df["category"].isin(categories)]
+    if price_pref == "Luxury Only":
+        df = df[df["msrp"] >= 250]
+    elif price_pref == "Budget":
+        df = df[df["price"] <= 80]
+    return df[df["discount_pct"] >= min_disc]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10000,1000000")
+    args = ap.parse_args()
+
+    for n in map(int, args.sizes.split(",")):
+        products = synthetic_products(n)
+        products.index = np.arange(n)
+        build, index = timeit(lambda: CatalogIndex(products), repeat=1)
+        print(f"\n{n:,} products (index build {fmt_ms(build)})")
+        for name, prof in PROFILES.items():
+            t_pd, expected = timeit(lambda: pandas_chain(products, **prof), repeat=3)
+            t_ix, rows = timeit(lambda: index.select(**prof))
+            assert np.array_equal(rows, expected.index.to_numpy()), name
+            print(f"  {name:<8} pandas {fmt_ms(t_pd)}   index {fmt_ms(t_ix)}   ({len(rows):,} rows)")
+
+        # Incremental maintenance: reprice 1% of the catalog.
+        changed = np.random.default_rng(1).choice(n, max(1, n // 100), replace=False)
+        delta = products.iloc[changed].copy()
+        delta["price"] = delta["price"] * 0.5
+        t_up, _ = timeit(lambda: index.upsert(changed, delta), repeat=1)
+        products.iloc[changed, products.columns.get_loc("price")] = delta["price"].to_numpy()
+        for prof in PROFILES.values():
+            expected = pandas_chain(products, **dict(prof, price_pref="Budget"))
+            assert np.array_equal(index.select(**dict(prof, price_pref="Budget")), expected.index.to_numpy())
+        print(f"  upsert {len(changed):,} rows {fmt_ms(t_up)}")
+
+
+if __name__ == "__main__":
+    main()
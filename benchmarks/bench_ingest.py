@@ -0,0 +1,94 @@
+"""Delta ingestion: apply a batch of price changes to a large catalog store, then catch readers up.
+
+The catalog is generated straight into a columnar store; a warm reader
+(filter index, scorer, search index, lookup) is then brought up to date
+after the delta and checked against structures built from scratch.
+
+    python benchmarks/bench_ingest.py --rows 10000000 --changes 100000
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bench_index import PROFILES
+from common import fmt_ms, timeit
+import generate_products  # noqa: E402  (on sys.path via common)
+from utils.catalog import catalog_version, get_lookup, load_products
+from utils.index import CatalogIndex, get_index
+from utils.ingest import apply_delta, read_delta
+from utils.rank import FeedScorer, get_scorer
+from utils.search import get_search_index
+
+PROFILE = {"brands": ["Gucci", "Prada"], "stores": [], "categories": [], "price_pref": "Luxury Only"}
+
+
+def readers(products):
+    return get_index(products), get_scorer(products), get_search_index(products), get_lookup(products)
+
+
+def rebuild(products):
+    return CatalogIndex(products), FeedScorer(products)
+
+
+def check(index, scorer, fresh_index, fresh_scorer):
+    for name, prof in PROFILES.items():
+        assert np.array_equal(index.select(**prof), fresh_index.select(**prof)), name
+    rows = index.select(**PROFILES["broad"])
+    w = scorer.weights(PROFILE)
+    assert np.allclose(scorer.scores(w, rows), fresh_scorer.scores(w, rows))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--changes", type=int, default=100_000)
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp())
+    store = tmp / "catalog"
+    generate_products.main(["--rows", str(args.rows), "--format", "columnar", "--out", str(store)])
+    products = load_products(store)
+    t_cold, _ = timeit(lambda: readers(products), repeat=1)
+    print(f"{args.rows:,} products, readers built in {fmt_ms(t_cold)}")
+
+    # A price feed: 100k repriced products.
+    rng = np.random.default_rng(0)
+    picks = rng.choice(args.rows, args.changes, replace=False)
+    ids = products["id"].to_numpy()[picks].astype(str)
+    prices = np.round(products["price"].to_numpy()[picks] * rng.uniform(0.6, 1.0, len(picks)), 2)
+    pd.DataFrame({"id": ids, "price": prices}).to_csv(tmp / "prices.csv", index=False)
+
+    t_apply, summary = timeit(lambda: apply_delta(read_delta(tmp / "prices.csv"), store), repeat=1)
+    print(f"apply {args.changes:,} price changes: {fmt_ms(t_apply)}  {summary}")
+
+    t_catch, (index, scorer, _, lookup) = timeit(lambda: readers(load_products(store)), repeat=1)
+    assert load_products(store) is products, "price-only deltas keep the mapped catalog"
+    assert catalog_version(products) == summary["version"]
+    assert np.allclose(products["price"].to_numpy()[picks], prices)
+    t_full, fresh = timeit(lambda: rebuild(products), repeat=1)
+    print(f"reader catch-up {fmt_ms(t_catch)}   vs rebuilding index + scorer {fmt_ms(t_full)}")
+    check(index, scorer, *fresh)
+    del fresh
+
+    # Deletes and a few new products reshape the store; readers reopen it.
+    gone = ids[:1000]
+    new = pd.DataFrame({"id": [f"N-{i}" for i in range(10)], "name": "New arrival", "brand": "Gucci",
+                        "category": "Women > Bags", "store": "Gucci", "msrp": 1000.0, "price": 700.0})
+    delta = pd.concat([pd.DataFrame({"id": gone, "op": "delete"}), new.assign(op="upsert")])
+    t_reshape, summary = timeit(lambda: apply_delta(delta, store), repeat=1)
+    del products, index, scorer, lookup
+    t_reopen, (index, scorer, _, lookup) = timeit(lambda: readers(load_products(store)), repeat=1)
+    products = load_products(store)
+    print(f"delete 1,000 + insert 10: {fmt_ms(t_reshape)}, reopen + rebuild readers {fmt_ms(t_reopen)}")
+    assert (lookup.positions(gone) == -1).all()
+    assert (lookup.positions(new["id"]) >= args.rows).all()
+    assert products["discount_pct"].iloc[-1] == 30
+    check(index, scorer, *rebuild(products))
+    print("updated readers match a fresh build")
+
+
+if __name__ == "__main__":
+    main()
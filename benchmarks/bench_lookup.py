@@ -0,0 +1,46 @@
+"""Boards page product lookup: one boolean scan per item vs the sorted-id index.
+
+    python benchmarks/bench_lookup.py --rows 1000000 --items 500
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from common import fmt_ms, timeit, write_synthetic_csv
+from utils.catalog import ProductLookup, load_products
+
+
+def scan(products, ids):
+    return [products[products["id"] == pid].iloc[0] for pid in ids]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--items", type=int, default=500)
+    args = ap.parse_args()
+
+    products = load_products(write_synthetic_csv(Path(tempfile.gettempdir()) / f"wishdrop_{args.rows}.csv", args.rows))
+    ids = products["id"].astype(str).to_numpy()
+    board = ids[np.random.default_rng(0).choice(len(ids), args.items, replace=False)].tolist()
+
+    build_t, lookup = timeit(lambda: ProductLookup(products), repeat=1)
+    fast_t, found = timeit(lambda: lookup.get_many(board), repeat=5)
+    scan_t, rows = timeit(lambda: scan(products, board[:50]), repeat=1)
+    scan_t *= len(board) / 50  # the full scan loop is extrapolated from 50 items
+
+    assert found["id"].astype(str).tolist() == board
+    assert [r["id"] for r in rows] == board[:50]
+    assert len(lookup.get_many(board + ["P-missing", "", board[0]])) == len(board) + 1
+    assert lookup.get("P-missing") is None and lookup.get(board[0])["id"] == board[0]
+
+    print(f"{args.items} items vs {args.rows:,} products")
+    print(f"  scan per item (est.) {fmt_ms(scan_t)}")
+    print(f"  index build          {fmt_ms(build_t)}   (once per catalog version)")
+    print(f"  get_many             {fmt_ms(fast_t)}   ({scan_t / fast_t:,.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Per-call cost of the instrumentation, with metrics off and on.
+
+    python benchmarks/bench_metrics.py --calls 1000000
+"""
+import argparse
+
+from common import timeit
+from utils import metrics
+
+
+def noop():
+    return None
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=1_000_000)
+    args = ap.parse_args()
+    n = args.calls
+    wrapped = metrics.timed("bench.noop")(noop)
+
+    def plain():
+        for _ in range(n):
+            noop()
+
+    def decorated():
+        for _ in range(n):
+            wrapped()
+
+    def spans():
+        for _ in range(n):
+            with metrics.span("bench.block"):
+                pass
+
+    base, _ = timeit(plain, repeat=3)
+    for state in (False, True):
+        metrics.enable(state)
+        t_dec, _ = timeit(decorated, repeat=3)
+        t_span, _ = timeit(spans, repeat=3)
+        label = "on " if state else "off"
+        print(f"metrics {label}: timed() +{(t_dec - base) / n * 1e9:6.0f} ns/call, "
+              f"span() {t_span / n * 1e9:6.0f} ns/block")
+    metrics.enable(False)
+
+
+if __name__ == "__main__":
+    main()
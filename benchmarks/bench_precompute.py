@@ -0,0 +1,109 @@
+"""Nightly precompute job: wall time per worker count, and what the pages save.
+
+Runs utils.precompute over a generated catalog and a set of random profiles
+with 1..N workers (speedup is bounded by the cores of the machine), checks
+the published histories, signals and feeds against live computation, and
+times the live paths the run replaces.
+
+    python benchmarks/bench_precompute.py --rows 1000000 --profiles 2000 --workers 1,2,4
+"""
+import argparse
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from common import fmt_ms, timeit
+
+# utils.precompute reads this at import.
+RESULTS = Path(tempfile.mkdtemp())
+os.environ["WISHDROP_PRECOMPUTED"] = str(RESULTS)
+
+import generate_products  # noqa: E402  (on sys.path via common)
+from utils.catalog import load_products
+from utils.feed import first, order_keys
+from utils.index import get_index
+from utils.precompute import current_run, precomputed_feed, precomputed_signals, run_job
+from utils.price import build_price_histories, buy_or_wait_signals
+from utils.rank import get_scorer
+
+
+def random_profiles(products, count, seed=0):
+    rng = np.random.default_rng(seed)
+    brands, stores, cats = (products[c].cat.categories.tolist() for c in ("brand", "store", "category"))
+    return {
+        f"user-{i}": {
+            "brands": rng.choice(brands, rng.integers(0, 4), replace=False).tolist(),
+            "stores": rng.choice(stores, rng.integers(0, 3), replace=False).tolist(),
+            "categories": rng.choice(cats, rng.integers(0, 3), replace=False).tolist(),
+            "price_pref": str(rng.choice(["Budget", "Mid-range", "Luxury Only"])),
+        }
+        for i in range(count)
+    }
+
+
+def live_signals(products):
+    prices = products["price"].to_numpy()
+    hist, _ = build_price_histories(products["id"].astype(str).tolist(), prices, 60)
+    return buy_or_wait_signals(hist, prices)
+
+
+def live_feed(products, profile, min_disc=10):
+    rows = get_index(products).select(min_disc=min_disc)
+    scorer = get_scorer(products)
+    return order_keys(rows, scorer.scores(scorer.weights(profile), rows)), len(rows)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--profiles", type=int, default=2000)
+    ap.add_argument("--workers", default="1,2,4")
+    args = ap.parse_args()
+
+    store = RESULTS.parent / f"{RESULTS.name}-catalog"
+    generate_products.main(["--rows", str(args.rows), "--format", "columnar", "--out", str(store)])
+    products = load_products(store)
+    profiles = random_profiles(products, args.profiles)
+    print(f"{args.rows:,} products, {args.profiles:,} profiles, {os.cpu_count()} CPU(s)")
+
+    base = None
+    for workers in map(int, args.workers.split(",")):
+        m = run_job(store, RESULTS, workers=workers, profiles=profiles)
+        busy = {k: sum(t["seconds"] for t in m["shards"] if t["kind"] == k) for k in ("histories", "feeds")}
+        slowest = max(t["seconds"] for t in m["shards"])
+        base = base or m["seconds"]
+        print(f"  {workers} workers: {m['seconds']:7.2f} s (x{base / m['seconds']:.2f})   shard work: histories "
+              f"{busy['histories']:.2f} s, feeds {busy['feeds']:.2f} s, slowest shard {fmt_ms(slowest)}")
+
+    # The run against live computation.
+    run = current_run()
+    rng = np.random.default_rng(1)
+    sample = np.sort(rng.choice(args.rows, min(args.rows, 20_000), replace=False))
+    ids = products["id"].to_numpy()[sample].astype(str).tolist()
+    prices = products["price"].to_numpy()[sample]
+    hist, _ = build_price_histories(ids, prices, run.manifest["days"])
+    assert np.array_equal(hist, run.histories[sample])
+    codes, scores = buy_or_wait_signals(hist, prices)
+    assert np.array_equal(codes, run.signals[sample]) and np.array_equal(scores, run.scores[sample])
+
+    t_sig_live, _ = timeit(lambda: live_signals(products), repeat=1)
+    t_sig_pre, signals = timeit(lambda: precomputed_signals(products))
+    assert signals is not None
+
+    names = list(profiles)[:50]
+    for name in names:
+        keys, total = live_feed(products, profiles[name])
+        pre_keys, pre_total = precomputed_feed(products, name, profiles[name], 10)
+        assert total == pre_total and np.array_equal(keys[first(keys, len(pre_keys))], pre_keys), name
+    t_feed_live, _ = timeit(lambda: [first(live_feed(products, profiles[n])[0], 20) for n in names], repeat=1)
+    t_feed_pre, _ = timeit(lambda: [precomputed_feed(products, n, profiles[n], 10) for n in names])
+    print(f"  signals for the whole catalog: live {fmt_ms(t_sig_live)}   precomputed {fmt_ms(t_sig_pre)}")
+    print(f"  default feed, per profile:     live {fmt_ms(t_feed_live / len(names))}   "
+          f"precomputed {fmt_ms(t_feed_pre / len(names))}")
+    print("precomputed histories, signals and feeds match live computation")
+
+
+if __name__ == "__main__":
+    main()
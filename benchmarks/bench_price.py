@@ -0,0 +1,60 @@
+"""Price-history simulation: the original per-item Python loop vs the batch engine.
+
+    python benchmarks/bench_price.py --items 100000 --days 365
+"""
+import argparse
+import random
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from common import fmt_ms, timeit
+from utils.price import simulate_price_histories, simulate_price_history
+
+
+def loop_history(current_price, days=60, seed=None):
+    """The pre-batch implementation, kept here as the baseline."""
+    if seed is not None:
+        random.seed(seed)
+    prices = []
+    p = current_price * random.uniform(0.92, 1.06)
+    for _ in range(days):
+        drift = random.uniform(-0.012, 0.012) * p
+        p = max(5.0, p + drift)
+        if random.random() < 0.05:
+            p *= random.uniform(0.9, 0.97)
+        prices.append(round(p, 2))
+    idx = pd.date_range(end=datetime.today(), periods=days)
+    return pd.Series(prices, index=idx)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=100_000)
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--loop-items", type=int, default=1_000,
+                    help="the Python loop is timed on this many items and extrapolated")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    ids = [f"P-{i}" for i in range(args.items)]
+    prices = rng.uniform(4, 2500, args.items)
+
+    n = min(args.loop_items, args.items)
+    t_loop, _ = timeit(lambda: [loop_history(p, args.days) for p in prices[:n]], repeat=1)
+    t_batch, (matrix, dates) = timeit(lambda: simulate_price_histories(ids, prices, args.days), repeat=3)
+
+    again, _ = simulate_price_histories(ids[:100], prices[:100], args.days)
+    assert np.array_equal(again, matrix[:100]), "histories must be reproducible per product id"
+    single = simulate_price_history(prices[7], args.days, seed=ids[7])
+    assert np.array_equal(single.to_numpy(), matrix[7]) and single.index.equals(dates)
+    assert matrix.min() >= 4.5 and matrix.dtype == np.float32
+
+    print(f"{args.items:,} items x {args.days} days ({matrix.nbytes / 2**20:.1f} MB float32)")
+    print(f"  python loop  {fmt_ms(t_loop * args.items / n)}  (extrapolated from {n:,} items)")
+    print(f"  batch        {fmt_ms(t_batch)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Ranked feed: score the whole catalog for a profile and take the top k.
+
+    python benchmarks/bench_rank.py --sizes 100000,1000000,5000000 --k 20
+"""
+import argparse
+
+import numpy as np
+
+from common import fmt_ms, synthetic_products, timeit
+from utils.rank import FeedScorer
+
+PROFILE = {"brands": ["Chanel", "Gucci"], "stores": ["Nordstrom", "Amazon"],
+           "categories": ["Women > Shoes", "Beauty > Skincare"], "price_pref": "Luxury Only"}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="100000,1000000")
+    ap.add_argument("--k", type=int, default=20)
+    args = ap.parse_args()
+
+    for n in map(int, args.sizes.split(",")):
+        products = synthetic_products(n)
+        build, scorer = timeit(lambda: FeedScorer(products), repeat=1)
+        t, (rows, scores) = timeit(lambda: scorer.top_k(PROFILE, args.k))
+
+        # Same scores as a dense reference: one-hot matches plus band and discount terms.
+        ref = (3.0 * products["brand"].isin(PROFILE["brands"])
+               + 2.0 * products["store"].isin(PROFILE["stores"])
+               + 2.0 * products["category"].isin(PROFILE["categories"])
+               + np.where(products["msrp"] >= 250, 1.5, 0) + np.where(products["price"] <= 80, -1.0, 0)
+               + 2.0 * products["discount_pct"] / 100).to_numpy()
+        assert np.allclose(scores, np.sort(ref)[::-1][:args.k], atol=1e-4)
+        print(f"{n:>10,} products: build {fmt_ms(build)}  score + top-{args.k} {fmt_ms(t)}  "
+              f"best {scores[0]:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Discover sidebar search: row-wise df.apply vs the trigram SearchIndex.
+
+    python benchmarks/bench_search.py --rows 1000000
+"""
+import argparse
+
+import numpy as np
+
+from common import fmt_ms, synthetic_products, timeit
+from utils.search import SearchIndex
+
+QUERIES = ["gucci", "g", "ic", "women > sh", "nordstrom", "m-12", "zzz", "Ultra Jacket"]
+
+
+def apply_search(df, query):
+    q = query.lower()
+    mask = df.apply(
+        lambda r: q in r["name"].lower()
+                  or q in r["brand"].lower()
+                  or q in r["category"].lower()
+                  or q in r["store"].lower(),
+        axis=1,
+    )
+    return np.flatnonzero(mask.to_numpy())
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--apply-rows", type=int, default=100_000,
+                    help="df.apply is timed (and checked) on this many rows only")
+    args = ap.parse_args()
+
+    products = synthetic_products(args.rows)
+    # Model numbers make most names distinct, as in a real catalog.
+    model = np.random.default_rng(2).integers(0, args.rows, args.rows)
+    products["name"] = products["name"] + " M-" + model.astype(str)
+
+    build, index = timeit(lambda: SearchIndex(products), repeat=1)
+    small = products.iloc[:args.apply_rows]
+    small_index = SearchIndex(small)
+    print(f"{args.rows:,} rows, index build {fmt_ms(build)}")
+    for q in QUERIES:
+        t_apply, expected = timeit(lambda: apply_search(small, q), repeat=1)
+        assert np.array_equal(small_index.match(q), expected), q
+        t_ix, rows = timeit(lambda: index.match(q))
+        print(f"  {q!r:<14} apply@{len(small):,} {fmt_ms(t_apply)}   index {fmt_ms(t_ix)}   ({len(rows):,} rows)")
+
+    for q in ["gu", "ultra jac"]:
+        t, rows = timeit(lambda: index.prefix(q))
+        print(f"  prefix {q!r:<12} {fmt_ms(t)}   ({len(rows):,} rows)")
+    t, rows = timeit(lambda: index.rank("gucci jacket nordstrom", limit=50))
+    print(f"  rank 'gucci jacket nordstrom' top-50 {fmt_ms(t)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""buy_or_wait_signal per Series vs buy_or_wait_signals over the history matrix.
+
+Also checks that both agree on the timed items; tests/test_signal.py covers
+short, flat and random-walk histories.
+
+    python benchmarks/bench_signal.py --items 100000
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from common import fmt_ms, timeit
+from utils.price import SIGNALS, buy_or_wait_signal, buy_or_wait_signals, simulate_price_histories
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=100_000)
+    ap.add_argument("--days", type=int, default=60)
+    ap.add_argument("--scalar-items", type=int, default=10_000)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    ids = [f"P-{i}" for i in range(args.items)]
+    histories, dates = simulate_price_histories(ids, rng.uniform(20, 2500, args.items), args.days)
+    # Current prices around the recent range, including exact ties with the history.
+    current = histories[:, -1] * rng.choice([0.95, 1.0, 1.02, 1.05], args.items).astype(np.float32)
+
+    t_batch, (codes, scores) = timeit(lambda: buy_or_wait_signals(histories, current))
+
+    n = min(args.scalar_items, args.items)
+    series = [pd.Series(histories[i], index=dates) for i in range(n)]
+    t_scalar, expected = timeit(lambda: [buy_or_wait_signal(s, current[i])[0] for i, s in enumerate(series)],
+                                repeat=1)
+    got = [SIGNALS[c] for c in codes[:n]]
+    mismatches = sum(a != b for a, b in zip(got, expected))
+    assert mismatches == 0, f"{mismatches} of {n} items disagree with buy_or_wait_signal"
+
+    counts = {s: int((codes == i).sum()) for i, s in enumerate(SIGNALS)}
+    print(f"{args.items:,} items x {args.days} days: {counts}")
+    print(f"  scalar  {fmt_ms(t_scalar * args.items / n)}  (extrapolated from {n:,} items)")
+    print(f"  batch   {fmt_ms(t_batch)}  ({args.items / t_batch / 1e6:.1f}M items/s)")
+
+
+if __name__ == "__main__":
+    main()
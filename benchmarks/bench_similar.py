@@ -0,0 +1,66 @@
+"""More-like-this queries: exact scan of every product vector vs the inverted-list index.
+
+Builds utils/similar.py's index over a generated catalog, then, for random
+products, compares the top-k from PROBES lists with the exact top-k by the
+same quantised cosine over the whole catalog. Recall counts a returned item
+as right when it scores at least the exact k-th best, because generated
+products often tie.
+
+    python benchmarks/bench_similar.py --rows 1000000 --queries 200 --probes 4,8,16
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from common import fmt_ms, timeit
+import generate_products  # noqa: E402  (on sys.path via common)
+from utils.catalog import load_products
+from utils.similar import SimilarIndex
+
+
+def exact(index, row, k):
+    q = index.vectors[row].astype(np.float32) / 127
+    scores = index.vectors.astype(np.float32) @ q / 127
+    scores[row] = -np.inf
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.lexsort((top, -scores[top]))], scores
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=8)
+    ap.add_argument("--probes", default="4,8,16")
+    args = ap.parse_args()
+
+    store = Path(tempfile.mkdtemp()) / "catalog"
+    generate_products.main(["--rows", str(args.rows), "--format", "columnar", "--out", str(store)])
+    products = load_products(store)
+    t_build, index = timeit(lambda: SimilarIndex(products), repeat=1)
+    sizes = np.array([len(p) for p in index.postings])
+    print(f"{args.rows:,} products: index built in {fmt_ms(t_build)}, {index.vectors.nbytes / 2 ** 20:.0f} MB "
+          f"of vectors, {len(sizes)} lists of {sizes.mean():.0f} (max {sizes.max()})")
+
+    rows = np.random.default_rng(1).choice(args.rows, args.queries, replace=False).tolist()
+    few = rows[:min(len(rows), 20)]
+    t_exact, truth = timeit(lambda: [exact(index, r, args.k) for r in few], repeat=1)
+    truth = dict(zip(few, truth))
+    print(f"  exact scan: {fmt_ms(t_exact / len(few))} per query")
+    for probes in map(int, args.probes.split(",")):
+        t_query, found = timeit(lambda: [index.similar(r, args.k, probes) for r in rows], repeat=3)
+        hits = 0
+        for r, (got, scores) in zip(rows, found):
+            if r not in truth:
+                continue
+            top, all_scores = truth[r]
+            assert np.allclose(scores, all_scores[got], atol=1e-5) and r not in got
+            hits += int((all_scores[got] >= all_scores[top[-1]] - 1e-6).sum())
+        print(f"  {probes:>2} probes: {fmt_ms(t_query / len(rows))} per query   "
+              f"recall@{args.k} {hits / (args.k * len(few)):.1%}")
+
+
+if __name__ == "__main__":
+    main()
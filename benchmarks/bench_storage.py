@@ -0,0 +1,49 @@
+"""Profile/board storage: whole-file JSON vs the SQLite backend.
+
+Times single-key operations once the store holds --profiles profiles. That
+concurrent writers lose no updates is tested in tests/test_storage.py.
+
+    python benchmarks/bench_storage.py --profiles 100000
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+from common import fmt_ms, timeit
+from utils import storage
+
+PROFILE = {
+    "height_in": 64, "weight_lb": 140, "sizes": {"top": "m", "bottom": "8", "shoe": "8"},
+    "style": ["Luxury"], "price_pref": "Mid-range", "brands": ["Chanel", "Gucci"],
+    "stores": ["Nordstrom"], "categories": ["Women > Shoes"], "notes": "",
+}
+
+
+def backends(tmp):
+    yield "json", storage.JsonBackend({"profiles": tmp / "profiles.json", "boards": tmp / "boards.json"})
+    yield "sqlite", storage.SqliteBackend(tmp / "wishdrop.db")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--profiles", type=int, default=100_000)
+    args = ap.parse_args()
+
+    for name, engine in backends(Path(tempfile.mkdtemp())):
+        storage.use_backend(engine)
+        bulk = {f"user-{i}": PROFILE for i in range(args.profiles)}
+        if hasattr(engine, "put_many"):
+            engine.put_many("profiles", bulk)
+        else:
+            storage._write(engine.paths["profiles"], bulk)
+        repeat = 3 if name == "json" else 200
+        t_save, _ = timeit(lambda: storage.save_profile("user-7", dict(PROFILE, notes="x")), repeat)
+        t_get, _ = timeit(lambda: storage.get_profile("user-99"), repeat)
+        t_list, names = timeit(lambda: storage.list_profiles(), 3)
+        assert len(names) == args.profiles
+        print(f"{name:<7} @ {args.profiles:,} profiles: save {fmt_ms(t_save)}  get {fmt_ms(t_get)}"
+              f"  list {fmt_ms(t_list)}")
+
+
+if __name__ == "__main__":
+    main()
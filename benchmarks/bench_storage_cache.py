@@ -0,0 +1,52 @@
+"""Per-rerun storage overhead with and without the read-through cache.
+
+A Discover rerun calls list_profiles(), get_profile() and get_board(); this
+times that trio as the number of stored profiles grows.
+
+    python benchmarks/bench_storage_cache.py --sizes 1000,10000,100000
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+from bench_storage import PROFILE
+from common import fmt_ms, timeit
+from utils import storage
+
+
+def rerun():
+    storage.list_profiles()
+    storage.get_profile("user-1")
+    storage.get_board("user-1")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,10000,100000")
+    args = ap.parse_args()
+
+    print(f"{'profiles':>10}{'json':>14}{'json+cache':>14}{'sqlite':>14}{'sqlite+cache':>14}")
+    for n in map(int, args.sizes.split(",")):
+        tmp = Path(tempfile.mkdtemp())
+        bulk = {f"user-{i}": PROFILE for i in range(n)}
+        json_engine = storage.JsonBackend({"profiles": tmp / "profiles.json", "boards": tmp / "boards.json"})
+        storage._write(tmp / "profiles.json", bulk)
+        sqlite_engine = storage.SqliteBackend(tmp / "wishdrop.db")
+        sqlite_engine.put_many("profiles", bulk)
+
+        timings = []
+        for engine in (json_engine, storage.CachedBackend(json_engine),
+                       sqlite_engine, storage.CachedBackend(sqlite_engine)):
+            storage.use_backend(engine)
+            rerun()  # warm up: the cached engines load each table once here
+            t, _ = timeit(rerun, repeat=3 if engine is json_engine else 20)
+            timings.append(t)
+        print(f"{n:>10,}" + "".join(f"{fmt_ms(t):>14}" for t in timings))
+
+    storage.save_profile("user-1", dict(PROFILE, notes="changed"))
+    assert storage.get_profile("user-1")["notes"] == "changed"
+    print("cache after a write:", storage.cache_stats())
+
+
+if __name__ == "__main__":
+    main()
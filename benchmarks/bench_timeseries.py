@@ -0,0 +1,58 @@
+"""Observed-price store: daily snapshot writes, range reads vs simulation, and size on disk.
+
+Each simulated day reprices a few percent of the catalog (--churn); the
+snapshots are recorded one day at a time, read back and checked cell for cell.
+
+    python benchmarks/bench_timeseries.py --products 1000000 --days 60
+"""
+import argparse
+import tempfile
+from datetime import date, timedelta
+
+import numpy as np
+
+from common import fmt_ms, timeit
+from utils.price import simulate_price_histories
+from utils.timeseries import PriceStore
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--products", type=int, default=1_000_000)
+    ap.add_argument("--days", type=int, default=60)
+    ap.add_argument("--churn", type=float, default=0.03, help="share of products repriced per day")
+    args = ap.parse_args()
+    n, days = args.products, args.days
+
+    ids = np.array([f"P-{1000 + i}" for i in range(n)])
+    rng = np.random.default_rng(0)
+    truth = np.empty((n, days), dtype=np.float32)
+    truth[:, 0] = np.round(rng.uniform(20, 3000, n), 2)
+    for d in range(1, days):
+        moved = rng.random(n) < args.churn
+        truth[:, d] = np.where(moved, np.round(truth[:, d - 1] * rng.uniform(0.7, 1.1, n), 2), truth[:, d - 1])
+    end = date.today()
+    store = PriceStore(tempfile.mkdtemp())
+    writes = []
+    for d in range(days):
+        t, _ = timeit(lambda: store.record(ids, truth[:, d], end - timedelta(days - 1 - d)), repeat=1)
+        writes.append(t)
+    stats = store.stats()
+    raw = n * days * 4
+    print(f"{n:,} products x {days} days: snapshot write median {fmt_ms(np.median(writes))}, "
+          f"{stats['bytes'] / 2 ** 20:.0f} MB on disk ({stats['bytes'] / raw:.0%} of a dense float32 matrix)")
+
+    for k in (1, 20, 1000, 100_000):
+        if k > n:
+            break
+        pick = ids[rng.choice(n, k, replace=False)]
+        t_read, observed = timeit(lambda: store.read(pick, days), repeat=3)
+        t_sim, _ = timeit(lambda: simulate_price_histories(pick, np.full(k, 500.0), days), repeat=3)
+        rows = np.array([int(p[2:]) - 1000 for p in pick])
+        assert np.array_equal(observed, truth[rows]), k
+        print(f"  {k:>7,} products: read {fmt_ms(t_read)}   simulate {fmt_ms(t_sim)}")
+    print("reads match the recorded prices")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Several app workers on one catalog: memory per worker, and how stale a worker can get.
+
+Spawns N worker processes, each of which loads the catalog and every derived
+structure a page rerun uses (index, scorer, search, facets, similar items),
+as a Streamlit server process would. "private" builds them in each worker.
+"shared" first publishes them with `python -m utils.shared`, and the workers
+attach to the published snapshots (WISHDROP_SHARED=1). Memory is read from
+/proc/<pid>/smaps_rollup: PSS splits shared pages between the processes
+mapping them, so PSS summed over workers is what they cost together.
+
+Then the main process applies a price delta and saves a profile, and each
+worker, polling every --poll ms like a rerun would, reports when it saw each
+change. The worker then checks its caught-up structures against fresh ones.
+tests/test_workers.py checks the staleness bound and the sharing on a small
+catalog; this script reports what they amount to at scale.
+
+    python benchmarks/bench_workers.py --rows 1000000 --workers 4 --poll 50
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bench_index import PROFILES
+from common import ROOT, fmt_ms
+import generate_products  # noqa: E402  (on sys.path via common)
+from utils import storage
+from utils.catalog import catalog_version, load_products
+from utils.ingest import apply_delta
+
+# Seconds a worker may take past its poll interval to see a change.
+MARGIN = 0.25
+
+
+def memory():
+    """MB of RSS, PSS and private pages of this process."""
+    fields = {}
+    for line in Path("/proc/self/smaps_rollup").read_text().splitlines()[1:]:
+        key, value = line.split(":", 1)
+        fields[key] = int(value.split()[0]) / 1024
+    return fields["Rss"], fields["Pss"], fields["Private_Clean"] + fields["Private_Dirty"]
+
+
+def worker(store, poll, out, go):
+    # Imported in the worker so WISHDROP_SHARED is read from its environment.
+    from utils.facets import FacetCounts, get_facets
+    from utils.index import CatalogIndex, get_index
+    from utils.rank import get_scorer
+    from utils.search import get_search_index
+    from utils.similar import get_similar
+
+    t0 = time.perf_counter()
+    products = load_products(store)
+    getters = (get_index, get_scorer, get_search_index, get_facets, get_similar)
+    for get in getters:
+        get(products)
+    out.put(("ready", time.perf_counter() - t0, memory()))
+    go.wait()
+
+    version, seen = catalog_version(products), {}
+    deadline = time.monotonic() + 30
+    while len(seen) < 2 and time.monotonic() < deadline:
+        time.sleep(poll)
+        if "catalog" not in seen and catalog_version(load_products(store)) > version:
+            seen["catalog"] = time.monotonic()
+        if "profile" not in seen and (storage.get_profile("bench") or {}).get("rev"):
+            seen["profile"] = time.monotonic()
+
+    products = load_products(store)
+    index, _, _, facets, _ = (get(products) for get in getters)
+    caught_up = memory()
+    fresh = CatalogIndex(products)
+    for name, prof in PROFILES.items():
+        assert np.array_equal(index.select(**prof), fresh.select(**prof)), name
+    assert facets.counts() == FacetCounts(products).counts()
+    out.put(("seen", seen, caught_up))
+
+
+def trial(mode, base, args):
+    tmp = Path(tempfile.mkdtemp())
+    store = tmp / "catalog"
+    shutil.copytree(base, store)
+    os.environ["WISHDROP_DB"] = str(tmp / "wishdrop.db")
+    os.environ["WISHDROP_SHARED"] = "1" if mode == "shared" else "0"
+    storage.use_backend(storage.open_backend())
+    t_publish = 0.0
+    if mode == "shared":
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "utils.shared", "--products", str(store)], cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL)
+        t_publish = time.perf_counter() - t0
+
+    ctx = multiprocessing.get_context("spawn")
+    out, go = ctx.Queue(), ctx.Event()
+    procs = [ctx.Process(target=worker, args=(store, args.poll / 1000, out, go)) for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    ready = [out.get() for _ in procs]
+    go.set()
+
+    # Changes land at a random point of the workers' poll cycle.
+    rng = np.random.default_rng(0)
+    time.sleep(rng.uniform(0.2, 0.5))
+    products = load_products(store)
+    picks = rng.choice(len(products), max(1, len(products) // 1000), replace=False)
+    prices = np.round(products["price"].to_numpy()[picks] * 0.8, 2)
+    apply_delta(pd.DataFrame({"id": products["id"].to_numpy()[picks].astype(str), "price": prices}), store)
+    changed = {"catalog": time.monotonic()}
+    storage.save_profile("bench", {"rev": 1, "brands": [], "stores": [], "categories": [], "price_pref": "Budget"})
+    changed["profile"] = time.monotonic()
+
+    seen = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0, f"{mode} worker failed"
+    assert all(len(s[1]) == 2 for s in seen), f"a {mode} worker never saw a change"
+    stale = {what: [s[1][what] - changed[what] for s in seen] for what in changed}
+    return t_publish, [r[1] for r in ready], np.array([r[2] for r in ready]), np.array([s[2] for s in seen]), stale
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--poll", type=float, default=50, help="worker poll interval in ms")
+    args = ap.parse_args()
+
+    base = Path(tempfile.mkdtemp()) / "catalog"
+    generate_products.main(["--rows", str(args.rows), "--format", "columnar", "--out", str(base)])
+    print(f"{args.rows:,} products, {args.workers} workers polling every {args.poll:.0f} ms")
+    for mode in ("private", "shared"):
+        t_publish, loads, mem, mem_after, stale = trial(mode, base, args)
+        rss, pss, private = mem.mean(axis=0)
+        publish = f" (after publishing in {fmt_ms(t_publish).strip()})" if t_publish else ""
+        print(f"  {mode:<8} load {fmt_ms(min(loads))} .. {fmt_ms(max(loads))}{publish}")
+        print(f"           per worker: RSS {rss:7.0f} MB   PSS {pss:7.0f} MB   private {private:7.0f} MB   "
+              f"(all workers PSS {mem[:, 1].sum():,.0f} MB; caught up to the delta {mem_after[:, 1].sum():,.0f} MB)")
+        for what, lag in stale.items():
+            print(f"           {what} change seen after {fmt_ms(np.median(lag))} median, {fmt_ms(max(lag))} max")
+            assert max(lag) <= args.poll / 1000 + MARGIN, (mode, what, lag)
+    print("workers saw every change within a poll interval and caught up to fresh structures")
+
+
+if __name__ == "__main__":
+    main()
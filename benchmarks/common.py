@@ -0,0 +1,42 @@
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+SAMPLE_CSV = ROOT / "data" / "sample_products.csv"
+
+
+def synthetic_products(rows: int, seed: int = 0):
+    """Resample the bundled catalog into `rows` products with unique ids."""
+    base = pd.read_csv(SAMPLE_CSV)
+    rng = np.random.default_rng(seed)
+    df = base.iloc[rng.integers(0, len(base), rows)].reset_index(drop=True)
+    df["id"] = "P-" + pd.Series(np.arange(1000, 1000 + rows)).astype(str)
+    return df
+
+
+def write_synthetic_csv(path, rows: int, seed: int = 0):
+    path = Path(path)
+    if not path.exists():
+        synthetic_products(rows, seed).to_csv(path, index=False)
+    return path
+
+
+def timeit(fn, repeat: int = 5):
+    """Best-of-`repeat` wall time in seconds and the last result."""
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def fmt_ms(seconds: float):
+    return f"{seconds * 1000:9.2f} ms"
@@ -0,0 +1,292 @@
+"""End-to-end benchmark suite: every hot path at growing catalog and user sizes.
+
+Results go to a JSON file so runs can be compared; with --baseline, any
+timing that got slower than the baseline by more than --tolerance is
+flagged and the exit status is 1.
+
+    python benchmarks/suite.py --sizes 1000,100000 --users 1000,100000
+    python benchmarks/suite.py --save-baseline            # record this machine's baseline
+    python benchmarks/suite.py --baseline benchmarks/results/baseline.json
+    python benchmarks/suite.py --only filter,search --sizes 1000000
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bench_index import PROFILES
+from bench_storage import PROFILE
+from common import ROOT, fmt_ms, timeit, write_synthetic_csv
+from utils import storage
+from utils.catalog import build_store, get_lookup, load_products, open_store
+from utils.index import get_index
+from utils.precompute import run_job
+from utils.price import buy_or_wait_signal, buy_or_wait_signals, simulate_price_histories
+from utils.rank import get_scorer
+from utils.search import get_search_index
+from utils.timeseries import PriceStore
+
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+BASELINE = RESULTS_DIR / "baseline.json"
+
+CASES = {}  # name -> (scale, fn(fixture) -> {metric: seconds})
+
+
+def case(name, scale="catalog"):
+    def register(fn):
+        CASES[name] = (scale, fn)
+        return fn
+    return register
+
+
+class Fixture:
+    """A synthetic catalog (or user population) of one size, in a scratch directory."""
+
+    def __init__(self, size, tmp):
+        self.size, self.tmp = size, Path(tmp)
+        self._products = None
+
+    @property
+    def csv(self):
+        return write_synthetic_csv(self.tmp / "products.csv", self.size)
+
+    @property
+    def products(self):
+        if self._products is None:
+            self._products = load_products(self.csv)
+        return self._products
+
+
+# ---- Catalog-size cases ----
+@case("catalog")
+def bench_catalog(fx):
+    build, store = timeit(lambda: build_store(fx.csv, fx.tmp / f"store-{time.time_ns()}"), repeat=1)
+    reopen, _ = timeit(lambda: open_store(store), repeat=3)
+    return {"build": build, "open": reopen}
+
+
+@case("filter")
+def bench_filter(fx):
+    products = fx.products
+    build, index = timeit(lambda: get_index(products), repeat=1)
+    out = {"index_build": build}
+    for name, prof in PROFILES.items():
+        out[name], _ = timeit(lambda: index.select(**prof))
+    return out
+
+
+@case("rank")
+def bench_rank(fx):
+    products = fx.products
+    build, scorer = timeit(lambda: get_scorer(products), repeat=1)
+    prof = {"brands": ["Gucci", "Prada"], "stores": ["Nordstrom"], "categories": [], "price_pref": "Luxury Only"}
+    top, _ = timeit(lambda: scorer.top_k(prof, 20))
+    return {"scorer_build": build, "top20": top}
+
+
+@case("search")
+def bench_search(fx):
+    products = fx.products
+    build, index = timeit(lambda: get_search_index(products), repeat=1)
+    match, _ = timeit(lambda: index.match("gucci"))
+    ranked, _ = timeit(lambda: index.rank("classic bag", limit=20))
+    return {"index_build": build, "match": match, "rank": ranked}
+
+
+@case("price")
+def bench_price(fx):
+    n = min(fx.size, 1000)
+    ids, prices = fx.products["id"][:n].astype(str).tolist(), fx.products["price"][:n].to_numpy()
+    one, _ = timeit(lambda: simulate_price_histories(ids[:1], prices[:1], 60))
+    page, _ = timeit(lambda: simulate_price_histories(ids[:20], prices[:20], 60))
+    batch, (hist, dates) = timeit(lambda: simulate_price_histories(ids, prices, 60), repeat=3)
+    series = pd.Series(hist[0], index=dates)
+    scalar, _ = timeit(lambda: buy_or_wait_signal(series, prices[0]))
+    signals, _ = timeit(lambda: buy_or_wait_signals(hist, prices))
+    return {"history_1": one, "history_20": page, f"history_{n}": batch,
+            "signal_1": scalar, f"signals_{n}": signals}
+
+
+@case("price_store")
+def bench_price_store(fx):
+    ids, prices = fx.products["id"].astype(str).to_numpy(), fx.products["price"].to_numpy(np.float64)
+    store, rng = PriceStore(fx.tmp / "prices"), np.random.default_rng(0)
+    today = np.datetime64("today", "D")
+    for d in range(59, 0, -1):
+        prices = np.where(rng.random(len(ids)) < 0.03, np.round(prices * 0.9, 2), prices)
+        store.record(ids, prices, today - d)
+    snapshot, _ = timeit(lambda: store.record(ids, prices, today), repeat=1)
+    out = {"snapshot": snapshot}
+    for k in (20, 1000):
+        pick = ids[:k]
+        out[f"read_{len(pick)}"], _ = timeit(lambda: store.read(pick, 60))
+    return out
+
+
+@case("precompute")
+def bench_precompute(fx):
+    job, m = timeit(lambda: run_job(fx.csv, fx.tmp / "precomputed", workers=1, shards=4, profiles=PROFILES),
+                    repeat=1)
+    return {"job": job, "slowest_shard": max(t["seconds"] for t in m["shards"])}
+
+
+@case("boards_lookup")
+def bench_boards_lookup(fx):
+    products = fx.products
+    build, lookup = timeit(lambda: get_lookup(products), repeat=1)
+    ids = products["id"].astype(str).to_numpy()
+    board = ids[np.random.default_rng(0).choice(len(ids), min(500, len(ids)), replace=False)].tolist()
+    get_many, _ = timeit(lambda: lookup.get_many(board))
+    return {"index_build": build, "get_many_500": get_many}
+
+
+PAGE_PROBE = r"""
+import json, sys, time
+sys.path.insert(0, {root!r})
+from streamlit.testing.v1 import AppTest
+from utils import storage
+storage.save_profile("bench", {{"price_pref": "Mid-range", "brands": ["Gucci"], "stores": [], "categories": []}})
+storage.save_board("bench", {{"saved": {saved!r}, "tracked": {tracked!r}}})
+out = {{}}
+at = AppTest.from_file({discover!r}, default_timeout=600)
+at.run()
+t0 = time.perf_counter(); at.sidebar.selectbox[0].select("bench").run(); out["discover_first"] = time.perf_counter() - t0
+t0 = time.perf_counter(); at.sidebar.slider[0].set_value(15).run(); out["discover_rerun"] = time.perf_counter() - t0
+assert not at.exception, [e.value for e in at.exception]
+at = AppTest.from_file({boards!r}, default_timeout=600)
+at.run()
+t0 = time.perf_counter(); at.sidebar.text_input[0].input("bench").run(); out["boards_first"] = time.perf_counter() - t0
+t0 = time.perf_counter(); at.run(); out["boards_rerun"] = time.perf_counter() - t0
+assert not at.exception, [e.value for e in at.exception]
+print(json.dumps(out))
+"""
+
+
+@case("pages")
+def bench_pages(fx):
+    ids = pd.read_csv(fx.csv, usecols=["id"], nrows=20)["id"].tolist()
+    probe = PAGE_PROBE.format(
+        root=str(ROOT), saved=ids[:10], tracked={pid: 10 for pid in ids[10:20]},
+        discover=str(ROOT / "pages" / "2_🖼️_Discover.py"), boards=str(ROOT / "pages" / "3_❤️_Boards_&_Alerts.py"),
+    )
+    env = dict(os.environ, PYTHONPATH=str(ROOT), WISHDROP_PRODUCTS=str(fx.csv),
+               WISHDROP_DB=str(fx.tmp / "pages.db"))
+    out = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, env=env, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+# ---- User-count cases ----
+@case("storage", scale="users")
+def bench_storage(fx):
+    engine = storage.SqliteBackend(fx.tmp / "users.db")
+    engine.put_many("profiles", {f"user-{i}": PROFILE for i in range(fx.size)})
+    engine.put_many("boards", {f"user-{i}": {"saved": ["P-1000"], "tracked": {"P-1001": 10}}
+                               for i in range(fx.size)})
+    out = {}
+    for label, backend in (("sqlite", engine), ("cached", storage.CachedBackend(engine))):
+        storage.use_backend(backend)
+        storage.get_board("user-1")
+        out[f"{label}_get_profile"], _ = timeit(lambda: storage.get_profile("user-1"))
+        out[f"{label}_get_board"], _ = timeit(lambda: storage.get_board("user-1"))
+        out[f"{label}_list_profiles"], _ = timeit(lambda: storage.list_profiles(), repeat=3)
+        out[f"{label}_save_board"], _ = timeit(
+            lambda: storage.save_board("user-1", {"saved": ["P-1002"], "tracked": {}}))
+    storage.use_backend(None)
+    return out
+
+
+# ---- Runner ----
+def run(sizes, users, only=None):
+    results = {}
+    for name, (scale, fn) in CASES.items():
+        if only and name not in only:
+            continue
+        for size in users if scale == "users" else sizes:
+            with tempfile.TemporaryDirectory() as tmp:
+                t0 = time.perf_counter()
+                metrics = fn(Fixture(size, tmp))
+            print(f"{name:<14}{size:>11,}  ({time.perf_counter() - t0:.1f}s)")
+            for metric, seconds in metrics.items():
+                results[f"{name}.{metric}@{size}"] = seconds
+                print(f"    {metric:<22}{fmt_ms(seconds)}")
+    return results
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} cpu)",
+    }
+
+
+def compare(results, baseline, tolerance, min_delta):
+    """Names whose time exceeds the baseline by more than `tolerance` (ratio) and `min_delta` seconds."""
+    regressions = []
+    print(f"\n{'benchmark':<50}{'baseline':>14}{'now':>14}{'change':>9}")
+    for name, now in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        change = now / before - 1 if before else 0.0
+        flag = change > tolerance and now - before > min_delta
+        if flag:
+            regressions.append(name)
+        print(f"{name:<50}{fmt_ms(before):>14}{fmt_ms(now):>14}{change:>+8.0%}{'  <-- slower' if flag else ''}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,100000", help="catalog sizes")
+    ap.add_argument("--users", default="1000,100000", help="stored profiles/boards")
+    ap.add_argument("--only", default="", help=f"comma-separated subset of: {', '.join(CASES)}")
+    ap.add_argument("--out", default=None, help="results file (default: benchmarks/results/<time>.json)")
+    ap.add_argument("--baseline", default=None, help="results file to compare against")
+    ap.add_argument("--save-baseline", action="store_true", help=f"also write the results to {BASELINE}")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown ratio before flagging")
+    ap.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    args = ap.parse_args()
+
+    only = set(filter(None, args.only.split(",")))
+    unknown = only - set(CASES)
+    if unknown:
+        ap.error(f"unknown cases: {', '.join(sorted(unknown))}")
+    results = run([int(s) for s in args.sizes.split(",")], [int(s) for s in args.users.split(",")], only)
+
+    doc = {"meta": metadata(), "results": results}
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(doc, indent=2), encoding="utf-8")
+    print(f"\nWrote {len(results)} timings → {out}")
+    if args.save_baseline:
+        BASELINE.write_text(json.dumps(doc, indent=2), encoding="utf-8")
+        print(f"Saved baseline → {BASELINE}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))["results"]
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms / 1000)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
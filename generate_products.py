@@ -1,5 +1,26 @@
+"""Synthetic catalog generator.
+
+    python generate_products.py                                   # 100 items -> data/sample_products.csv
+    python generate_products.py --rows 10000000 --format columnar --out data/catalog_10m \
+        --workers 4 --histories 60 --profiles 100000 --boards 100000
+
+Rows are generated in NumPy chunks and streamed to disk, so memory stays flat
+whatever --rows is. The same --seed and --chunk-size give the same catalog,
+with any number of --workers.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
-import random
+
+from utils.catalog import COLUMNS, NUMERIC, DATA_DIR
 
 brands = [
     "Louis Vuitton","Gucci","Prada","Chanel","Burberry","Fendi",
@@ -22,31 +43,267 @@ categories = [
     "Home > Decor","Sports > Fitness"
 ]
 
-def create_item(i):
-    brand = random.choice(brands)
-    store = random.choice(stores)
-    category = random.choice(categories)
+adjectives = ["Signature","Classic","Limited","Ultra","Icon"]
+nouns = ["Bag","Shoes","Watch","Jacket","Dress","Sneakers","Wallet","Backpack","Perfume","Laptop","Mixer"]
+discounts = [10, 15, 20, 25, 30, 35, 40, 50, 60]
+
+IMAGE_URL = "https://source.unsplash.com/800x1000/?luxury,fashion,product"
+PRODUCT_URL = "https://example.com/product"
+FIRST_ID = 1000
+
+# Every text column is drawn from a fixed vocabulary except the id, so chunks
+# carry codes and only the writers turn them into strings.
+VOCAB = {
+    "name": [f"{b} {a} {n}" for b in brands for a in adjectives for n in nouns],
+    "brand": brands,
+    "category": categories,
+    "store": stores,
+    "image_url": [IMAGE_URL],
+    "product_url": [PRODUCT_URL],
+}
 
-    msrp = random.randint(150, 2500)
-    discount_pct = random.choice([10, 15, 20, 25, 30, 35, 40, 50, 60])
-    price = round(msrp * (1 - discount_pct/100), 2)
 
+# ---- Generation ----
+def generate_chunk(start: int, rows: int, seed: int = 0):
+    """Rows [start, start + rows) as {column: codes or values}; reproducible per (seed, start)."""
+    rng = np.random.default_rng([seed, start])
+    brand = rng.integers(0, len(brands), rows)
+    name = (brand * len(adjectives) + rng.integers(0, len(adjectives), rows)) * len(nouns) \
+        + rng.integers(0, len(nouns), rows)
+    msrp = rng.integers(150, 2501, rows)
+    discount = np.asarray(discounts, dtype=np.int8)[rng.integers(0, len(discounts), rows)]
     return {
-        "id": f"P-{1000+i}",
-        "name": f"{brand} {random.choice(['Signature','Classic','Limited','Ultra','Icon'])} {random.choice(['Bag','Shoes','Watch','Jacket','Dress','Sneakers','Wallet','Backpack','Perfume','Laptop','Mixer'])}",
-        "brand": brand,
-        "category": category,
-        "store": store,
-        "msrp": msrp,
-        "price": price,
-        "discount_pct": discount_pct,
-        "image_url": "https://source.unsplash.com/800x1000/?luxury,fashion,product",
-        "product_url": "https://example.com/product"
+        "id": np.arange(FIRST_ID + start, FIRST_ID + start + rows, dtype=np.int64),
+        "name": name.astype(np.int16),
+        "brand": brand.astype(np.int16),
+        "category": rng.integers(0, len(categories), rows).astype(np.int16),
+        "store": rng.integers(0, len(stores), rows).astype(np.int16),
+        "msrp": msrp.astype(np.float32),
+        "price": np.round(msrp * (1 - discount / 100), 2).astype(np.float32),
+        "discount_pct": discount,
+        "image_url": np.zeros(rows, dtype=np.int8),
+        "product_url": np.zeros(rows, dtype=np.int8),
     }
 
-items = [create_item(i) for i in range(100)]
-df = pd.DataFrame(items)
 
-df.to_csv("data/sample_products.csv", index=False)
+def product_ids(numbers):
+    return np.char.add("P-", numbers.astype(str))
+
+
+def chunk_frame(chunk):
+    """A generated chunk as a DataFrame with categorical text columns."""
+    data = {"id": product_ids(chunk["id"])}
+    for col in COLUMNS[1:]:
+        if col in VOCAB:
+            data[col] = pd.Categorical.from_codes(chunk[col], categories=VOCAB[col])
+        else:
+            data[col] = chunk[col]
+    return pd.DataFrame(data, columns=COLUMNS)
+
+
+def _generate(task):
+    return generate_chunk(*task)
+
+
+def chunks(rows: int, chunk_size: int, seed: int, workers: int = 1):
+    tasks = [(start, min(chunk_size, rows - start), seed) for start in range(0, rows, chunk_size)]
+    if workers <= 1:
+        yield from map(_generate, tasks)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        # A window of a few chunks per worker keeps memory bounded while the writer catches up.
+        for lo in range(0, len(tasks), workers * 2):
+            yield from pool.map(_generate, tasks[lo:lo + workers * 2])
+
+
+def enumerate_chunks(chunk_iter):
+    start = 0
+    for chunk in chunk_iter:
+        yield start, chunk
+        start += len(chunk["id"])
+
+
+# ---- Writers ----
+class CsvSink:
+    def __init__(self, path, rows):
+        self.path, self.header = Path(path), True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.unlink(missing_ok=True)
+
+    def write(self, start, chunk):
+        chunk_frame(chunk).to_csv(self.path, mode="a", header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        pass
+
+
+class ParquetSink:
+    def __init__(self, path, rows):
+        import pyarrow.parquet as pq
+
+        self.path, self.pq, self.writer = Path(path), pq, None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def write(self, start, chunk):
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(chunk_frame(chunk), preserve_index=False)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class ColumnarSink:
+    """Writes the catalog store layout (see utils/catalog.py) directly, no CSV round trip.
+
+    Point WISHDROP_PRODUCTS at the output directory to serve it.
+    """
+
+    def __init__(self, path, rows):
+        self.path, self.rows = Path(path), rows
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp = Path(tempfile.mkdtemp(prefix=f".{self.path.name}.", dir=self.path.parent))
+        code_dtype = np.int32 if rows < 2 ** 31 else np.int64
+        width = len(f"P-{FIRST_ID + max(rows, 1) - 1}")
+        self.arrays, self.columns = {}, {}
+        for col in COLUMNS:
+            if col in NUMERIC:
+                self.arrays[col] = self._open(f"{col}.npy", NUMERIC[col])
+                self.columns[col] = {"kind": "numeric", "dtype": NUMERIC[col]}
+            elif col == "id":
+                self.arrays["id.codes"] = self._open("id.codes.npy", code_dtype)
+                self.arrays["id.labels"] = self._open("id.labels.npy", f"<U{width}")
+                self.columns[col] = {"kind": "category", "dtype": np.dtype(code_dtype).name}
+            else:
+                self.arrays[col] = self._open(f"{col}.codes.npy", np.int16)
+                np.save(self.tmp / f"{col}.labels.npy", np.asarray(VOCAB[col], dtype=str))
+                self.columns[col] = {"kind": "category", "dtype": "int16"}
+
+    def _open(self, name, dtype):
+        # A .npy header for the final shape, then chunks appended as raw bytes.
+        f = open(self.tmp / name, "wb")
+        np.lib.format.write_array_header_1_0(
+            f, {"descr": np.dtype(dtype).str, "fortran_order": False, "shape": (self.rows,)})
+        return f, np.dtype(dtype)
+
+    def _append(self, key, values):
+        f, dtype = self.arrays[key]
+        f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+
+    def write(self, start, chunk):
+        self._append("id.codes", np.arange(start, start + len(chunk["id"])))
+        self._append("id.labels", product_ids(chunk["id"]))
+        for col in COLUMNS[1:]:
+            self._append(col, chunk[col])
+
+    def close(self):
+        for f, _ in self.arrays.values():
+            f.close()
+        self.arrays.clear()
+        np.save(self.tmp / "alive.npy", np.ones(self.rows, dtype=bool))
+        manifest = {"source": "generate_products.py", "signature": f"{self.rows:x}-{time.time_ns():x}",
+                    "rows": self.rows, "columns": self.columns, "version": 0, "layout": 0, "log": []}
+        (self.tmp / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        if self.path.exists():
+            shutil.rmtree(self.path)
+        os.rename(self.tmp, self.path)
+
+
+SINKS = {"csv": CsvSink, "parquet": ParquetSink, "columnar": ColumnarSink}
+
+
+# ---- Companion data ----
+def write_histories(path, chunk_iter, rows: int, days: int):
+    """Price histories matching the catalog (the same simulation the app uses), N x days float32."""
+    from utils.price import simulate_price_histories
+
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(rows, days))
+    for start, chunk in chunk_iter:
+        end = start + len(chunk["id"])
+        out[start:end], _ = simulate_price_histories(product_ids(chunk["id"]), chunk["price"], days)
+        yield start, chunk
+    out.flush()
+
+
+def write_users(db, rows: int, profiles: int, boards: int, saved: int, tracked: int, seed: int,
+                batch: int = 50_000):
+    """Random profiles and boards for user-0..N-1, referencing products of this catalog."""
+    from utils.storage import SqliteBackend
+
+    engine = SqliteBackend(db)
+    rng = np.random.default_rng([seed, 2 ** 32 - 1, 0])  # never equal to a chunk seed
+    sizes = ["xs", "s", "m", "l", "xl"]
+    for lo in range(0, profiles, batch):
+        hi = min(profiles, lo + batch)
+        engine.put_many("profiles", {
+            f"user-{u}": {
+                "height_in": int(rng.integers(58, 78)),
+                "weight_lb": int(rng.integers(100, 240)),
+                "sizes": {"top": str(rng.choice(sizes)), "bottom": str(rng.integers(0, 16)),
+                          "shoe": str(rng.integers(5, 13))},
+                "style": [],
+                "price_pref": str(rng.choice(["Budget", "Mid-range", "Luxury Only"])),
+                "brands": rng.choice(brands, rng.integers(0, 4), replace=False).tolist(),
+                "stores": rng.choice(stores, rng.integers(0, 3), replace=False).tolist(),
+                "categories": rng.choice(categories, rng.integers(0, 4), replace=False).tolist(),
+                "notes": "",
+            }
+            for u in range(lo, hi)
+        })
+    for lo in range(0, boards, batch):
+        hi = min(boards, lo + batch)
+        picks = product_ids(FIRST_ID + rng.integers(0, rows, (hi - lo, saved + tracked)))
+        thresholds = rng.choice([5, 10, 15, 20], (hi - lo, tracked))
+        engine.put_many("boards", {
+            f"user-{lo + i}": {
+                "saved": list(dict.fromkeys(picks[i, :saved].tolist())),
+                "tracked": dict(zip(picks[i, saved:].tolist(), thresholds[i].tolist())),
+            }
+            for i in range(hi - lo)
+        })
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Generate a synthetic WishDrop catalog.")
+    ap.add_argument("--rows", type=int, default=100)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--format", choices=sorted(SINKS), default="csv")
+    ap.add_argument("--out", default=None, help="output file (directory for columnar)")
+    ap.add_argument("--chunk-size", type=int, default=500_000)
+    ap.add_argument("--workers", type=int, default=1, help="processes generating chunks")
+    ap.add_argument("--histories", type=int, default=0, metavar="DAYS",
+                    help="also write an N x DAYS price-history matrix next to the output")
+    ap.add_argument("--profiles", type=int, default=0, help="random profiles to write into --db")
+    ap.add_argument("--boards", type=int, default=0, help="random boards to write into --db")
+    ap.add_argument("--saved-per-board", type=int, default=20)
+    ap.add_argument("--tracked-per-board", type=int, default=10)
+    ap.add_argument("--db", default=None, help="SQLite store for profiles/boards (default: next to the output)")
+    args = ap.parse_args(argv)
+
+    default = {"csv": DATA_DIR / "sample_products.csv", "parquet": DATA_DIR / "products.parquet",
+               "columnar": DATA_DIR / "catalog"}
+    out = Path(args.out) if args.out else default[args.format]
+    t0 = time.perf_counter()
+    sink = SINKS[args.format](out, args.rows)
+    stream = enumerate_chunks(chunks(args.rows, args.chunk_size, args.seed, args.workers))
+    if args.histories:
+        stream = write_histories(out.with_name(out.stem + ".histories.npy"), stream, args.rows, args.histories)
+    for start, chunk in stream:
+        sink.write(start, chunk)
+    sink.close()
+    print(f"Wrote {args.rows:,} products → {out} in {time.perf_counter() - t0:.1f}s")
+
+    if args.profiles or args.boards:
+        db = Path(args.db) if args.db else out.with_name(out.stem + ".db")
+        write_users(db, args.rows, args.profiles, args.boards, args.saved_per_board, args.tracked_per_board,
+                    args.seed)
+        print(f"Wrote {args.profiles:,} profiles and {args.boards:,} boards → {db}")
+
 
-print("Wrote 100 luxury products → data/sample_products.csv")
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
 import streamlit as st
-import pandas as pd
 from utils.storage import list_profiles, get_profile, save_profile, delete_profile
+from utils.catalog import load_products
+from utils.facets import get_facets
+from utils import metrics
+
+metrics.page_start("profile")
 
 # Fix selectbox scrolling issue (global CSS)
 st.markdown("""
@@ -30,7 +34,7 @@ div[data-baseweb="popover"] {
 
 st.header("👤 Profile")
 
-products = pd.read_csv("data/sample_products.csv")
+products = load_products()
 
 # --------------------------
 # SELECT PROFILE
@@ -68,6 +72,19 @@ else:
     default_cats = []
     default_notes = ""
 
+# --------------------------
+# FACET COUNTS (items per brand/store/category under the saved preferences)
+# --------------------------
+
+facets = get_facets(products)
+counts = facets.counts(brands=default_brands, stores=default_stores, categories=default_cats,
+                       price_pref=default_price)
+
+
+def with_count(col):
+    return lambda value: f"{value} ({counts[col].get(value, 0):,})"
+
+
 # --------------------------
 # PROFILE FORM
 # --------------------------
@@ -95,16 +112,19 @@ with st.form("profile_form"):
     )
 
     st.markdown("**Favorite Brands**")
-    all_brands = sorted(products["brand"].unique().tolist())
-    fav_brands = st.multiselect("Choose brands", all_brands, default=default_brands)
+    all_brands = sorted(set(facets.values("brand")) | set(default_brands))
+    fav_brands = st.multiselect("Choose brands", all_brands, default=default_brands,
+                                format_func=with_count("brand"))
 
     st.markdown("**Preferred Stores**")
-    all_stores = sorted(products["store"].unique().tolist())
-    fav_stores = st.multiselect("Choose stores", all_stores, default=default_stores)
+    all_stores = sorted(set(facets.values("store")) | set(default_stores))
+    fav_stores = st.multiselect("Choose stores", all_stores, default=default_stores,
+                                format_func=with_count("store"))
 
     st.markdown("**Favorite Categories**")
-    cats = sorted(products["category"].unique().tolist())
-    fav_cats = st.multiselect("Categories", cats, default=default_cats)
+    cats = sorted(set(facets.values("category")) | set(default_cats))
+    fav_cats = st.multiselect("Categories", cats, default=default_cats,
+                              format_func=with_count("category"))
 
     notes = st.text_area("Notes", value=default_notes)
 
@@ -136,3 +156,5 @@ if chosen != "Create New":
     if st.button("🗑️ Delete Profile"):
         delete_profile(chosen)
         st.success("Profile deleted. Please refresh the page.")
+
+metrics.debug_panel()
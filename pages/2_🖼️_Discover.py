@@ -1,12 +1,26 @@
 import streamlit as st
-import pandas as pd
-from utils.storage import list_profiles, get_profile
-from utils.price import simulate_price_history, buy_or_wait_signal
+import numpy as np
+from utils.storage import list_profiles, get_profile, record_board_op
+from utils.price import (
+    SIGNALS, price_history, price_histories, buy_or_wait_signal, buy_or_wait_signals,
+)
+from utils.catalog import catalog_version, load_products
+from utils.cards import get_cards, render_strip
+from utils.facets import get_facets
+from utils.index import get_index
+from utils.search import get_search_index
+from utils.similar import get_similar
+from utils.feed import order_keys, page_end, first, next_cursor, key_rows
+from utils.precompute import precomputed_feed, precomputed_signals
+from utils.rank import get_scorer
+from utils import metrics
+from utils.metrics import span
 
 # -----------------------------------------------------
 # PAGE CONFIG
 # -----------------------------------------------------
 st.set_page_config(page_title="Discover – WishDrop", page_icon="🛍️", layout="centered")
+metrics.page_start("discover")
 st.header("🛍️ Discover — Personalized Luxury Sales")
 
 # Fix long dropdown scroll
@@ -23,10 +37,6 @@ div[data-baseweb="select"] > div {
 # -----------------------------------------------------
 # LOAD PRODUCTS
 # -----------------------------------------------------
-@st.cache_data
-def load_products():
-    return pd.read_csv("data/sample_products.csv")
-
 products = load_products()
 
 
@@ -49,146 +59,190 @@ prof = get_profile(chosen)
 st.sidebar.subheader("Filters")
 min_disc = st.sidebar.slider("Minimum Discount %", 0, 80, 10)
 query = st.sidebar.text_input("Search (brand/store/category/name)")
+recs = st.sidebar.multiselect("Recommendation", SIGNALS[::-1], default=SIGNALS[::-1])
+best_first = st.sidebar.checkbox("Best deals first")
+strict = st.sidebar.checkbox("Only exact profile matches")
+page_size = st.sidebar.select_slider("Items per page", [10, 20, 50, 100], value=20)
 
 
 # -----------------------------------------------------
-# APPLY PROFILE FILTERS
+# REFINE (brand / store / category, with live counts)
 # -----------------------------------------------------
-df = products.copy()
-
-# Brand filter
-if prof.get("brands"):
-    df = df[df["brand"].isin(prof["brands"])]
-
-# Store filter
-if prof.get("stores"):
-    df = df[df["store"].isin(prof["stores"])]
-
-# Category filter
-if prof.get("categories"):
-    df = df[df["category"].isin(prof["categories"])]
-
-# Price preference
-price_pref = prof.get("price_pref", "Mid-range")
-if price_pref == "Luxury Only":
-    df = df[df["msrp"] >= 250]
-elif price_pref == "Budget":
-    df = df[df["price"] <= 80]
-
-# Discount filter
-df = df[df["discount_pct"] >= min_disc]
-
-# Search filter
-if query:
-    q = query.lower()
-    df = df[
-        df.apply(
-            lambda r: q in r["name"].lower()
-                      or q in r["brand"].lower()
-                      or q in r["category"].lower()
-                      or q in r["store"].lower(),
-            axis=1
-        )
-    ]
+# Each value shows how many items picking it gives under the discount
+# slider, the other refinements and, for exact matches, the profile
+# (before search and recommendation filters).
+REFINE = (("brand", "brands", "Brands"), ("store", "stores", "Stores"), ("category", "categories", "Categories"))
+facets = get_facets(products)
+picked = {col: st.session_state.get(f"refine_{col}") or [] for col, _, _ in REFINE}
+limits = {col: picked[col] or (prof.get(field) if strict else None) for col, field, _ in REFINE}
+price_pref = prof.get("price_pref", "Mid-range") if strict else None
+with span("discover.facets"):
+    counts = facets.counts(brands=limits["brand"], stores=limits["store"], categories=limits["category"],
+                           price_pref=price_pref, min_disc=min_disc)
 
+with st.sidebar.expander("Refine", expanded=any(picked.values())):
+    for col, field, label in REFINE:
+        options = (prof.get(field) if strict else None) or facets.values(col)
+        st.multiselect(label, sorted(set(options) | set(picked[col])), key=f"refine_{col}",
+                       format_func=lambda v, col=col: f"{v} ({counts[col].get(v, 0):,})")
 
-if df.empty:
-    st.warning("No matching items. Adjust filters or update your profile preferences.")
-    st.stop()
+
+# -----------------------------------------------------
+# PAGING (cursor = ordering key of the last visible card)
+# -----------------------------------------------------
+# A delta batch (new catalog version) restarts the feed from the top.
+feed_id = (chosen, min_disc, query, tuple(recs), best_first, strict, page_size,
+           tuple(map(tuple, picked.values())), catalog_version(products))
+if st.session_state.get("feed_id") != feed_id:
+    st.session_state["feed_id"] = feed_id
+    st.session_state["feed_cursor"] = None
 
 
 # -----------------------------------------------------
-# CLEAN CAPTION
+# NIGHTLY FEED (utils/precompute.py)
 # -----------------------------------------------------
-st.caption(f"Showing **{len(df)}** items for **{chosen}**")
+# With the default filters the nightly job's top cards for this profile
+# stand in for filtering and ranking, until "load more" runs past them.
+nightly = None
+if not (strict or query or best_first or any(picked.values())) and len(recs) == len(SIGNALS):
+    nightly = precomputed_feed(products, chosen, prof, min_disc)
+    if nightly is not None and len(nightly[0]) < nightly[1]:
+        shown = page_end(nightly[0], st.session_state["feed_cursor"], page_size)
+        if shown + page_size > len(nightly[0]):
+            nightly = None
+
 
 # -----------------------------------------------------
-# PREP SESSION STATE
+# APPLY PROFILE FILTERS
 # -----------------------------------------------------
-if "saved" not in st.session_state:
-    st.session_state["saved"] = set()
+# By default the profile ranks the feed (see RANK below) and only the
+# discount slider and refinements filter; "Only exact profile matches"
+# makes it a hard filter.
+with span("discover.filter"):
+    if nightly is not None:
+        rows = key_rows(nightly[0])
+    else:
+        rows = get_index(products).select(
+            brands=limits["brand"],
+            stores=limits["store"],
+            categories=limits["category"],
+            price_pref=price_pref,
+            min_disc=min_disc,
+        )
 
-if "tracked" not in st.session_state:
-    st.session_state["tracked"] = {}
+    # Search filter
+    if query:
+        rows = np.intersect1d(rows, get_search_index(products).match(query), assume_unique=True)
+
+# Recommendation filter / ordering (signals for the whole feed in one pass)
+with span("discover.signals"):
+    scores = None
+    if best_first or len(recs) < len(SIGNALS):
+        signals = precomputed_signals(products)
+        if signals is not None:
+            codes, scores = signals[0][rows], signals[1][rows]
+        else:
+            feed = products.take(rows)
+            prices = feed["price"].to_numpy()
+            histories, _ = price_histories(feed["id"].tolist(), prices, days=60)
+            codes, scores = buy_or_wait_signals(histories, prices)
+        keep = np.isin(codes, [SIGNALS.index(r) for r in recs])
+        rows, scores = rows[keep], scores[keep]
+
+if len(rows) == 0:
+    st.warning("No matching items. Adjust filters or update your profile preferences.")
+    st.stop()
 
-if "price_cache" not in st.session_state:
-    st.session_state.price_cache = {}
+
+# -----------------------------------------------------
+# RANK
+# -----------------------------------------------------
+with span("discover.rank"):
+    if nightly is not None:
+        keys = nightly[0]
+    elif best_first:
+        keys = order_keys(rows, scores)
+    elif not strict:
+        scorer = get_scorer(products)
+        keys = order_keys(rows, scorer.scores(scorer.weights(prof), rows))
+    else:
+        keys = order_keys(rows)
 
 
 # -----------------------------------------------------
-# STORE ICONS
+# VISIBLE PAGE
 # -----------------------------------------------------
-STORE_ICONS = {
-    "Nordstrom": "🖤", "Bloomingdale's": "🛍️", "Saks Fifth Avenue": "🤍",
-    "Neiman Marcus": "💎", "Bergdorf Goodman": "👑",
-    "Chanel": "⚫", "Prada": "🪩", "Gucci": "🟩",
-    "Louis Vuitton": "🧡", "Burberry": "🤎",
-    "Sephora": "💄", "Ulta Beauty": "🪞",
-    "Macy's": "⭐", "Amazon": "🟧", "Target": "🎯",
-    "Best Buy": "🔵", "Apple Store": "",
-    "Costco": "🅲", "Home Depot": "🛠️"
-}
+total = nightly[1] if nightly is not None else len(rows)
+with span("discover.page"):
+    end = page_end(keys, st.session_state["feed_cursor"], page_size)
+    page_rows = rows[first(keys, end)]
+    df = products.take(page_rows)
+
 
+# -----------------------------------------------------
+# CLEAN CAPTION
+# -----------------------------------------------------
+st.caption(f"Showing **{end}** of **{total}** items for **{chosen}**")
 
 # -----------------------------------------------------
 # PRODUCT GRID (2 columns)
 # -----------------------------------------------------
-cols = st.columns(2, gap="large")
-
-for i, row in df.reset_index(drop=True).iterrows():
-
-    with cols[i % 2]:
-
-        # IMAGE
-        img = row["image_url"].replace("800x1000", "500x650")
-        st.image(img, use_container_width=True)
-
-        # TITLE + METADATA
-        icon = STORE_ICONS.get(row["store"], "🛒")
-        st.markdown(f"### {row['name']}")
-        st.caption(f"{icon} {row['store']} • {row['brand']} • {row['category']}")
-
-        # PRICE SECTION (perfect formatting)
-        st.markdown(
-            f"""
-            <div style="font-size:18px; font-weight:600; margin-top:4px;">
-                <span style="color:#d00000;">${row['price']:.2f}</span>
-                &nbsp;&nbsp;
-                <span style="color:gray; text-decoration: line-through;">
-                    ${row['msrp']:.2f}
-                </span>
-                &nbsp;&nbsp;
-                <span style="color:green;">-{int(row['discount_pct'])}%</span>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
+with span("discover.render"):
+    cols = st.columns(2, gap="large")
+    cards = get_cards(products).render(page_rows)
+
+    for i, (card, row, pos) in enumerate(zip(cards, df[["id", "price", "product_url"]].itertuples(index=False),
+                                             page_rows.tolist())):
+        pid = row.id
+
+        with cols[i % 2]:
+
+            # IMAGE, TITLE, METADATA AND PRICE (one prebuilt block per card)
+            st.markdown(card, unsafe_allow_html=True)
 
-        # ACTION BUTTONS
-        c1, c2, c3 = st.columns(3)
-        with c1:
-            if st.button("❤️ Save", key=f"save_{row['id']}"):
-                st.session_state["saved"].add(row["id"])
+            # ACTION BUTTONS
+            c1, c2, c3 = st.columns(3)
+            with c1:
+                if st.button("❤️ Save", key=f"save_{pid}"):
+                    record_board_op(chosen, "save", pid)
 
-        with c2:
-            if st.button("🔔 Track", key=f"track_{row['id']}"):
-                st.session_state["tracked"][row["id"]] = 10
+            with c2:
+                if st.button("🔔 Track", key=f"track_{pid}"):
+                    record_board_op(chosen, "track", pid, 10)
 
-        with c3:
-            st.link_button("🛒 Buy", row["product_url"])
+            with c3:
+                st.link_button("🛒 Buy", row.product_url)
 
-        # PRICE TREND
-        with st.expander("📉 Best Price Trend & Recommendation"):
+            # PRICE TREND (computed only while the expander is open)
+            trend = st.expander(
+                "📉 Best Price Trend & Recommendation", key=f"trend_{pid}", on_change="rerun"
+            )
+            with trend:
+                if trend.open:
+                    series = price_history(pid, row.price, days=60)
 
-            cache = st.session_state.price_cache
+                    st.line_chart(series)
 
-            if row["id"] not in cache:
-                cache[row["id"]] = simulate_price_history(row["price"], days=60)
+                    rec, note = buy_or_wait_signal(series, row.price)
+                    st.markdown(f"**Recommendation: {rec}**")
+                    st.caption(note)
 
-            series = cache[row["id"]]
+            # MORE LIKE THIS (nearest neighbours, looked up only while open)
+            similar = st.expander("🧭 More like this", key=f"similar_{pid}", on_change="rerun")
+            with similar:
+                if similar.open:
+                    like, _ = get_similar(products).similar(pos, k=4)
+                    st.markdown(render_strip(products, like), unsafe_allow_html=True)
 
-            st.line_chart(series)
 
-            rec, note = buy_or_wait_signal(series, row["price"])
-            st.markdown(f"**Recommendation: {rec}**")
-            st.caption(note)
+# -----------------------------------------------------
+# LOAD MORE
+# -----------------------------------------------------
+if end < total:
+    # Thumbnails of the next page download while this one is browsed.
+    get_cards(products).prefetch(rows[first(keys, min(end + page_size, len(keys)))[end:]])
+    if st.button(f"Load {min(page_size, total - end)} more"):
+        st.session_state["feed_cursor"] = next_cursor(keys, end, page_size)
+        st.rerun()
+
+metrics.debug_panel()
@@ -1,29 +1,21 @@
 import streamlit as st
-import pandas as pd
-from utils.storage import save_board, get_board
-from utils.price import simulate_price_history, buy_or_wait_signal
+from utils.storage import get_board, record_board_op
+from utils.price import price_history, buy_or_wait_signal
+from utils.cards import get_cards, render_strip
+from utils.catalog import get_lookup, load_products
+from utils.similar import get_similar
+from utils import metrics
+from utils.metrics import span
 
 # -------------------------------------------
 # PAGE HEADER
 # -------------------------------------------
 st.set_page_config(page_title="Boards & Alerts – WishDrop", page_icon="❤️", layout="centered")
+metrics.page_start("boards")
 st.header("❤️ Boards & Alerts")
 
-products = pd.read_csv("data/sample_products.csv")
-
-# -------------------------------------------
-# STORE ICON MAP
-# -------------------------------------------
-STORE_ICONS = {
-    "Nordstrom": "🖤", "Bloomingdale's": "🛍️", "Saks Fifth Avenue": "🤍",
-    "Neiman Marcus": "💎", "Bergdorf Goodman": "👑",
-    "Chanel": "⚫", "Prada": "🪩", "Gucci": "🟩",
-    "Louis Vuitton": "🧡", "Burberry": "🤎",
-    "Sephora": "💄", "Ulta Beauty": "🪞",
-    "Macy's": "⭐", "Amazon": "🟧", "Target": "🎯",
-    "Best Buy": "🔵", "Apple Store": "",
-    "Costco": "🅲", "Home Depot": "🛠️"
-}
+products = load_products()
+lookup = get_lookup(products)
 
 # -------------------------------------------
 # USER SELECTION (LEFT SIDEBAR)
@@ -34,102 +26,113 @@ if not user:
     st.info("Enter your profile name to load your saved items.")
     st.stop()
 
+# Every click is recorded as it happens (utils/storage.py, board journal),
+# so the stored board is always current.
 board_data = get_board(user)
+saved_ids = list(board_data.get("saved", []))
+tracked_items = dict(board_data.get("tracked", {}))
 
-# Prepare session state cleanly
-if "saved" not in st.session_state:
-    st.session_state["saved"] = set(board_data.get("saved", []))
+# One gather per section; ids that left the catalog are dropped here.
+with span("boards.lookup"):
+    saved_rows = lookup.positions(saved_ids)
+    saved_rows = saved_rows[saved_rows >= 0]
+    tracked_rows = lookup.positions(list(tracked_items))
+    tracked_rows = tracked_rows[tracked_rows >= 0]
+    saved_products = products.take(saved_rows)
+    tracked_products = products.take(tracked_rows)
+    unavailable = sorted((set(saved_ids) - set(saved_products["id"])) | (set(tracked_items) - set(tracked_products["id"])))
 
-if "tracked" not in st.session_state:
-    st.session_state["tracked"] = dict(board_data.get("tracked", {}))
 
-saved_ids = list(st.session_state["saved"])
-tracked_items = dict(st.session_state["tracked"])
+# -------------------------------------------
+# MORE LIKE THIS (nearest neighbours of a card)
+# -------------------------------------------
+def more_like_this(section, pid, row):
+    """A strip of similar products under a card, looked up only while open."""
+    similar = st.expander("🧭 More like this", key=f"similar_{section}_{pid}", on_change="rerun")
+    with similar:
+        if similar.open:
+            like, _ = get_similar(products).similar(row, k=4)
+            st.markdown(render_strip(products, like), unsafe_allow_html=True)
+
 
 # -------------------------------------------
 # SAVED ITEMS SECTION
 # -------------------------------------------
 st.subheader("⭐ Saved Items")
 
-if not saved_ids:
-    st.info("No saved items yet.")
-else:
-    cols = st.columns(2, gap="large")
-
-    for i, pid in enumerate(saved_ids):
-        item = products[products["id"] == pid].iloc[0]
-
-        with cols[i % 2]:
-            st.image(item["image_url"].replace("800x1000", "400x500"), use_container_width=True)
-
-            icon = STORE_ICONS.get(item["store"], "🛒")
-            st.markdown(f"### {item['name']}")
-            st.caption(f"{icon} {item['store']} • {item['brand']} • {item['category']}")
-
-            st.markdown(
-                f"""
-                <div style="font-size:18px; font-weight:600;">
-                    <span style="color:#d00000;">${item['price']:.2f}</span>
-                    &nbsp;&nbsp;
-                    <span style="color:gray; text-decoration: line-through;">
-                        ${item['msrp']:.2f}
-                    </span>
-                    &nbsp;&nbsp;
-                    <span style="color:green;">-{int(item['discount_pct'])}%</span>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
-
-            if st.button("❌ Remove", key=f"remove_{pid}"):
-                st.session_state["saved"].remove(pid)
-                st.rerun()
+with span("boards.saved"):
+    if not saved_ids:
+        st.info("No saved items yet.")
+    else:
+        cols = st.columns(2, gap="large")
+
+        cards = get_cards(products, "400x500").render(saved_rows)
+
+        for i, (card, pid, row) in enumerate(zip(cards, saved_products["id"].tolist(), saved_rows.tolist())):
+            with cols[i % 2]:
+                st.markdown(card, unsafe_allow_html=True)
+                more_like_this("saved", pid, row)
+
+                if st.button("❌ Remove", key=f"remove_{pid}"):
+                    record_board_op(user, "unsave", pid)
+                    st.rerun()
 
 # -------------------------------------------
 # TRACKED ALERTS SECTION
 # -------------------------------------------
 st.subheader("🔔 Price Alerts")
 
-if not tracked_items:
-    st.info("No active price alerts.")
-else:
-    cols = st.columns(2, gap="large")
+with span("boards.tracked"):
+    if not tracked_items:
+        st.info("No active price alerts.")
+    else:
+        cols = st.columns(2, gap="large")
 
-    for i, (pid, threshold) in enumerate(tracked_items.items()):
-        item = products[products["id"] == pid].iloc[0]
+        cards = get_cards(products, "400x500", price=False).render(tracked_rows)
 
-        with cols[i % 2]:
-            st.image(item["image_url"].replace("800x1000", "400x500"), use_container_width=True)
+        for i, (card, item, row) in enumerate(zip(cards, tracked_products[["id", "price"]].itertuples(index=False),
+                                                  tracked_rows.tolist())):
+            pid = item.id
+            threshold = tracked_items[pid]
 
-            icon = STORE_ICONS.get(item["store"], "🛒")
-            st.markdown(f"### {item['name']}")
-            st.caption(f"{icon} {item['store']} • {item['brand']} • {item['category']}")
+            with cols[i % 2]:
+                st.markdown(card, unsafe_allow_html=True)
 
-            st.markdown(
-                f"**Current Price:** ${item['price']:.2f}  
-                Alert triggers if price drops **{threshold}%**.",
-                unsafe_allow_html=True
-            )
+                st.markdown(
+                    f"**Current Price:** ${item.price:.2f}  \n"
+                    f"Alert triggers if price drops **{threshold}%**.",
+                    unsafe_allow_html=True
+                )
 
-            with st.expander("📉 Price Trend"):
-                series = simulate_price_history(item["price"], days=60)
-                st.line_chart(series)
+                # Price trend (computed only while the expander is open)
+                trend = st.expander("📉 Price Trend", key=f"trend_{pid}", on_change="rerun")
+                with trend:
+                    if trend.open:
+                        series = price_history(pid, item.price, days=60)
+                        st.line_chart(series)
 
-                rec, note = buy_or_wait_signal(series, item["price"])
-                st.markdown(f"**AI Recommendation: {rec}**")
-                st.caption(note)
+                        rec, note = buy_or_wait_signal(series, item.price)
+                        st.markdown(f"**AI Recommendation: {rec}**")
+                        st.caption(note)
 
-            if st.button("❌ Stop Tracking", key=f"stop_{pid}"):
-                del st.session_state["tracked"][pid]
-                st.rerun()
+                more_like_this("tracked", pid, row)
+
+                if st.button("❌ Stop Tracking", key=f"stop_{pid}"):
+                    record_board_op(user, "untrack", pid)
+                    st.rerun()
 
 # -------------------------------------------
-# SAVE BOARD BUTTON
+# ITEMS NO LONGER IN THE CATALOG
 # -------------------------------------------
+if unavailable:
+    st.warning(f"{len(unavailable)} item(s) on this board are no longer available: {', '.join(unavailable)}")
+    if st.button("🧹 Remove unavailable items"):
+        for pid in unavailable:
+            record_board_op(user, "unsave", pid)
+            record_board_op(user, "untrack", pid)
+        st.rerun()
+
 st.sidebar.markdown("---")
-if st.sidebar.button("💾 Save Board"):
-    save_board(
-        user,
-        {"saved": list(st.session_state["saved"]), "tracked": st.session_state["tracked"]}
-    )
-    st.sidebar.success("Board saved!")
+st.sidebar.caption("💾 Changes are saved automatically.")
+
+metrics.debug_panel()
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import generate_products
+from utils import alerts, storage
+from utils.alerts import AlertEngine, Outbox
+from utils.catalog import load_products
+from utils.ingest import apply_delta
+
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    csv = tmp_path / "products.csv"
+    generate_products.main(["--rows", "200", "--out", str(csv)])
+    products = load_products(csv)
+    ids = products["id"].astype(str).tolist()[:3]
+    # A flat history at the starting price: each product's reference stays put while its price moves.
+    reference = dict(zip(ids, products["price"].to_numpy(np.float64)[:3]))
+    monkeypatch.setattr(alerts, "price_histories", lambda pids, prices, days: (
+        np.array([[reference[p]] * days for p in pids], dtype=np.float32), None))
+    engine = storage.SqliteBackend(tmp_path / "db.sqlite")
+    engine.put("boards", "alice", {"saved": [], "tracked": {ids[0]: 10, ids[1]: 10}})
+    engine.put("boards", "bob", {"saved": [], "tracked": {ids[0]: 25}})
+
+    def reprice(pid, factor):
+        apply_delta(pd.DataFrame({"id": [pid], "price": [round(reference[pid] * factor, 2)]}), csv)
+
+    def new_engine(outbox=None):
+        return AlertEngine(engine, outbox or Outbox(tmp_path / "db.sqlite"), products)
+
+    return ids, engine, reprice, new_engine, tmp_path / "db.sqlite"
+
+
+def queued(path):
+    return sorted((a["user"], a["product_id"], a["threshold"]) for a in Outbox(path).pending(1000))
+
+
+def test_unchanged_catalog_queues_each_alert_once(setup):
+    ids, _, reprice, new_engine, db = setup
+    reprice(ids[0], 0.8)
+    engine = new_engine()
+    assert engine.run_cycle()["queued"] == 1
+    assert engine.run_cycle()["queued"] == 0
+    assert engine.run_cycle()["triggered"] == 1
+    # A restarted engine has no memory of what it sent; the outbox still has.
+    assert new_engine().run_cycle()["queued"] == 0
+    assert queued(db) == [("alice", ids[0], 10.0)]
+
+
+def test_price_change_rearms_the_alert(setup):
+    ids, _, reprice, new_engine, db = setup
+    engine = new_engine()
+    reprice(ids[0], 0.8)
+    assert engine.run_cycle()["queued"] == 1
+    reprice(ids[0], 0.7)
+    assert engine.run_cycle()["queued"] == 2  # alice again at the new price, and bob's 25% now
+    assert engine.run_cycle()["queued"] == 0
+    # Back up and down to the earlier price: that alert is in the outbox already.
+    reprice(ids[0], 1.0)
+    assert engine.run_cycle()["triggered"] == 0
+    reprice(ids[0], 0.8)
+    assert engine.run_cycle()["queued"] == 0
+    prices = sorted(a["price"] for a in Outbox(db).pending(1000) if a["user"] == "alice")
+    assert len(prices) == 2 and prices[0] < prices[1]
+    assert queued(db) == [("alice", ids[0], 10.0), ("alice", ids[0], 10.0), ("bob", ids[0], 25.0)]
+
+
+def test_board_edits_are_picked_up_on_the_next_cycle(setup):
+    ids, backend, reprice, new_engine, db = setup
+    engine = new_engine()
+    reprice(ids[2], 0.9)
+    assert engine.run_cycle()["triggered"] == 0
+    backend.append_ops([("bob", "track", ids[2], 5)])
+    m = engine.run_cycle()
+    assert (m["pairs"], m["queued"]) == (4, 1)
+    backend.append_ops([("bob", "untrack", ids[2], None)])
+    m = engine.run_cycle()
+    assert (m["pairs"], m["triggered"]) == (3, 0)
+    assert queued(db) == [("bob", ids[2], 5.0)]
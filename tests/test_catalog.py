@@ -0,0 +1,35 @@
+import threading
+import time
+
+import pandas as pd
+
+from utils.catalog import derived
+
+
+def test_a_slow_build_only_blocks_callers_of_the_same_structure():
+    products = pd.DataFrame({"id": ["P-1", "P-2"]})
+    started, release, builds = threading.Event(), threading.Event(), []
+
+    def slow(p):
+        builds.append(1)
+        started.set()
+        release.wait(10)
+        return "slow"
+
+    waiting = [threading.Thread(target=derived, args=(products, "test_slow", slow)) for _ in range(3)]
+    waiting[0].start()
+    assert started.wait(10)
+    for t in waiting[1:]:
+        t.start()
+
+    t0 = time.perf_counter()
+    assert derived(products, "test_other", lambda p: "other") == "other"
+    assert derived(products, "test_other", lambda p: "rebuilt") == "other"
+    assert time.perf_counter() - t0 < 1, "another structure waited for the slow build"
+
+    time.sleep(0.1)
+    assert all(t.is_alive() for t in waiting), "callers of the same structure wait for its build"
+    release.set()
+    for t in waiting:
+        t.join(10)
+    assert derived(products, "test_slow", slow) == "slow" and len(builds) == 1
@@ -0,0 +1,131 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import generate_products
+from utils import facets as facets_module
+from utils.catalog import catalog_alive, load_products
+from utils.facets import FACETS, FacetCounts, get_facets
+from utils.index import PRICE_BANDS
+from utils.ingest import apply_delta
+
+ROOT = Path(__file__).resolve().parents[1]
+ROWS = 3000
+
+
+def pandas_counts(products, brands=None, stores=None, categories=None, price_pref=None, min_disc=0):
+    """Each facet grouped over the products matching every other filter."""
+    alive = catalog_alive(products)
+    keep = np.ones(len(products), dtype=bool) if alive is None else np.asarray(alive, dtype=bool).copy()
+    keep &= products["discount_pct"].to_numpy() >= min_disc
+    if price_pref in PRICE_BANDS:
+        keep &= PRICE_BANDS[price_pref](products)
+    wanted = {"brand": brands, "store": stores, "category": categories}
+    out = {}
+    for col in FACETS:
+        rows = keep.copy()
+        for other in FACETS:
+            if other != col and wanted[other]:
+                rows &= products[other].isin(wanted[other]).to_numpy()
+        sizes = products[rows].groupby(col, observed=True).size()
+        out[col] = {value: int(n) for value, n in sizes.items() if n}
+    return out
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    csv = tmp_path / "products.csv"
+    generate_products.main(["--rows", str(ROWS), "--out", str(csv)])
+    return csv
+
+
+def filters(products):
+    brands = sorted(products["brand"].astype(str).unique())
+    stores = sorted(products["store"].astype(str).unique())
+    categories = sorted(products["category"].astype(str).unique())
+    return [
+        {},
+        {"price_pref": "Luxury Only"},
+        {"price_pref": "Budget", "min_disc": 30},
+        {"brands": brands[:2]},
+        {"brands": brands[:3], "stores": stores[:2]},
+        {"brands": brands[1:4], "categories": categories[:2], "price_pref": "Mid-range"},
+        {"stores": stores[:1], "categories": categories[:3], "min_disc": 50},
+        {"brands": ["No Such Brand"]},
+    ]
+
+
+@pytest.mark.parametrize("cube", [True, False])
+def test_counts_match_pandas_groupby(catalog, monkeypatch, cube):
+    if not cube:
+        monkeypatch.setattr(facets_module, "FACET_CUBE_BYTES", 0)
+    products = load_products(catalog)
+    facets = FacetCounts(products)
+    assert facets.use_cube == cube
+    for f in filters(products):
+        assert facets.counts(**f) == pandas_counts(products, **f), f
+
+
+def test_counts_follow_deletes_and_new_labels(catalog):
+    products = load_products(catalog)
+    facets = get_facets(products)
+    brand = products["brand"].astype(str).iloc[0]
+    gone = products["id"].astype(str)[products["brand"].astype(str) == brand].head(5)
+    apply_delta(pd.DataFrame({"id": gone, "op": "delete"}), catalog)
+    products = load_products(catalog)
+    assert get_facets(products) is facets, "a delete patches the counts"
+    for f in filters(products):
+        assert facets.counts(**f) == pandas_counts(products, **f), f
+
+    apply_delta(pd.DataFrame({"id": ["N-1"], "name": "New", "brand": "Brand New", "category": "New > Things",
+                              "store": "New Store", "msrp": 100.0, "price": 50.0}), catalog)
+    products = load_products(catalog)
+    facets = get_facets(products)
+    assert facets.counts()["brand"]["Brand New"] == 1
+    for f in filters(products):
+        assert facets.counts(**f) == pandas_counts(products, **f), f
+
+
+PROFILE_PAGE = r"""
+import json
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("pages/1_👤_Profile.py", default_timeout=120)
+at.run()
+at.selectbox[0].select("vanished").run()
+print(json.dumps({"errors": [str(e.value) for e in at.exception],
+                  "options": {m.label: list(m.options) for m in at.multiselect},
+                  "values": {m.label: list(m.value) for m in at.multiselect}}))
+"""
+
+
+def test_saved_values_stay_selectable_after_their_products_are_removed(tmp_path):
+    csv = tmp_path / "products.csv"
+    generate_products.main(["--rows", "200", "--out", str(csv)])
+    frame = pd.read_csv(csv, dtype={"id": str})
+    frame.loc[:9, ["brand", "store", "category"]] = ["Vanished Brand", "Closed Store", "Retired > Category"]
+    frame.to_csv(csv, index=False)
+    apply_delta(pd.DataFrame({"id": frame["id"][:10], "op": "delete"}), csv)
+    values = get_facets(load_products(csv)).values
+    assert "Vanished Brand" not in values("brand") and "Closed Store" not in values("store")
+
+    env = dict(os.environ, PYTHONPATH=str(ROOT), WISHDROP_PRODUCTS=str(csv), WISHDROP_DB=str(tmp_path / "db.sqlite"),
+               WISHDROP_THUMBNAILS="0")
+    saved = {"price_pref": "Mid-range", "brands": ["Vanished Brand"], "stores": ["Closed Store"],
+             "categories": ["Retired > Category"]}
+    subprocess.run([sys.executable, "-c", f"from utils import storage; storage.save_profile('vanished', {saved!r})"],
+                   cwd=ROOT, env=env, check=True)
+    out = subprocess.run([sys.executable, "-c", PROFILE_PAGE], cwd=ROOT, env=env, check=True,
+                         capture_output=True, text=True)
+    page = json.loads(out.stdout.strip().splitlines()[-1])
+
+    assert page["errors"] == []
+    for label, value in (("Choose brands", "Vanished Brand"), ("Choose stores", "Closed Store"),
+                         ("Categories", "Retired > Category")):
+        assert any(o.startswith(value) for o in page["options"][label]), label
+        assert page["values"][label] == [value]
@@ -0,0 +1,133 @@
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from utils.images import ImagePipeline, ThumbnailCache, placeholder
+
+SIZE = "50x65"
+
+
+def jpeg(seed):
+    buf = io.BytesIO()
+    Image.new("RGB", (80, 100), (seed * 37 % 256, seed * 91 % 256, 128)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+class Handler(BaseHTTPRequestHandler):
+    """/img/<n>, /slow/<n> after 2 s, /gone/<n> 404, /moved/<n> 302 to /img/<n> with no length."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        kind, n = self.path.strip("/").split("/")
+        self.server.requests.append(self.path)
+        if kind == "gone":
+            self.send_error(404)
+            return
+        if kind == "moved":
+            self.send_response(302)
+            self.send_header("Location", f"/img/{n}")
+            self.end_headers()  # kept alive, no Content-Length, no body
+            return
+        if kind == "slow":
+            time.sleep(2)
+        body = jpeg(int(n))
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def requests_to(url_of, kind):
+    return [u for u in url_of.server.requests if u.startswith(f"/{kind}/")]
+
+
+@pytest.fixture
+def url_of():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads, server.requests = True, []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def url(kind, n):
+        return f"http://127.0.0.1:{server.server_address[1]}/{kind}/{n}"
+    url.server = server
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def pipeline(tmp_path, **cache_args):
+    return ImagePipeline(ThumbnailCache(tmp_path / "thumbs", url_prefix="thumbs", **cache_args), timeout=0.5)
+
+
+def test_second_render_is_served_from_the_cache(tmp_path, url_of):
+    pipe = pipeline(tmp_path)
+    urls = [url_of("img", n) for n in range(6)]
+    first = pipe.resolve(urls, SIZE, wait=10)
+    assert placeholder(SIZE) not in first
+    for src in first:
+        with Image.open(tmp_path / src) as img:
+            assert img.size == (50, 65)
+    assert pipe.resolve(urls, SIZE, wait=10) == first
+    assert len(requests_to(url_of, "img")) == 6
+    assert pipe.cache.stats()["hits"] == 6
+
+
+def test_redirect_without_length_does_not_stall(tmp_path, url_of):
+    pipe = pipeline(tmp_path)
+    t0 = time.perf_counter()
+    [src] = pipe.resolve([url_of("moved", 3)], SIZE, wait=10)
+    assert time.perf_counter() - t0 < 0.5
+    assert src != placeholder(SIZE)
+
+
+def test_missing_and_slow_images_get_the_placeholder(tmp_path, url_of):
+    pipe = pipeline(tmp_path)
+    t0 = time.perf_counter()
+    srcs = pipe.resolve([url_of("gone", 0), url_of("slow", 1), url_of("img", 2)], SIZE, wait=1.5)
+    assert time.perf_counter() - t0 < 1.5  # the slow fetch times out after 0.5 s
+    assert srcs[:2] == [placeholder(SIZE)] * 2 and srcs[2] != placeholder(SIZE)
+    assert pipe.failed == 2
+
+
+def test_failed_urls_wait_out_the_backoff_before_a_retry(tmp_path, url_of):
+    pipe = pipeline(tmp_path, retry_failed=0.5)
+    dead = [url_of("gone", 0)]
+    assert pipe.resolve(dead, SIZE, wait=5) == [placeholder(SIZE)]
+    assert pipe.resolve(dead, SIZE, wait=5) == [placeholder(SIZE)]
+    assert len(requests_to(url_of, "gone")) == 1
+    time.sleep(0.6)
+    pipe.resolve(dead, SIZE, wait=5)
+    assert len(requests_to(url_of, "gone")) == 2
+
+
+def test_eviction_keeps_the_cache_under_its_cap(tmp_path, url_of):
+    cache = ThumbnailCache(tmp_path / "thumbs", max_bytes=1500, url_prefix="thumbs")
+    pipe = ImagePipeline(cache)
+    urls = [url_of("img", n) for n in range(12)]
+    for url in urls:  # one at a time so the least recently used are the first ones
+        pipe.resolve([url], SIZE, wait=10)
+    stats = cache.stats()
+    assert 0 < stats["bytes"] <= stats["max_bytes"] and stats["evictions"] > 0
+    assert sum(1 for _ in cache.path.glob("*/*.jpg")) == stats["entries"]
+    found, _ = cache.lookup([cache.key(u, SIZE) for u in urls])
+    assert cache.key(urls[-1], SIZE) in found and cache.key(urls[0], SIZE) not in found
+
+
+def test_rerender_does_not_rewrite_last_used(tmp_path, url_of):
+    pipe = pipeline(tmp_path)
+    urls = [url_of("img", n) for n in range(3)]
+    pipe.resolve(urls, SIZE, wait=10)
+    keys = [pipe.cache.key(u, SIZE) for u in urls]
+    pipe.cache.lookup(keys)
+    before = pipe.cache._conn().total_changes
+    pipe.cache.lookup(keys)
+    assert pipe.cache._conn().total_changes == before
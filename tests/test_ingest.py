@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import generate_products
+from utils.catalog import COLUMNS, build_store, catalog_alive, catalog_version, get_lookup, load_products, open_store
+from utils.index import CatalogIndex, get_index
+from utils.ingest import apply_delta
+from utils.search import SearchIndex, get_search_index
+
+ROWS = 2000
+PROFILES = [
+    {"brands": ["Gucci", "Prada"], "stores": [], "categories": [], "price_pref": "Luxury Only"},
+    {"brands": [], "stores": [], "categories": ["Women > Bags"], "price_pref": "Budget"},
+    {"brands": [], "stores": [], "categories": [], "price_pref": "Mid-range"},
+]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    csv = tmp_path / "products.csv"
+    generate_products.main(["--rows", str(ROWS), "--out", str(csv)])
+    return csv
+
+
+def merged_store(frame, tmp_path):
+    """A store built from scratch from the catalog the deltas should have produced."""
+    csv = tmp_path / "merged" / "products.csv"
+    csv.parent.mkdir()
+    frame.to_csv(csv, index=False)
+    return open_store(build_store(csv))
+
+
+def reprice(frame, ids, prices):
+    frame = frame.set_index("id")
+    frame.loc[ids, "price"] = prices
+    # The stored msrp is float32; the delta's price is divided by it as given.
+    msrp = frame.loc[ids, "msrp"].to_numpy(np.float32).astype(np.float64)
+    frame.loc[ids, "discount_pct"] = np.clip(np.round((1 - np.asarray(prices, np.float64) / msrp) * 100), 0, 100)
+    return frame.reset_index()
+
+
+def assert_same_catalog(products, fresh):
+    alive = catalog_alive(products)
+    live = products[alive] if alive is not None else products
+    assert len(live) == len(fresh)
+    for col in COLUMNS:
+        got, want = live[col].to_numpy(), fresh[col].to_numpy()
+        if col in ("msrp", "price", "discount_pct"):
+            assert np.array_equal(got.astype(np.float64), want.astype(np.float64)), col
+        else:  # a CSV reads an empty text cell back as missing
+            got, want = (pd.Series(v, dtype=object).fillna("").astype(str).to_numpy() for v in (got, want))
+            assert np.array_equal(got, want), col
+
+
+def assert_same_readers(products, fresh):
+    """Filter and search results name the same products as indexes built on the fresh store."""
+    ids, fresh_ids = products["id"].to_numpy().astype(str), fresh["id"].to_numpy().astype(str)
+    index, fresh_index = get_index(products), CatalogIndex(fresh)
+    for prof in PROFILES:
+        assert sorted(ids[index.select(**prof)]) == sorted(fresh_ids[fresh_index.select(**prof)])
+    search, fresh_search = get_search_index(products), SearchIndex(fresh)
+    alive = catalog_alive(products)
+    for q in ("gucci", "bag", "new arrival", "a"):
+        rows = search.match(q)
+        rows = rows[alive[rows]] if alive is not None else rows
+        assert sorted(ids[rows]) == sorted(fresh_ids[fresh_search.match(q)])
+
+
+def test_price_delta_is_written_in_place(catalog, tmp_path):
+    products = load_products(catalog)
+    get_index(products), get_search_index(products)
+    frame = pd.read_csv(catalog, dtype={"id": str})
+    rng = np.random.default_rng(0)
+    ids = frame["id"].to_numpy()[rng.choice(ROWS, 100, replace=False)]
+    prices = np.round(frame.set_index("id").loc[ids, "price"].to_numpy() * 0.7, 2)
+
+    summary = apply_delta(pd.DataFrame({"id": ids, "price": prices}), catalog)
+
+    assert summary["updated"] == 100 and not summary["reshaped"]
+    assert load_products(catalog) is products, "a price-only delta keeps the mapped catalog"
+    assert catalog_version(products) == summary["version"] == 1
+    fresh = merged_store(reprice(frame, ids, prices), tmp_path)
+    assert_same_catalog(products, fresh)
+    assert_same_readers(products, fresh)
+
+
+def test_reshaping_delta_matches_a_fresh_build(catalog, tmp_path):
+    products = load_products(catalog)
+    get_index(products), get_search_index(products)
+    frame = pd.read_csv(catalog, dtype={"id": str})
+    gone = frame["id"].to_numpy()[:50]
+    changed = frame["id"].to_numpy()[100:110]
+    new = pd.DataFrame({
+        "id": [f"N-{i}" for i in range(5)], "name": "New arrival",
+        "brand": ["Gucci", "Brand New Label"] * 2 + ["Prada"], "category": "Women > Capes", "store": "Fresh Store", "msrp": 1000.0, "price": 700.0,
+    })
+    delta = pd.concat([
+        pd.DataFrame({"id": gone, "op": "delete"}),
+        pd.DataFrame({"id": changed, "category": "Women > Capes"}),
+        new,
+    ])
+
+    summary = apply_delta(delta, catalog)
+
+    assert (summary["deleted"], summary["inserted"], summary["updated"]) == (50, 5, 10) and summary["reshaped"]
+    reopened = load_products(catalog)
+    assert reopened is not products, "a reshaped store is reopened"
+    assert catalog_version(reopened) == summary["version"]
+    expected = frame[~frame["id"].isin(gone)].copy()
+    expected.loc[expected["id"].isin(changed), "category"] = "Women > Capes"
+    new = new.assign(discount_pct=30, image_url=np.nan, product_url=np.nan)
+    fresh = merged_store(pd.concat([expected, new[COLUMNS]], ignore_index=True), tmp_path)
+    assert_same_catalog(reopened, fresh)
+    assert_same_readers(reopened, fresh)
+    lookup = get_lookup(reopened)
+    assert (lookup.positions(gone) == -1).all() and (lookup.positions(new["id"]) >= ROWS).all()
+
+
+def test_readers_catch_up_across_versions(catalog, tmp_path):
+    products = load_products(catalog)
+    index, search = get_index(products), get_search_index(products)
+    frame = pd.read_csv(catalog, dtype={"id": str})
+    ids = frame["id"].to_numpy()
+    for version, (lo, factor) in enumerate([(0, 0.5), (500, 0.9), (1000, 0.2)], start=1):
+        pick = ids[lo:lo + 20]  # small enough for readers to patch (utils.catalog.PATCH_LIMIT)
+        prices = np.round(frame.set_index("id").loc[pick, "price"].to_numpy() * factor, 2)
+        apply_delta(pd.DataFrame({"id": pick, "price": prices}), catalog)
+        frame = reprice(frame, pick, prices)
+        assert catalog_version(load_products(catalog)) == version
+        if version < 3:  # a reader on every version, then one skipping a version
+            assert get_index(products) is index
+    # Deleting products makes them vanish from readers that were built before the delete.
+    apply_delta(pd.DataFrame({"id": ids[:10], "op": "delete"}), catalog)
+    frame = frame[~frame["id"].isin(ids[:10])]
+
+    assert load_products(catalog) is products and catalog_version(products) == 4
+    fresh = merged_store(frame, tmp_path)
+    assert_same_catalog(products, fresh)
+    assert_same_readers(products, fresh)
+    assert get_index(products) is index and get_search_index(products) is search, "patched, not rebuilt"
@@ -0,0 +1,38 @@
+import pytest
+import streamlit as st
+
+from utils import metrics
+
+
+@pytest.fixture
+def visit(monkeypatch):
+    def open_page(debug=None, token=None, flag=None):
+        for name, value in (("WISHDROP_DEBUG_TOKEN", token), ("WISHDROP_DEBUG", flag)):
+            if value is None:
+                monkeypatch.delenv(name, raising=False)
+            else:
+                monkeypatch.setenv(name, value)
+        monkeypatch.setattr(st, "query_params", {} if debug is None else {"debug": debug})
+        return metrics.debug_requested()
+    return open_page
+
+
+def test_without_a_token_only_the_server_flag_shows_the_panel(visit):
+    assert not visit()
+    assert not visit(debug="1")
+    assert visit(flag="1")
+
+
+def test_wrong_token_is_refused(visit):
+    assert not visit(token="s3cret")
+    assert not visit(debug="guess", token="s3cret")
+    assert not visit(debug="1", token="s3cret", flag="1")
+
+
+def test_right_token_shows_the_panel(visit):
+    assert visit(debug="s3cret", token="s3cret")
+
+
+@pytest.mark.parametrize("debug, token", [("é", "s3cret"), ("s3cret", "sécret"), ("sécret", "sécret")])
+def test_non_ascii_values_compare_instead_of_raising(visit, debug, token):
+    assert visit(debug=debug, token=token) == (debug == token)
@@ -0,0 +1,69 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import search
+from utils.search import SearchIndex
+
+WORDS = ["Classic", "Bag", "Ultra", "Jacket", "Crème", "Brûlée", "Über", "Straße", "東京", "Façade", "İstanbul",
+         "50%", "(Limited)", "[Edition]", "A+B", "C++", "Mr.", "x*y", "a.b", "$9", "^Top", "Yes|No", "Back\\slash",
+         "What?", "Tote", "Heel", "Sneaker", "Boot"]
+QUERIES = ["", "g", "ic", "gu", "bag", "classic bag", "ultra jacket", "zzz", "crème", "CRÈME", "é", "üb", "ße",
+           "東", "東京", "ç", "i̇", "istanbul", ".", "a.b", "x*y", "*", "+", "c++", "(limited)", "[", "]", "$", "^",
+           "|", "\\", "?", "%", "50%", "mr. ", " ", "women > sh", "> "]
+
+
+def apply_search(df, query):
+    """The Discover page's matching before the index."""
+    q = query.lower()
+    mask = df.apply(
+        lambda r: q in r["name"].lower()
+                  or q in r["brand"].lower()
+                  or q in r["category"].lower()
+                  or q in r["store"].lower(),
+        axis=1,
+    )
+    return np.flatnonzero(mask.to_numpy())
+
+
+def make_products(n=800):
+    rng = np.random.default_rng(3)
+    names = [" ".join(rng.choice(WORDS, rng.integers(1, 4))) + f" {i % 300}" for i in range(n)]
+    return pd.DataFrame({
+        "name": names,
+        "brand": rng.choice(["Gucci", "Prada", "Chloé", "Dolce & Gabbana", "A.P.C.", "Maison Margiela*"], n),
+        "category": rng.choice(["Women > Shoes", "Men > Bags", "Kids > Tops (3+)", "Home > Décor"], n),
+        "store": rng.choice(["Nordstrom", "Saks", "Galeries Lafayette", "Kaufhof [DE]"], n),
+    })
+
+
+PRODUCTS = make_products()
+
+
+@lru_cache(maxsize=None)
+def expected(query):
+    return apply_search(PRODUCTS, query)
+
+
+@pytest.fixture(params=["scan", "trigram"])
+def index(request, monkeypatch):
+    monkeypatch.setattr(search, "TRIGRAM_MIN_LABELS", 0 if request.param == "trigram" else 10 ** 9)
+    ix = SearchIndex(PRODUCTS)
+    assert (ix.fields[0].grams is not None) == (request.param == "trigram")
+    return ix
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_match_equals_row_wise_apply(index, query):
+    assert np.array_equal(index.match(query), expected(query))
+
+
+def test_match_equals_row_wise_apply_on_random_substrings(index):
+    rng = np.random.default_rng(4)
+    for _ in range(100):
+        label = PRODUCTS.iat[rng.integers(len(PRODUCTS)), rng.integers(4)]
+        lo = rng.integers(len(label))
+        query = label[lo:lo + rng.integers(1, 7)]
+        assert np.array_equal(index.match(query), expected(query)), query
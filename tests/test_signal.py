@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.price import SIGNALS, buy_or_wait_signal, buy_or_wait_signals, simulate_price_histories
+
+
+def scalar(histories, current):
+    return [buy_or_wait_signal(pd.Series(h), c)[0] for h, c in zip(histories, current)]
+
+
+def batch(histories, current):
+    codes, _ = buy_or_wait_signals(histories, current)
+    return [SIGNALS[c] for c in codes]
+
+
+@pytest.mark.parametrize("days", [60, 30, 7, 2, 1])
+def test_matches_scalar_on_simulated_histories(days):
+    rng = np.random.default_rng(days)
+    histories, _ = simulate_price_histories([f"P-{i}" for i in range(2000)], rng.uniform(20, 2500, 2000), days)
+    # Current prices around the recent range, including exact ties with the history.
+    current = histories[:, -1] * rng.choice([0.9, 0.95, 1.0, 1.02, 1.05], 2000).astype(np.float32)
+    assert batch(histories, current) == scalar(histories, current)
+
+
+def test_matches_scalar_on_random_walks():
+    rng = np.random.default_rng(1)
+    histories = np.cumprod(rng.uniform(0.95, 1.05, (1000, 45)), axis=1) * rng.uniform(10, 500, (1000, 1))
+    current = histories[:, -1] * rng.uniform(0.9, 1.1, 1000)
+    assert batch(histories, current) == scalar(histories, current)
+
+
+@pytest.mark.parametrize("current", [80.0, 100.0, 101.0, 102.0, 103.0, 120.0])
+def test_matches_scalar_on_flat_histories(current):
+    histories = np.full((3, 30), 100.0, dtype=np.float32)
+    prices = np.full(3, current, dtype=np.float32)
+    assert batch(histories, prices) == scalar(histories, prices)
+
+
+def test_rising_and_falling_edges():
+    up = np.linspace(50, 100, 30, dtype=np.float32)
+    histories = np.stack([up, up[::-1], up[:1].repeat(30)])
+    current = np.array([100, 80, 50], dtype=np.float32)
+    assert batch(histories, current) == scalar(histories, current) == ["WAIT", "CONSIDER", "BUY"]
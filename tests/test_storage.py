@@ -0,0 +1,66 @@
+import multiprocessing
+import threading
+
+import pytest
+
+from utils import storage
+
+
+def test_json_import_runs_once(tmp_path):
+    db = tmp_path / "wishdrop.db"
+    engine = storage.open_backend("sqlite", db, cached=False)
+    imported = storage._read(storage.PROFILES)
+    assert engine.keys("profiles") == list(imported)
+
+    for table in storage.TABLES:
+        for key in engine.keys(table):
+            engine.delete(table, key)
+    reopened = storage.open_backend("sqlite", db, cached=False)
+    assert reopened.keys("profiles") == [] and reopened.keys("boards") == []
+
+
+def test_databases_in_use_before_the_marker_are_not_reimported(tmp_path):
+    db = tmp_path / "wishdrop.db"
+    engine = storage.SqliteBackend(db)
+    engine.put("profiles", "someone", {"brands": []})
+    engine.delete("profiles", "someone")
+    assert storage.open_backend("sqlite", db, cached=False).keys("profiles") == []
+
+
+PROCESSES, THREADS, WRITES = 3, 8, 25
+
+
+def _writer_process(proc):
+    def writer(t):
+        for i in range(WRITES):
+            storage.save_profile(f"user-{proc}-{t}-{i}", {"notes": str(i)})
+
+    pool = [threading.Thread(target=writer, args=(t,)) for t in range(THREADS)]
+    for th in pool:
+        th.start()
+    for th in pool:
+        th.join()
+
+
+@pytest.fixture
+def sqlite_store(tmp_path, monkeypatch):
+    monkeypatch.setenv("WISHDROP_DB", str(tmp_path / "wishdrop.db"))
+    storage.use_backend(storage.open_backend("sqlite"))
+    yield
+    storage.use_backend(None)
+
+
+def test_concurrent_writers_lose_no_updates(sqlite_store):
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_writer_process, args=(p,)) for p in range(PROCESSES)]
+    for p in procs:
+        p.start()
+    _writer_process(PROCESSES)
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+
+    written = {f"user-{p}-{t}-{i}": {"notes": str(i)}
+               for p in range(PROCESSES + 1) for t in range(THREADS) for i in range(WRITES)}
+    profiles = storage.backend().items("profiles")
+    assert {k: profiles.get(k) for k in written} == written
@@ -0,0 +1,108 @@
+import mmap
+import multiprocessing
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import generate_products
+from utils import storage
+from utils.catalog import catalog_version, load_products
+from utils.ingest import apply_delta
+
+ROOT = Path(__file__).resolve().parents[1]
+WORKERS, ROWS, POLL = 3, 4000, 0.05
+# Seconds a worker may take past its poll interval to see a change.
+MARGIN = 0.5
+
+
+def _mapped(array):
+    while isinstance(array, np.ndarray):
+        array = array.base
+    return isinstance(getattr(array, "obj", array), mmap.mmap)
+
+
+def _snapshot_memory():
+    """{snapshot file: [RSS kB, PSS kB]} for the snapshots this process maps."""
+    out, name = {}, None
+    for line in Path("/proc/self/smaps").read_text().splitlines():
+        head = line.split()
+        if "-" in head[0] and len(head) >= 5:
+            name = Path(head[5]).name if len(head) > 5 and "/derived/" in head[5] else None
+        elif name and head[0] in ("Rss:", "Pss:"):
+            out.setdefault(name, [0, 0])[head[0] == "Pss:"] += int(head[1])
+    return out
+
+
+def _worker(store, out, go):
+    from utils.facets import get_facets
+    from utils.index import get_index
+    from utils.similar import get_similar
+
+    products = load_products(store)
+    similar = get_similar(products)
+    index, facets = get_index(products), get_facets(products)
+    # Arrays under utils.shared.MIN_SHARED_BYTES stay in the pickle; these are all larger.
+    mapped = [_mapped(similar.vectors), _mapped(similar.keys), _mapped(facets.discount), _mapped(index.discount)]
+    int(similar.vectors.sum())  # fault the pages in
+    out.put("ready")
+    go.wait()
+    shared = _snapshot_memory()
+
+    version, seen = catalog_version(products), {}
+    deadline = time.monotonic() + 30
+    while len(seen) < 2 and time.monotonic() < deadline:
+        time.sleep(POLL)
+        if "catalog" not in seen and catalog_version(load_products(store)) > version:
+            seen["catalog"] = time.monotonic()
+        if "profile" not in seen and (storage.get_profile("probe") or {}).get("rev"):
+            seen["profile"] = time.monotonic()
+    out.put((mapped, shared, seen))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    path = tmp_path / "catalog"
+    generate_products.main(["--rows", str(ROWS), "--format", "columnar", "--out", str(path)])
+    monkeypatch.setenv("WISHDROP_DB", str(tmp_path / "wishdrop.db"))
+    monkeypatch.setenv("WISHDROP_SHARED", "1")
+    storage.use_backend(storage.open_backend())
+    subprocess.run([sys.executable, "-m", "utils.shared", "--products", str(path)], cwd=ROOT, check=True,
+                   stdout=subprocess.DEVNULL)
+    yield path
+    storage.use_backend(None)
+
+
+def test_workers_share_snapshots_and_see_changes(store):
+    ctx = multiprocessing.get_context("spawn")
+    out, go = ctx.Queue(), ctx.Event()
+    procs = [ctx.Process(target=_worker, args=(store, out, go)) for _ in range(WORKERS)]
+    for p in procs:
+        p.start()
+    assert [out.get(timeout=120) for _ in procs] == ["ready"] * WORKERS
+    go.set()
+
+    time.sleep(0.2)
+    products = load_products(store)
+    ids = products["id"].to_numpy()[:10].astype(str)
+    apply_delta(pd.DataFrame({"id": ids, "price": np.round(products["price"].to_numpy()[:10] * 0.8, 2)}), store)
+    changed = {"catalog": time.monotonic()}
+    storage.save_profile("probe", {"rev": 1})
+    changed["profile"] = time.monotonic()
+
+    results = [out.get(timeout=60) for _ in procs]
+    for p in procs:
+        p.join(30)
+        assert p.exitcode == 0
+    for mapped, shared, seen in results:
+        assert all(mapped), "attached arrays should be mapped from the published snapshots"
+        # PSS splits a page between the processes mapping it: below RSS means shared.
+        rss, pss = next(kb for name, kb in shared.items() if name.startswith("similar."))
+        assert 0 < pss < rss, shared
+        for what, at in changed.items():
+            assert what in seen, f"a worker never saw the {what} change"
+            assert seen[what] - at <= POLL + MARGIN
@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils import storage
+from utils.catalog import catalog_version, get_lookup, load_products
+from utils.price import price_histories
+
+# Histories are requested at the pages' length so the shared cache is reused
+# (longer if the window needs it); the alert reference is the highest price
+# over the last WINDOW days.
+HISTORY_DAYS = 60
+WINDOW = 30
+
+
+class Outbox:
+    """Triggered alerts waiting for delivery, one row per (user, product, threshold, price)."""
+
+    def __init__(self, path=None):
+        self.path = Path(path or os.environ.get("WISHDROP_DB", storage.DATABASE))
+        self._local = threading.local()
+        # Keys of the previous add(): alerts still triggered a cycle later skip the
+        # DB round trip. Older keys are left to the table's UNIQUE constraint.
+        self._sent = set()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS alert_outbox ("
+                "id INTEGER PRIMARY KEY, user TEXT NOT NULL, product_id TEXT NOT NULL, "
+                "threshold REAL NOT NULL, price REAL NOT NULL, reference REAL NOT NULL, "
+                "drop_pct REAL NOT NULL, created REAL NOT NULL, delivered REAL, "
+                "UNIQUE (user, product_id, threshold, price))"
+            )
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def add(self, alerts):
+        """Queue (user, product_id, threshold, price, reference, drop_pct) rows; returns how many were new.
+
+        An alert already queued for the same user, product, threshold and price
+        is skipped, so re-evaluating an unchanged price never notifies twice.
+        """
+        keys = {a[:4] for a in alerts}
+        fresh = [a for a in alerts if a[:4] not in self._sent]
+        if not fresh:
+            self._sent = keys
+            return 0
+        conn, now = self._conn(), time.time()
+        before = conn.total_changes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO alert_outbox "
+                "(user, product_id, threshold, price, reference, drop_pct, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(*a, now) for a in fresh],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._sent = keys
+        return conn.total_changes - before
+
+    def pending(self, limit: int = 100):
+        rows = self._conn().execute(
+            "SELECT id, user, product_id, threshold, price, reference, drop_pct, created "
+            "FROM alert_outbox WHERE delivered IS NULL ORDER BY id LIMIT ?",
+            (limit,),
+        )
+        names = ("id", "user", "product_id", "threshold", "price", "reference", "drop_pct", "created")
+        return [dict(zip(names, row)) for row in rows]
+
+    def mark_delivered(self, ids):
+        conn = self._conn()
+        conn.executemany("UPDATE alert_outbox SET delivered = ? WHERE id = ?", [(time.time(), i) for i in ids])
+
+
+class TrackedPairs:
+    """Every tracked (user, product, threshold) across all boards, as flat arrays.
+
+    Products are factorized so each distinct product is priced once per cycle;
+    `product` maps a pair to its row in `product_ids`.
+    """
+
+    def __init__(self, boards: dict):
+        users, pids, thresholds = [], [], []
+        for u, board in enumerate(boards.values()):
+            tracked = (board or {}).get("tracked") or {}
+            users.extend([u] * len(tracked))
+            pids.extend(tracked.keys())
+            thresholds.extend(tracked.values())
+        self.user_names = list(boards)
+        self.user = np.asarray(users, dtype=np.int32)
+        self.threshold = pd.to_numeric(pd.Series(thresholds, dtype=object), errors="coerce").to_numpy(np.float32)
+        codes, uniques = pd.factorize(pd.Series(pids, dtype=object))
+        self.product = codes.astype(np.int32)
+        self.product_ids = uniques.to_numpy(dtype=object) if len(uniques) else np.empty(0, dtype=object)
+
+    def __len__(self):
+        return len(self.user)
+
+
+class AlertEngine:
+    """Evaluates every tracked price alert in one vectorized pass per cycle."""
+
+    def __init__(self, engine=None, outbox=None, products=None, window: int = WINDOW):
+        self.engine = engine or storage.open_backend(cached=False)
+        self.outbox = outbox or Outbox()
+        self.products = products
+        self.window = window
+        self._pairs = (None, None)  # (boards version, TrackedPairs)
+        self._positions = (None, None, None, None)  # (catalog, version, product ids, catalog rows)
+        self.last_metrics = None
+
+    def pairs(self):
+        # Track/untrack clicks still in the op log count from this cycle on.
+        storage.compact_board_ops(self.engine)
+        version = self.engine.version("boards")
+        if self._pairs[1] is None or version is None or version != self._pairs[0]:
+            self._pairs = (version, TrackedPairs(self.engine.items("boards")))
+        return self._pairs[1]
+
+    def _catalog_rows(self, products, pairs):
+        # Positions only move with the catalog object; the version covers deletes.
+        version = catalog_version(products)
+        if (self._positions[0] is not products or self._positions[1] != version
+                or self._positions[2] is not pairs.product_ids):
+            rows = get_lookup(products).positions(pairs.product_ids)
+            self._positions = (products, version, pairs.product_ids, rows)
+        return self._positions[3]
+
+    def evaluate(self, pairs, products):
+        """Drop % per tracked product and a mask of the pairs whose threshold is met."""
+        rows = self._catalog_rows(products, pairs)
+        known = rows >= 0
+        price = np.full(len(rows), np.nan, dtype=np.float32)
+        reference = np.full(len(rows), np.nan, dtype=np.float32)
+        if known.any():
+            price[known] = products["price"].to_numpy(dtype=np.float32)[rows[known]]
+            days = max(self.window, HISTORY_DAYS)
+            hist, _ = price_histories(pairs.product_ids[known], price[known], days=days)
+            reference[known] = hist[:, -self.window:].max(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            drop = np.maximum(0, (1 - price / reference) * 100)
+        pair_drop = drop[pairs.product] if len(pairs) else np.empty(0, dtype=np.float32)
+        with np.errstate(invalid="ignore"):
+            hit = (pairs.threshold > 0) & (pair_drop >= pairs.threshold)
+        return price, reference, drop, hit
+
+    def run_cycle(self):
+        t0 = time.perf_counter()
+        products = self.products if self.products is not None else load_products()
+        t1 = time.perf_counter()
+        pairs = self.pairs()
+        t2 = time.perf_counter()
+        price, reference, drop, hit = self.evaluate(pairs, products)
+        t3 = time.perf_counter()
+        idx = np.flatnonzero(hit)
+        prod = pairs.product[idx]
+        alerts = list(zip(
+            [pairs.user_names[u] for u in pairs.user[idx].tolist()],
+            pairs.product_ids[prod].tolist(),
+            pairs.threshold[idx].astype(float).round(2).tolist(),
+            price[prod].astype(float).round(2).tolist(),
+            reference[prod].astype(float).round(2).tolist(),
+            drop[prod].astype(float).round(2).tolist(),
+        ))
+        queued = self.outbox.add(alerts)
+        t4 = time.perf_counter()
+        self.last_metrics = {
+            "pairs": len(pairs),
+            "products": len(pairs.product_ids),
+            "unknown_products": int(np.isnan(price).sum()),
+            "triggered": len(alerts),
+            "queued": queued,
+            "catalog_s": round(t1 - t0, 4),
+            "boards_s": round(t2 - t1, 4),
+            "evaluate_s": round(t3 - t2, 4),
+            "outbox_s": round(t4 - t3, 4),
+            "total_s": round(t4 - t0, 4),
+        }
+        return self.last_metrics
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Evaluate tracked price alerts and queue the triggered ones.")
+    ap.add_argument("--once", action="store_true", help="run a single cycle and exit")
+    ap.add_argument("--interval", type=float, default=300, help="seconds between cycle starts")
+    ap.add_argument("--window", type=int, default=WINDOW, help="days of history behind the reference price")
+    ap.add_argument("--outbox", default=None, help="SQLite file for the outbox (default: the storage DB)")
+    ap.add_argument("--json", action="store_true", help="print metrics as JSON lines")
+    args = ap.parse_args(argv)
+
+    alerts = AlertEngine(outbox=Outbox(args.outbox), window=args.window)
+    try:
+        while True:
+            m = alerts.run_cycle()
+            if args.json:
+                print(json.dumps(m), flush=True)
+            else:
+                print(
+                    f"{m['pairs']:,} pairs / {m['products']:,} products: {m['triggered']:,} triggered, "
+                    f"{m['queued']:,} queued in {m['total_s'] * 1000:.0f} ms "
+                    f"(boards {m['boards_s'] * 1000:.0f}, evaluate {m['evaluate_s'] * 1000:.0f}, "
+                    f"outbox {m['outbox_s'] * 1000:.0f})",
+                    flush=True,
+                )
+            if args.once:
+                break
+            time.sleep(max(0.0, args.interval - m["total_s"]))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
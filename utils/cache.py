@@ -0,0 +1,130 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+class LRUCache:
+    """Thread-safe LRU map with a byte budget, optional TTL and hit/miss counters."""
+
+    def __init__(self, max_bytes: int, ttl: float = None, sizeof=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # Default size: payload bytes plus a rough allowance for key and bookkeeping.
+        self.sizeof = sizeof or (lambda value: getattr(value, "nbytes", 0) + 200)
+        self._items = OrderedDict()  # key -> (value, size, expires)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and (item[2] is None or item[2] > time.monotonic()):
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            if item is not None:
+                self._drop(key)
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._items:
+                self._drop(key)
+            if size > self.max_bytes:
+                return
+            self._items[key] = (value, size, expires)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._items)))
+                self.evictions += 1
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._items:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def _drop(self, key):
+        _, size, _ = self._items.pop(key)
+        self.bytes -= size
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class DiskStore:
+    """Key -> bytes map in a local SQLite file, shared by processes on this host."""
+
+    def __init__(self, path, ttl: float = None):
+        self.path = Path(path)
+        self.ttl = ttl
+        self._local = threading.local()
+        self.hits = self.misses = 0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys, chunk: int = 500):
+        found = {}
+        conn, now = self._conn(), time.time()
+        for i in range(0, len(keys), chunk):
+            part = keys[i:i + chunk]
+            marks = ",".join("?" * len(part))
+            rows = conn.execute(
+                f"SELECT key, value FROM kv WHERE key IN ({marks}) AND (expires IS NULL OR expires > ?)",
+                (*part, now),
+            )
+            found.update(rows)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                [(k, v, expires) for k, v in items.items()],
+            )
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,113 @@
+"""Product card HTML for Discover and Boards, built once per catalog row and shared by all sessions."""
+import html
+import os
+
+import pandas as pd
+
+from utils.cache import LRUCache
+from utils.catalog import derived
+from utils.images import prefetch_thumbnails, thumbnail_urls
+from utils.metrics import count, register_collector
+
+STORE_ICONS = {
+    "Nordstrom": "🖤", "Bloomingdale's": "🛍️", "Saks Fifth Avenue": "🤍",
+    "Neiman Marcus": "💎", "Bergdorf Goodman": "👑",
+    "Chanel": "⚫", "Prada": "🪩", "Gucci": "🟩",
+    "Louis Vuitton": "🧡", "Burberry": "🤎",
+    "Sephora": "💄", "Ulta Beauty": "🪞",
+    "Macy's": "⭐", "Amazon": "🟧", "Target": "🎯",
+    "Best Buy": "🔵", "Apple Store": "",
+    "Costco": "🅲", "Home Depot": "🛠️"
+}
+CARD_CACHE_BYTES = int(float(os.environ.get("WISHDROP_CARD_CACHE_MB", 32)) * 2 ** 20)
+CARD_COLUMNS = ["name", "brand", "category", "store", "msrp", "price", "discount_pct", "image_url"]
+
+# One line of HTML per card: markdown would read indented lines as code, and
+# "&#36;" keeps dollar signs from being taken as LaTeX delimiters.
+_IMAGE = '<img src="{src}" style="width:100%; border-radius:0.5rem;" loading="lazy">'
+_TITLE = ('<h3 style="margin:0.5rem 0 0;">{name}</h3>'
+          '<p style="color:rgba(49,51,63,0.6); font-size:14px; margin:0 0 0.25rem;">'
+          '{icon} {store} • {brand} • {category}</p>')
+_PRICE = ('<div style="font-size:18px; font-weight:600; margin-top:4px;">'
+          '<span style="color:#d00000;">&#36;{price:.2f}</span>&nbsp;&nbsp;'
+          '<span style="color:gray; text-decoration:line-through;">&#36;{msrp:.2f}</span>&nbsp;&nbsp;'
+          '<span style="color:green;">-{discount}%</span></div>')
+_STRIP_ITEM = ('<a href="{url}" target="_blank" style="flex:1 1 0; min-width:0; color:inherit; text-decoration:none;">'
+               '<img src="{src}" style="width:100%; border-radius:0.4rem;" loading="lazy">'
+               '<p style="font-size:13px; margin:0.25rem 0 0; white-space:nowrap; overflow:hidden; '
+               'text-overflow:ellipsis;">{name}</p>'
+               '<p style="font-size:13px; font-weight:600; color:#d00000; margin:0;">&#36;{price:.2f}</p></a>')
+
+
+class CardSet:
+    """Rendered card HTML keyed by catalog row, filled on first use."""
+
+    def __init__(self, products: pd.DataFrame, image_size: str, price: bool = True,
+                 max_bytes: int = CARD_CACHE_BYTES):
+        self.products = products
+        self.image_size = image_size
+        self.price = price
+        # (image URL, HTML below the image) per row
+        self.cache = LRUCache(max_bytes, sizeof=lambda card: 2 * (len(card[0]) + len(card[1])) + 150)
+
+    def render(self, rows):
+        """Card HTML for catalog `rows` (positions), in order."""
+        parts = self._parts(rows)
+        srcs = thumbnail_urls([image for image, _ in parts], self.image_size)
+        return [_IMAGE.format(src=html.escape(src)) + body for src, (_, body) in zip(srcs, parts)]
+
+    def prefetch(self, rows):
+        """Start fetching the thumbnails of `rows` without waiting for them."""
+        prefetch_thumbnails([image for image, _ in self._parts(rows)], self.image_size)
+
+    def _parts(self, rows):
+        rows = [int(r) for r in rows]
+        out = [self.cache.get(r) for r in rows]
+        todo = sorted({r for r, card in zip(rows, out) if card is None})
+        if todo:
+            count("cards.rendered", len(todo))
+            built = dict(zip(todo, self._build(self.products.take(todo))))
+            for r, card in built.items():
+                self.cache.put(r, card)
+            out = [card if card is not None else built[r] for r, card in zip(rows, out)]
+        return out
+
+    def _build(self, df):
+        out = []
+        for name, brand, category, store, msrp, price, discount, image in zip(
+                *(df[c].tolist() for c in CARD_COLUMNS)):
+            card = _TITLE.format(name=html.escape(str(name)), icon=STORE_ICONS.get(store, "🛒"),
+                                  store=html.escape(str(store)), brand=html.escape(str(brand)),
+                                  category=html.escape(str(category)))
+            if self.price:
+                card += _PRICE.format(price=price, msrp=msrp, discount=int(discount))
+            out.append(("" if pd.isna(image) else str(image), card))
+        return out
+
+    def invalidate(self, rows):
+        for r in rows.tolist():
+            self.cache.discard(r)
+
+
+def render_strip(products: pd.DataFrame, rows, image_size: str = "200x250"):
+    """One row of small linked cards (image, name, price), e.g. "More like this"."""
+    df = products.take(rows)
+    images = ["" if pd.isna(v) else str(v) for v in df["image_url"].tolist()]
+    items = [
+        _STRIP_ITEM.format(url=html.escape("" if pd.isna(url) else str(url)), src=html.escape(src),
+                           name=html.escape(str(name)), price=price)
+        for url, src, name, price in zip(df["product_url"].tolist(), thumbnail_urls(images, image_size),
+                                         df["name"].tolist(), df["price"].tolist())
+    ]
+    return '<div style="display:flex; gap:0.5rem;">' + "".join(items) + "</div>"
+
+
+def get_cards(products: pd.DataFrame, image_size: str = "500x650", price: bool = True):
+    """The shared CardSet for this catalog and card layout."""
+    name = f"cards.{image_size}" + ("" if price else ".plain")
+    cards = derived(
+        products, name, lambda p: CardSet(p, image_size, price),
+        columns=CARD_COLUMNS, update=lambda cards, rows, _: cards.invalidate(rows),
+    )
+    register_collector(name, cards.cache.stats)
+    return cards
@@ -0,0 +1,340 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils import shared
+from utils.metrics import span, timed
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+PRODUCTS_CSV = Path(os.environ.get("WISHDROP_PRODUCTS", DATA_DIR / "sample_products.csv"))
+
+# Column layout of the on-disk store. Text columns are kept as categorical
+# codes + labels, numbers are narrowed to the smallest dtype that fits.
+COLUMNS = [
+    "id", "name", "brand", "category", "store",
+    "msrp", "price", "discount_pct", "image_url", "product_url",
+]
+NUMERIC = {"msrp": "float32", "price": "float32", "discount_pct": "int8"}
+
+# Delta batches whose touched rows are kept for readers catching up.
+CHANGE_LOG = 64
+# Above this share of touched rows, rebuilding beats patching.
+PATCH_LIMIT = 0.05
+
+_loaded = {}
+_derived = {}
+# One lock per derived structure, held while it is built or patched: callers
+# of other structures never wait for it. _derived_lock only guards the dict.
+_derived_locks = {}
+_derived_lock = threading.Lock()
+_stores = {}  # id(DataFrame) -> (weakref to it, StoreState)
+
+
+def source_signature(src=PRODUCTS_CSV):
+    st = Path(src).stat()
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def read_manifest(path):
+    return json.loads((Path(path) / "manifest.json").read_text(encoding="utf-8"))
+
+
+def write_manifest(path, manifest):
+    """Replace the manifest atomically; readers notice through its new inode."""
+    save_atomic(Path(path) / "manifest.json", json.dumps(manifest, indent=2).encode())
+
+
+def save_atomic(target, data):
+    """Write bytes, or an array as .npy, to a sibling temp file and rename it over `target`."""
+    target = Path(target)
+    fd, tmp = tempfile.mkstemp(prefix=f".{target.name}.", dir=target.parent)
+    with os.fdopen(fd, "wb") as f:
+        if isinstance(data, bytes):
+            f.write(data)
+        else:
+            np.save(f, data)
+    os.replace(tmp, target)
+
+
+# ---- Build ----
+def store_dir_for(src):
+    src = Path(src)
+    return src.parent / ".catalog" / src.stem
+
+
+@timed("catalog.build_store")
+def build_store(src=PRODUCTS_CSV, store_dir=None):
+    """Convert the CSV into a columnar store; no-op if already up to date."""
+    src = Path(src)
+    store_dir = Path(store_dir) if store_dir else store_dir_for(src)
+    sig = source_signature(src)
+    target = store_dir / sig
+    if (target / "manifest.json").exists():
+        return target
+
+    store_dir.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=".build-", dir=store_dir))
+    try:
+        dtypes = {c: "category" for c in COLUMNS if c not in NUMERIC}
+        dtypes.update(NUMERIC)
+        if src.suffix == ".parquet":
+            df = pd.read_parquet(src, columns=COLUMNS).astype(dtypes)
+        else:
+            df = pd.read_csv(src, dtype=dtypes)
+        columns = {}
+        for col in COLUMNS:
+            if col in NUMERIC:
+                np.save(tmp / f"{col}.npy", df[col].to_numpy(NUMERIC[col]))
+                columns[col] = {"kind": "numeric", "dtype": NUMERIC[col]}
+            else:
+                cat = df[col].cat
+                np.save(tmp / f"{col}.codes.npy", cat.codes.to_numpy())
+                np.save(tmp / f"{col}.labels.npy", cat.categories.to_numpy(dtype=str))
+                columns[col] = {"kind": "category", "dtype": str(cat.codes.dtype)}
+        np.save(tmp / "alive.npy", np.ones(len(df), dtype=bool))
+        manifest = {"source": src.name, "signature": sig, "rows": len(df), "columns": columns,
+                    "version": 0, "layout": 0, "log": []}
+        (tmp / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            # Another process published the same version first.
+            shutil.rmtree(tmp, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    # Drop superseded versions; processes that still map them keep their pages.
+    for old in store_dir.iterdir():
+        if old.is_dir() and old.name != sig and not old.name.startswith(".build-"):
+            shutil.rmtree(old, ignore_errors=True)
+    return target
+
+
+# ---- Load ----
+def open_store(path):
+    """Memory-map a built store into a read-only DataFrame."""
+    path = Path(path)
+    manifest = read_manifest(path)
+    data = {}
+    for col, spec in manifest["columns"].items():
+        if spec["kind"] == "category":
+            codes = np.load(path / f"{col}.codes.npy", mmap_mode="r")
+            labels = np.load(path / f"{col}.labels.npy")
+            data[col] = pd.Categorical.from_codes(codes, categories=labels, validate=False)
+        else:
+            data[col] = np.load(path / f"{col}.npy", mmap_mode="r")
+    df = pd.DataFrame(data, columns=list(manifest["columns"]), copy=False)
+    _stores[id(df)] = (weakref.ref(df), StoreState(path, manifest))
+    return df
+
+
+class StoreState:
+    """What this process last saw of a store: its version, layout and live-row mask.
+
+    Delta batches (utils/ingest.py) write columns in place, bump `version`
+    and log the rows and columns they touched. Batches that reshape the
+    column files (new rows, new labels) also bump `layout`, and the store
+    has to be reopened.
+    """
+
+    def __init__(self, path, manifest):
+        self.path = Path(path)
+        self._stamp = self._manifest_stamp()
+        self.signature = manifest.get("signature")
+        self.layout = manifest.get("layout", 0)
+        self.version = manifest.get("version", 0)
+        self._log = manifest.get("log", [])
+        alive = self.path / "alive.npy"
+        self.alive = np.load(alive, mmap_mode="r") if alive.exists() else None
+        self._id_index = None
+
+    def _manifest_stamp(self):
+        st = (self.path / "manifest.json").stat()
+        return st.st_ino, st.st_mtime_ns
+
+    def poll(self):
+        """Catch up with the store on disk; False if it has to be reopened."""
+        try:
+            stamp = self._manifest_stamp()
+            if stamp == self._stamp:
+                return True
+            manifest = read_manifest(self.path)
+        except FileNotFoundError:
+            return False
+        if manifest.get("signature") != self.signature or manifest.get("layout", 0) != self.layout:
+            return False
+        self._stamp, self.version, self._log = stamp, manifest.get("version", 0), manifest.get("log", [])
+        return True
+
+    def changes_since(self, version):
+        """(rows, columns) touched after `version`, or None if the log no longer reaches back that far."""
+        log = [e for e in self._log if e["version"] > version]
+        if not log:
+            return (np.empty(0, dtype=np.int64), set()) if version == self.version else None
+        if log[0]["version"] != version + 1:
+            return None
+        try:
+            rows = [np.load(self.path / "changes" / f"{e['version']}.npy") for e in log]
+        except FileNotFoundError:
+            return None
+        return np.unique(np.concatenate(rows)), set().union(*(e["columns"] for e in log))
+
+    def id_index(self):
+        """(labels, argsort of labels, row per label) for the id column; persisted on first use."""
+        if self._id_index is None:
+            labels = np.load(self.path / "id.labels.npy", mmap_mode="r")
+            order_file, rows_file = self.path / "id.order.npy", self.path / "id.rows.npy"
+            if order_file.exists() and rows_file.exists():
+                order, rows = np.load(order_file, mmap_mode="r"), np.load(rows_file, mmap_mode="r")
+            else:
+                codes = np.load(self.path / "id.codes.npy", mmap_mode="r")
+                order, rows = id_index_arrays(labels, codes)
+                try:
+                    save_atomic(order_file, order)
+                    save_atomic(rows_file, rows)
+                except OSError:
+                    pass  # read-only store: keep it in memory
+            self._id_index = (labels, order, rows)
+        return self._id_index
+
+
+def id_index_arrays(labels, codes):
+    # Reversed assignment so a duplicated id resolves to its first row.
+    rows = np.full(len(labels), -1, dtype=np.int64)
+    rows[codes[::-1]] = np.arange(len(codes) - 1, -1, -1)
+    return np.argsort(labels, kind="stable"), rows
+
+
+def store_state(products: pd.DataFrame):
+    entry = _stores.get(id(products))
+    return entry[1] if entry is not None and entry[0]() is products else None
+
+
+def catalog_version(products: pd.DataFrame):
+    """Delta batches applied to this catalog so far (0 for frames not backed by a store)."""
+    state = store_state(products)
+    return state.version if state is not None else 0
+
+
+def catalog_alive(products: pd.DataFrame):
+    """Shared mask of rows not deleted by a delta, or None if nothing can be deleted."""
+    state = store_state(products)
+    return state.alive if state is not None else None
+
+
+@timed("catalog.load")
+def load_products(src=PRODUCTS_CSV):
+    """Return the catalog, rebuilding/reloading only when the CSV changes.
+
+    `src` may be a CSV or Parquet file, or an already built store directory
+    (generate_products.py --format columnar).
+    """
+    src = Path(src)
+    prebuilt = (src / "manifest.json").exists()
+    # A prebuilt store has no source file; its manifest says when to reopen.
+    sig = "store" if prebuilt else source_signature(src)
+    cached = _loaded.get(src)
+    if cached is not None and cached[0] == sig:
+        state = store_state(cached[1])
+        if state is None or state.poll():
+            return cached[1]
+    df = open_store(src if prebuilt else build_store(src))
+    _loaded[src] = (sig, df)
+    return df
+
+
+# ---- Lookup ----
+class ProductLookup:
+    """id -> catalog row by binary search over the distinct ids.
+
+    Store-backed catalogs reuse the store's persisted id order, so nothing
+    is sorted per process; deleted rows read as missing.
+    """
+
+    def __init__(self, products: pd.DataFrame):
+        state = store_state(products)
+        if state is not None:
+            self.labels, self.order, self.rows = state.id_index()
+        else:
+            col = products["id"]
+            if isinstance(col.dtype, pd.CategoricalDtype):
+                codes, labels = col.cat.codes.to_numpy(), col.cat.categories.to_numpy(dtype=str)
+            else:
+                codes, labels = pd.factorize(col)
+                labels = np.asarray(labels, dtype=str)
+            self.labels = labels
+            self.order, self.rows = id_index_arrays(labels, codes)
+        self.products = products
+        self.alive = catalog_alive(products)
+
+    def positions(self, ids):
+        """Catalog row of each id, -1 where the id is not in the catalog."""
+        ids = np.asarray(ids, dtype=str)
+        if not len(self.labels) or not len(ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        at = self.order[np.minimum(np.searchsorted(self.labels, ids, sorter=self.order), len(self.labels) - 1)]
+        rows = np.where(self.labels[at] == ids, self.rows[at], -1)
+        if self.alive is not None:
+            rows[rows >= 0] = np.where(self.alive[rows[rows >= 0]], rows[rows >= 0], -1)
+        return rows
+
+    def get(self, product_id):
+        """One product as a Series, or None if it is not in the catalog."""
+        row = self.positions([product_id])[0]
+        return self.products.iloc[row] if row >= 0 else None
+
+    def get_many(self, ids):
+        """The known products among `ids`, in request order, as one gathered frame."""
+        rows = self.positions(ids)
+        return self.products.take(rows[rows >= 0])
+
+
+def get_lookup(products: pd.DataFrame):
+    # Deletes show through the shared alive mask; ids only change with the layout.
+    return derived(products, "lookup", ProductLookup, columns=("id",))
+
+
+def derived(products: pd.DataFrame, name: str, build, columns=None, update=None, share=False):
+    """`build(products)`, computed once per catalog object and reused across reruns.
+
+    After a delta batch the cached value is kept if it does not depend on
+    any touched column (`columns`; None means all of them), patched with
+    `update(value, rows, products)` if given and the batch is small, and
+    rebuilt otherwise. With `share` and WISHDROP_SHARED=1, a store-backed
+    value is attached from the snapshot another process published (see
+    utils/shared.py) and brought up to date the same way.
+    """
+    version = catalog_version(products)
+    hit = _derived.get(name)
+    if hit is not None and hit[0] is products and hit[1] == version:
+        return hit[2]
+    state = store_state(products)
+    with _derived_lock:
+        lock = _derived_locks.setdefault(name, threading.RLock())
+    with lock:
+        hit = _derived.get(name)
+        if share and shared.SHARED and state is not None and (hit is None or hit[0] is not products):
+            value, found = shared.attach_or_build(state, name, version, lambda: build(products))
+            hit = _derived[name] = (products, found, value)
+        if hit is not None and hit[0] is products and hit[1] != version:
+            change = state.changes_since(hit[1])
+            if change is not None and columns is not None and not change[1] & set(columns):
+                hit = _derived[name] = (products, version, hit[2])
+            elif change is not None and update is not None and len(change[0]) <= PATCH_LIMIT * len(products):
+                with span(f"catalog.update.{name}"):
+                    update(hit[2], change[0], products)
+                hit = _derived[name] = (products, version, hit[2])
+        if hit is None or hit[0] is not products or hit[1] != version:
+            with span(f"catalog.derive.{name}"):
+                hit = _derived[name] = (products, version, build(products))
+            if share and shared.SHARED and state is not None:
+                shared.publish(state, name, version, hit[2])
+    return hit[2]
@@ -0,0 +1,197 @@
+"""Facet values and filtered per-value counts for the brand, store and category filters."""
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import LRUCache
+from utils.catalog import catalog_alive, derived
+from utils.index import PRICE_BANDS
+from utils.metrics import register_collector
+
+FACETS = ["brand", "store", "category"]
+FACET_CUBE_BYTES = int(float(os.environ.get("WISHDROP_FACET_CUBE_MB", 64)) * 2 ** 20)
+
+
+class FacetCounts:
+    """Counts of live products per facet value, filtered by the other facets, discount and price band."""
+
+    def __init__(self, products: pd.DataFrame):
+        self.size = len(products)
+        self.labels = {col: self._labels(products[col]) for col in FACETS}
+        self.codes = {col: self._codes(products[col], col) for col in FACETS}
+        self.discount = products["discount_pct"].to_numpy(dtype=np.int16, copy=True)
+        self.band = self._bands(products)
+        alive = catalog_alive(products)
+        self.alive = np.ones(self.size, dtype=bool) if alive is None else np.array(alive, dtype=bool)
+        self.alive &= self._valid(np.arange(self.size))
+        # A row's band state has bit i set when it is in the i-th price band.
+        self.states = {name: [s for s in range(1 << len(PRICE_BANDS)) if s >> i & 1]
+                       for i, name in enumerate(PRICE_BANDS)}
+        self.discounts = np.unique(self.discount)
+        self.shape = tuple(len(self.labels[col]) for col in FACETS) + (len(self.discounts), 1 << len(PRICE_BANDS))
+        self.use_cube = 4 * int(np.prod(self.shape)) <= FACET_CUBE_BYTES
+        self.cube = None
+        self.cache = self._new_cache()
+
+    @staticmethod
+    def _new_cache():
+        return LRUCache(4 * 2 ** 20, sizeof=lambda out: 100 * sum(map(len, out.values())) + 200)
+
+    # The result cache (a lock and a sizing function) is per process.
+    def __getstate__(self):
+        return {k: v for k, v in vars(self).items() if k != "cache"}
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        self.cache = self._new_cache()
+
+    @staticmethod
+    def _labels(values):
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            return list(values.cat.categories)
+        return list(pd.unique(values.dropna()))
+
+    def _codes(self, values, col, rows=None):
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = values.cat.codes.to_numpy()
+            return (codes if rows is None else codes[rows]).astype(np.int32)
+        lookup = {v: i for i, v in enumerate(self.labels[col])}
+        values = values.tolist() if rows is None else values.to_numpy()[rows].tolist()
+        return np.array([lookup.get(v, -1) for v in values], dtype=np.int32)
+
+    @staticmethod
+    def _bands(products):
+        band = np.zeros(len(products), dtype=np.uint8)
+        for i, rule in enumerate(PRICE_BANDS.values()):
+            band |= rule(products).astype(np.uint8) << i
+        return band
+
+    def _valid(self, rows):
+        ok = np.ones(len(rows), dtype=bool)
+        for col in FACETS:
+            ok &= self.codes[col][rows] >= 0
+        return ok
+
+    def _cells(self, rows):
+        """Flat cube position of `rows`."""
+        if not len(rows):
+            return np.empty(0, dtype=np.int32)
+        cells = self.codes[FACETS[0]][rows].astype(np.int32)  # a cube that fits the budget fits int32
+        for col, n in zip(FACETS[1:], self.shape[1:]):
+            cells *= n
+            cells += self.codes[col][rows]
+        # Discount -> position on the cube's discount axis, through a lookup table.
+        slot = np.zeros(int(self.discounts[-1] - self.discounts[0]) + 1, dtype=np.int32)
+        slot[self.discounts - self.discounts[0]] = np.arange(len(self.discounts))
+        cells *= self.shape[3]
+        cells += slot[self.discount[rows] - self.discounts[0]]
+        cells *= self.shape[4]
+        cells += self.band[rows]
+        return cells
+
+    def _cube(self):
+        if self.cube is None:
+            cells = self._cells(np.flatnonzero(self.alive))
+            self.cube = np.bincount(cells, minlength=int(np.prod(self.shape))).astype(np.int32).reshape(self.shape)
+        return self.cube
+
+    # ---- Query ----
+    def counts(self, brands=None, stores=None, categories=None, price_pref=None, min_disc=0):
+        """{facet: {value: count}} for values with matching products (same filters as CatalogIndex.select)."""
+        wanted = {"brand": brands, "store": stores, "category": categories}
+        key = tuple(tuple(sorted(wanted[col])) if wanted[col] else None for col in FACETS)
+        key += (price_pref if price_pref in PRICE_BANDS else None, max(int(min_disc), 0))
+        out = self.cache.get(key)
+        if out is None:
+            allowed = {}
+            for col in FACETS:
+                if wanted[col]:
+                    lookup = {v: i for i, v in enumerate(self.labels[col])}
+                    allowed[col] = np.zeros(len(self.labels[col]), dtype=bool)
+                    allowed[col][[lookup[v] for v in wanted[col] if v in lookup]] = True
+            counts = (self._from_cube if self.use_cube else self._from_rows)(allowed, key[-2], key[-1])
+            out = {col: {self.labels[col][i]: int(counts[col][i]) for i in np.flatnonzero(counts[col])}
+                   for col in FACETS}
+            self.cache.put(key, out)
+        return out
+
+    def values(self, col):
+        """Sorted values of `col` that some live product has."""
+        return sorted(self.counts()[col])
+
+    def _from_cube(self, allowed, band, min_disc):
+        sub = self._cube()[:, :, :, np.searchsorted(self.discounts, min_disc):]
+        if band is not None:
+            sub = sub[..., self.states[band]]
+        sub = sub.sum(axis=(3, 4), dtype=np.int64)
+        out = {}
+        for i, col in enumerate(FACETS):
+            part = sub
+            for j, other in enumerate(FACETS):
+                if j != i and other in allowed:
+                    part = np.compress(allowed[other], part, axis=j)
+            out[col] = part.sum(axis=tuple(j for j in range(len(FACETS)) if j != i))
+        return out
+
+    def _from_rows(self, allowed, band, min_disc):
+        keep = self.alive & (self.discount >= min_disc)
+        if band is not None:
+            keep &= np.isin(self.band, self.states[band])
+        masks = {col: allowed[col][np.maximum(self.codes[col], 0)] for col in allowed}
+        out = {}
+        for col in FACETS:
+            rows = keep
+            for other, mask in masks.items():
+                if other != col:
+                    rows = rows & mask
+            out[col] = np.bincount(self.codes[col][rows], minlength=len(self.labels[col]))
+        return out
+
+    # ---- Incremental maintenance ----
+    def update(self, rows, products: pd.DataFrame):
+        """Recount `rows` (positions; positions >= size are appended) from `products`."""
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        grow = int(rows.max()) + 1 - self.size if len(rows) else 0
+        if grow > 0:
+            self._grow(grow)
+        if self.cube is not None:
+            old = rows[self.alive[rows]]
+            np.subtract.at(self.cube.reshape(-1), self._cells(old), 1)
+
+        for col in FACETS:
+            self.codes[col][rows] = self._codes(products[col], col, rows)
+        touched = products.take(rows)
+        self.discount[rows] = touched["discount_pct"].to_numpy(dtype=np.int16)
+        self.band[rows] = self._bands(touched)
+        alive = catalog_alive(products)
+        self.alive[rows] = self._valid(rows) & (True if alive is None else alive[rows])
+
+        if not np.isin(self.discount[rows], self.discounts).all():
+            # A discount the cube has no slot for: widen the axis, recount on next use.
+            self.discounts = np.union1d(self.discounts, self.discount[rows])
+            self.shape = self.shape[:3] + (len(self.discounts), self.shape[4])
+            self.use_cube = 4 * int(np.prod(self.shape)) <= FACET_CUBE_BYTES
+            self.cube = None
+        elif self.cube is not None:
+            new = rows[self.alive[rows]]
+            np.add.at(self.cube.reshape(-1), self._cells(new), 1)
+        self.cache.clear()
+
+    def _grow(self, extra):
+        self.size += extra
+        for col in FACETS:
+            self.codes[col] = np.concatenate([self.codes[col], np.full(extra, -1, np.int32)])
+        self.discount = np.concatenate([self.discount, np.zeros(extra, np.int16)])
+        self.band = np.concatenate([self.band, np.zeros(extra, np.uint8)])
+        self.alive = np.concatenate([self.alive, np.zeros(extra, dtype=bool)])
+
+
+def get_facets(products: pd.DataFrame):
+    """The shared FacetCounts for this catalog."""
+    facets = derived(
+        products, "facets", FacetCounts, columns=FACETS + ["discount_pct", "msrp", "price", "alive"],
+        update=lambda facets, rows, p: facets.update(rows, p), share=True,
+    )
+    register_collector("facets", facets.cache.stats)
+    return facets
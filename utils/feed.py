@@ -0,0 +1,42 @@
+import numpy as np
+
+# Scores (buy/wait signals, ranking scores) are packed above the row id so a
+# single int64 orders the feed: best score first, then catalog order.
+_ROW_BITS = 40
+_SCORE_SCALE = 1000  # scores are compared to 3 decimals
+
+
+def order_keys(rows, scores=None):
+    """Stable ordering key per feed row; ascending key = display order."""
+    keys = np.asarray(rows, dtype=np.int64).copy()
+    if scores is not None:
+        quantized = np.rint(np.asarray(scores, dtype=np.float64) * _SCORE_SCALE).astype(np.int64)
+        keys |= (np.int64(1 << 20) - quantized) << _ROW_BITS
+    return keys
+
+
+def key_rows(keys):
+    """The row ids packed into ordering keys."""
+    return np.asarray(keys, dtype=np.int64) & ((1 << _ROW_BITS) - 1)
+
+
+def page_end(keys, cursor, page_size: int):
+    """How many cards of the feed are visible for this cursor."""
+    if cursor is None:
+        return min(page_size, len(keys))
+    return int(np.count_nonzero(keys <= cursor))
+
+
+def first(keys, n: int):
+    """Positions of the n smallest keys in key order, without sorting the whole feed."""
+    if n < len(keys):
+        top = np.argpartition(keys, n - 1)[:n] if n else np.empty(0, dtype=np.int64)
+    else:
+        top = np.arange(len(keys))
+    return top[np.argsort(keys[top], kind="stable")]
+
+
+def next_cursor(keys, end: int, page_size: int):
+    """Cursor after "load more": the key of the last card of the next page."""
+    m = min(end + page_size, len(keys))
+    return int(np.partition(keys, m - 1)[m - 1])
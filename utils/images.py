@@ -0,0 +1,417 @@
+"""Product thumbnails: fetched concurrently, cut to fixed sizes and cached on disk."""
+import asyncio
+import concurrent.futures
+import hashlib
+import io
+import os
+import sqlite3
+import ssl
+import tempfile
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from urllib.parse import quote, urljoin, urlsplit
+
+from utils.metrics import count, register_collector
+
+ROOT = Path(__file__).resolve().parents[1]
+THUMB_DIR = Path(os.environ.get("WISHDROP_THUMBS", ROOT / "static" / "thumbs"))
+THUMB_URL = os.environ.get("WISHDROP_THUMB_URL", "app/static/thumbs")
+THUMB_CACHE_BYTES = int(float(os.environ.get("WISHDROP_THUMB_CACHE_MB", 256)) * 2 ** 20)
+THUMB_WAIT = float(os.environ.get("WISHDROP_THUMB_WAIT_MS", 500)) / 1000
+ENABLED = os.environ.get("WISHDROP_THUMBNAILS", "1") != "0"
+CONCURRENCY = 16
+PER_HOST = CONCURRENCY  # idle keep-alive connections kept per origin
+TIMEOUT = 10.0
+RETRY_FAILED = 600.0
+TOUCH_EVERY = 60.0  # seconds between last-used writes for a thumbnail shown again
+MAX_IMAGE_BYTES = 20 * 2 ** 20
+QUALITY = 82
+
+
+def placeholder(size: str):
+    """An inline grey SVG of the card's image size."""
+    w, h = size.split("x")
+    svg = (f'<svg xmlns="http://www.w3.org/2000/svg" width="{w}" height="{h}" viewBox="0 0 {w} {h}">'
+           f'<rect width="100%" height="100%" fill="#eeeeee"/></svg>')
+    return "data:image/svg+xml," + quote(svg)
+
+
+def make_thumbnail(data: bytes, size: str):
+    """`data` decoded, cropped to the aspect of `size` (WxH), scaled to it and encoded as JPEG."""
+    from PIL import Image, ImageOps
+
+    w, h = map(int, size.split("x"))
+    with Image.open(io.BytesIO(data)) as img:
+        thumb = ImageOps.fit(img.convert("RGB"), (w, h), Image.Resampling.LANCZOS)
+    out = io.BytesIO()
+    thumb.save(out, "JPEG", quality=QUALITY, optimize=True)
+    return out.getvalue()
+
+
+# ---- Disk cache ----
+class ThumbnailCache:
+    """Content-addressed thumbnail files plus a SQLite index, evicted LRU by total bytes."""
+
+    def __init__(self, path=THUMB_DIR, max_bytes: int = THUMB_CACHE_BYTES, url_prefix: str = THUMB_URL,
+                 retry_failed: float = RETRY_FAILED):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.url_prefix = url_prefix.rstrip("/")
+        self.retry_failed = retry_failed
+        self._local = threading.local()
+        self._touched = {}  # digest -> when this process last wrote its last-used time
+        self.hits = self.misses = self.evictions = 0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            self.path.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path / "index.sqlite", timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS thumbs (key TEXT PRIMARY KEY, digest TEXT NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS thumbs_digest ON thumbs (digest)")
+            conn.execute("CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, bytes INTEGER NOT NULL, "
+                         "used REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS blobs_used ON blobs (used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS failures (key TEXT PRIMARY KEY, until REAL NOT NULL)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @staticmethod
+    def key(url: str, size: str):
+        return f"{size} {url}"
+
+    def file(self, digest: str):
+        return self.path / digest[:2] / f"{digest}.jpg"
+
+    def url(self, digest: str):
+        return f"{self.url_prefix}/{digest[:2]}/{digest}.jpg"
+
+    def lookup(self, keys, record: bool = True):
+        """{key: digest} for cached keys, and the keys whose last fetch failed recently.
+
+        `record` counts the lookup towards the hit rate (renders do, prefetches don't).
+        """
+        conn, found, failed = self._conn(), {}, set()
+        for lo in range(0, len(keys), 500):
+            part = keys[lo:lo + 500]
+            marks = ",".join("?" * len(part))
+            found.update(conn.execute(f"SELECT key, digest FROM thumbs WHERE key IN ({marks})", part))
+            failed.update(k for (k,) in conn.execute(
+                f"SELECT key FROM failures WHERE key IN ({marks}) AND until > ?", (*part, time.time())))
+        now = time.time()
+        # Eviction order only needs minute precision, so a rerun showing the same cards writes nothing.
+        stale = [d for d in set(found.values()) if now - self._touched.get(d, 0.0) > TOUCH_EVERY]
+        if stale:
+            conn.executemany("UPDATE blobs SET used = ? WHERE digest = ?", [(now, d) for d in stale])
+            if len(self._touched) > 100_000:
+                self._touched = {d: t for d, t in self._touched.items() if now - t <= TOUCH_EVERY}
+            self._touched.update(dict.fromkeys(stale, now))
+        if record:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found, failed
+
+    def put(self, key: str, data: bytes):
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        target = self.file(digest)
+        if not target.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=f".{target.name}.", dir=target.parent)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, target)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT INTO blobs VALUES (?, ?, ?) ON CONFLICT(digest) DO UPDATE SET used = excluded.used",
+                         (digest, len(data), time.time()))
+            conn.execute("INSERT OR REPLACE INTO thumbs VALUES (?, ?)", (key, digest))
+            conn.execute("DELETE FROM failures WHERE key = ?", (key,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._evict()
+        return digest
+
+    def fail(self, key: str, retry_after: float = None):
+        retry_after = self.retry_failed if retry_after is None else retry_after
+        self._conn().execute("INSERT OR REPLACE INTO failures VALUES (?, ?)", (key, time.time() + retry_after))
+
+    def _evict(self):
+        conn = self._conn()
+        total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            gone = []
+            for digest, size in conn.execute("SELECT digest, bytes FROM blobs ORDER BY used").fetchall():
+                if total <= self.max_bytes:
+                    break
+                gone.append(digest)
+                total -= size
+            conn.executemany("DELETE FROM blobs WHERE digest = ?", [(d,) for d in gone])
+            conn.executemany("DELETE FROM thumbs WHERE digest = ?", [(d,) for d in gone])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        for digest in gone:
+            self.file(digest).unlink(missing_ok=True)
+        self.evictions += len(gone)
+        count("images.evicted", len(gone))
+
+    def stats(self):
+        conn = self._conn()
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM blobs").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries, "bytes": size, "max_bytes": self.max_bytes,
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# ---- HTTP ----
+class HttpPool:
+    """Minimal asyncio HTTP/1.1 GET client keeping idle connections per origin."""
+
+    def __init__(self, per_host: int = PER_HOST):
+        self.per_host = per_host
+        self._idle = {}  # (scheme, host, port) -> [(reader, writer)]
+        self._ssl = None
+        self.opened = 0
+
+    async def get(self, url: str, redirects: int = 5):
+        """Status and body of `url`, following redirects."""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Unsupported image URL: {url!r}")
+        origin = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        request = (f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\nUser-Agent: WishDrop/1.0\r\n"
+                   "Accept: image/*\r\nConnection: keep-alive\r\n\r\n").encode()
+        for attempt in range(2):
+            reader, writer, reused = await self._connection(origin)
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, headers, body, keep = await self._response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused and attempt == 0:
+                    continue  # the origin dropped an idle connection; retry on a new one
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            break
+        if keep:
+            self._release(origin, reader, writer)
+        else:
+            writer.close()
+        if 300 <= status < 400 and "location" in headers and redirects > 0:
+            return await self.get(urljoin(url, headers["location"]), redirects - 1)
+        return status, body
+
+    async def _connection(self, origin):
+        idle = self._idle.get(origin)
+        while idle:
+            reader, writer = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        scheme, host, port = origin
+        if scheme == "https" and self._ssl is None:
+            self._ssl = ssl.create_default_context()
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=self._ssl if scheme == "https" else None, limit=2 ** 20)
+        self.opened += 1
+        return reader, writer, False
+
+    def _release(self, origin, reader, writer):
+        idle = self._idle.setdefault(origin, [])
+        if len(idle) < self.per_host:
+            idle.append((reader, writer))
+        else:
+            writer.close()
+
+    @staticmethod
+    async def _response(reader):
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("connection closed")
+        version, status = line.decode("latin-1").split(None, 2)[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        keep = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        status = int(status)
+        if status < 200 or status in (204, 304):
+            body = b""  # never has a body
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks, total = [], 0
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                total += size
+                if total > MAX_IMAGE_BYTES:
+                    raise ValueError("image too large")
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            length = int(headers["content-length"])
+            if length > MAX_IMAGE_BYTES:
+                raise ValueError("image too large")
+            body = await reader.readexactly(length)
+        elif status != 200:
+            # Redirects and errors are not read: with no length, the body would
+            # only end when a kept-alive origin times the connection out.
+            body, keep = b"", False
+        else:
+            body = await reader.read(MAX_IMAGE_BYTES)
+            keep = False
+        return status, headers, body, keep
+
+
+# ---- Pipeline ----
+class ImagePipeline:
+    """Fetches, resizes and caches thumbnails on an asyncio loop in a daemon thread."""
+
+    def __init__(self, cache: ThumbnailCache = None, concurrency: int = CONCURRENCY, timeout: float = TIMEOUT):
+        self.cache = cache or ThumbnailCache()
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._pending = {}  # key -> concurrent Future of the digest (None on failure)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pid = None
+        self.fetched = self.failed = 0
+        self.latencies = deque(maxlen=2000)  # seconds per completed fetch, newest last
+
+    def _start(self):
+        # The loop thread does not survive a fork: each process starts its own.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="image-pipeline", daemon=True).start()
+            self._sem = asyncio.Semaphore(self.concurrency)
+            self._http = HttpPool()
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                min(4, os.cpu_count() or 1), thread_name_prefix="thumbnail")
+            self._loop, self._pid, self._pending = loop, os.getpid(), {}
+
+    def resolve(self, urls, size: str, wait: float = THUMB_WAIT):
+        """A served URL per image URL: the cached thumbnail, or the placeholder.
+
+        Missing thumbnails are fetched; this waits up to `wait` seconds for
+        them in total, and the ones still running finish in the background.
+        """
+        keys = [self.cache.key(u, size) for u in urls]
+        found, failed = self.cache.lookup(list(set(keys)))
+        count("images.hits", sum(k in found for k in keys))
+        todo = {k: u for k, u in zip(keys, urls) if k not in found and k not in failed and u}
+        if todo:
+            futures = self._submit(todo, size)
+            done, _ = concurrent.futures.wait(futures.values(), timeout=wait)
+            for key, future in futures.items():
+                if future in done and future.result() is not None:
+                    found[key] = future.result()
+        return [self.cache.url(found[k]) if k in found else placeholder(size) for k in keys]
+
+    def prefetch(self, urls, size: str):
+        """Start fetching the thumbnails of `urls` that are not cached yet."""
+        keys = [self.cache.key(u, size) for u in urls]
+        found, failed = self.cache.lookup(list(set(keys)), record=False)
+        todo = {k: u for k, u in zip(keys, urls) if k not in found and k not in failed and u}
+        if todo:
+            self._submit(todo, size)
+
+    def _submit(self, todo, size):
+        self._start()
+        futures = {}
+        with self._lock:
+            for key, url in todo.items():
+                future = self._pending.get(key)
+                if future is None:
+                    future = asyncio.run_coroutine_threadsafe(self._fetch(key, url, size), self._loop)
+                    future.add_done_callback(lambda _, key=key: self._done(key))
+                    self._pending[key] = future
+                futures[key] = future
+        count("images.fetches", len(futures))
+        return futures
+
+    def _done(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    async def _fetch(self, key, url, size):
+        async with self._sem:
+            t0 = time.perf_counter()
+            try:
+                status, body = await asyncio.wait_for(self._http.get(url), self.timeout)
+                if status != 200:
+                    raise ValueError(f"HTTP {status}")
+                loop = asyncio.get_running_loop()
+                digest = await loop.run_in_executor(
+                    self._executor, lambda: self.cache.put(key, make_thumbnail(body, size)))
+            except Exception:
+                self.failed += 1
+                count("images.failed")
+                await asyncio.get_running_loop().run_in_executor(self._executor, self.cache.fail, key)
+                return None
+            self.fetched += 1
+            self.latencies.append(time.perf_counter() - t0)
+            return digest
+
+    def stats(self):
+        """Cache stats plus fetch counts and the p50/p95 time to fetch and store a thumbnail."""
+        lat = sorted(self.latencies)
+        p50, p95 = ((lat[min(len(lat) - 1, int(q * len(lat)))] * 1000 if lat else None) for q in (0.5, 0.95))
+        return dict(self.cache.stats(), fetched=self.fetched, failed=self.failed, pending=len(self._pending),
+                    connections=self._http.opened if self._pid else 0, fetch_p50_ms=p50, fetch_p95_ms=p95)
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def image_pipeline():
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = ImagePipeline()
+    return _pipeline
+
+
+def thumbnail_urls(urls, size: str, wait: float = THUMB_WAIT):
+    """Served image URL per product image URL (remote URLs as-is when thumbnails are off)."""
+    if not ENABLED:
+        # The sample catalog's image URLs carry their size; ask the origin for the card's.
+        return [u.replace("800x1000", size) for u in urls]
+    return image_pipeline().resolve(urls, size, wait)
+
+
+def prefetch_thumbnails(urls, size: str):
+    if ENABLED:
+        image_pipeline().prefetch(urls, size)
+
+
+register_collector("thumbnails", lambda: _pipeline.stats() if _pipeline is not None else {})
@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+
+from utils.catalog import catalog_alive, derived
+
+# Dimensions with one posting list (sorted row ids) per distinct value.
+FACETS = ["brand", "store", "category", "discount_pct"]
+
+# Price preferences from the profile page; a product may sit in several bands.
+PRICE_BANDS = {
+    "Luxury Only": lambda df: df["msrp"].to_numpy() >= 250,
+    "Budget": lambda df: df["price"].to_numpy() <= 80,
+}
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+class CatalogIndex:
+    """Posting lists over the catalog so a profile feed is a set intersection."""
+
+    def __init__(self, products: pd.DataFrame):
+        n = len(products)
+        self.size = n
+        alive = catalog_alive(products)
+        self.alive = np.ones(n, dtype=bool) if alive is None else np.array(alive, dtype=bool)
+        self.keys, self.labels, self.lookup, self.postings = {}, {}, {}, {}
+        for col in FACETS:
+            codes, uniques = pd.factorize(products[col], sort=True)
+            codes = codes.astype(np.int32)
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            self.keys[col] = codes
+            self.labels[col] = list(uniques)
+            self.lookup[col] = {v: i for i, v in enumerate(self.labels[col])}
+            self.postings[col] = [order[bounds[i]:bounds[i + 1]] for i in range(len(uniques))]
+        self.discount = products["discount_pct"].to_numpy(dtype=np.int16, copy=True)
+        self.bands = {name: rule(products) for name, rule in PRICE_BANDS.items()}
+        self.band_postings = {name: np.flatnonzero(mask) for name, mask in self.bands.items()}
+
+    # ---- Query ----
+    def select(self, brands=None, stores=None, categories=None, price_pref=None, min_disc=0):
+        """Sorted row ids matching the profile filters (same semantics as the pandas chain)."""
+        terms = []  # (size, ids(), keep(ids))
+        for col, wanted in (("brand", brands), ("store", stores), ("category", categories)):
+            if not wanted:
+                continue
+            codes = [self.lookup[col][v] for v in wanted if v in self.lookup[col]]
+            if not codes:
+                return _EMPTY
+            terms.append(self._facet_term(col, codes))
+
+        if price_pref in self.bands:
+            mask, ids = self.bands[price_pref], self.band_postings[price_pref]
+            terms.append((len(ids), lambda ids=ids: ids, lambda r, m=mask: m[r]))
+
+        if min_disc > 0:
+            codes = [c for v, c in self.lookup["discount_pct"].items() if v >= min_disc]
+            if not codes:
+                return _EMPTY
+            size = sum(len(self.postings["discount_pct"][c]) for c in codes)
+            # Few wide buckets: one dense scan beats merging their postings.
+            terms.append((size, lambda: np.flatnonzero(self.discount >= min_disc),
+                          lambda r: self.discount[r] >= min_disc))
+
+        if not terms:
+            return np.flatnonzero(self.alive)
+
+        terms.sort(key=lambda t: t[0])
+        rows = terms[0][1]()
+        for _, _, keep in terms[1:]:
+            if not len(rows):
+                break
+            rows = rows[keep(rows)]
+        return rows[self.alive[rows]]
+
+    def _facet_term(self, col, codes):
+        postings = self.postings[col]
+        allowed = np.zeros(len(self.labels[col]), dtype=bool)
+        allowed[codes] = True
+        keys = self.keys[col]
+
+        def ids():
+            if len(codes) == 1:
+                return postings[codes[0]]
+            return np.sort(np.concatenate([postings[c] for c in codes]))
+
+        return sum(len(postings[c]) for c in codes), ids, lambda r: allowed[keys[r]]
+
+    # ---- Incremental maintenance ----
+    def upsert(self, rows, products: pd.DataFrame):
+        """Re-index `rows` (positions; positions >= size are appended) from `products`."""
+        rows = np.asarray(rows, dtype=np.int64)
+        order = np.argsort(rows, kind="stable")
+        rows, products = rows[order], products.iloc[order]
+        grow = int(rows.max()) + 1 - self.size if len(rows) else 0
+        if grow > 0:
+            self._grow(grow)
+
+        for col in FACETS:
+            new = np.array([self._code(col, v) for v in products[col].tolist()], dtype=np.int32)
+            self._move(self.postings[col], self.keys[col], rows, new)
+        self.discount[rows] = products["discount_pct"].to_numpy(dtype=np.int16)
+        for name, rule in PRICE_BANDS.items():
+            inside = rule(products)
+            mask = self.bands[name]
+            changed = mask[rows] != inside
+            if changed.any():
+                mask[rows] = inside
+                self.band_postings[name] = np.flatnonzero(mask)
+        self.alive[rows] = True
+
+    def delete(self, rows):
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        rows = rows[rows < self.size]
+        self.alive[rows] = False
+        for col in FACETS:
+            self._move(self.postings[col], self.keys[col], rows, np.full(len(rows), -1, np.int32))
+
+    def _code(self, col, value):
+        code = self.lookup[col].get(value)
+        if code is None:
+            code = len(self.labels[col])
+            self.labels[col].append(value)
+            self.lookup[col][value] = code
+            self.postings[col].append(_EMPTY)
+        return code
+
+    def _grow(self, extra):
+        self.size += extra
+        self.alive = np.concatenate([self.alive, np.zeros(extra, dtype=bool)])
+        for col in FACETS:
+            self.keys[col] = np.concatenate([self.keys[col], np.full(extra, -1, np.int32)])
+        self.discount = np.concatenate([self.discount, np.zeros(extra, np.int16)])
+        for name in self.bands:
+            self.bands[name] = np.concatenate([self.bands[name], np.zeros(extra, dtype=bool)])
+
+    @staticmethod
+    def _move(postings, keys, rows, new):
+        old = keys[rows]
+        changed = old != new
+        rows, old, new = rows[changed], old[changed], new[changed]
+        # Postings and `rows` are sorted: splice by position instead of re-sorting.
+        for c in np.unique(old[old >= 0]):
+            postings[c] = np.delete(postings[c], np.searchsorted(postings[c], rows[old == c]))
+        for c in np.unique(new[new >= 0]):
+            moved = rows[new == c]
+            postings[c] = np.insert(postings[c], np.searchsorted(postings[c], moved), moved)
+        keys[rows] = new
+
+
+def _refresh(index, rows, products):
+    alive = catalog_alive(products)
+    live = rows if alive is None else rows[alive[rows]]
+    if len(live):
+        index.upsert(live, products.take(live))
+    if len(live) < len(rows):
+        index.delete(np.setdiff1d(rows, live))
+
+
+def get_index(products: pd.DataFrame):
+    columns = FACETS + ["msrp", "price", "alive"]
+    return derived(products, "index", CatalogIndex, columns=columns, update=_refresh, share=True)
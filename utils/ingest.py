@@ -0,0 +1,266 @@
+"""Apply delta feeds (upserts and deletes keyed by product id) to the catalog store.
+
+    python -m utils.ingest deltas/2024-06-01.csv deltas/flash-sale.jsonl
+
+A delta has an `id` column, an optional `op` column ("upsert", the default,
+or "delete") and any subset of the catalog columns; missing or empty cells
+leave the stored value alone. When price or msrp changes without an explicit
+discount_pct, the discount is recomputed from the two.
+
+Changes to existing rows are written into the store's column files in place
+(every process maps them, so they see the new values at once). Each batch
+bumps the catalog version and logs the rows and columns it touched, so
+readers patch only the derived structures that depend on them (see
+utils.catalog.derived). New products and new category labels reshape the
+files instead: those batches rewrite the affected columns and readers reopen
+the store.
+"""
+import argparse
+import fcntl
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.catalog import (
+    CHANGE_LOG, COLUMNS, NUMERIC, PRODUCTS_CSV, StoreState, build_store, read_manifest, save_atomic,
+    write_manifest,
+)
+
+OPS = ("upsert", "delete")
+# New products must say at least this much; the rest default.
+REQUIRED = ["name", "brand", "category", "store", "msrp", "price"]
+DEFAULTS = {"image_url": "", "product_url": ""}
+
+
+def read_delta(path, batch_size: int = None):
+    """A delta file (CSV, or JSON lines for .jsonl/.ndjson) as one frame, or frames of `batch_size` rows."""
+    path = Path(path)
+    if path.suffix in (".jsonl", ".ndjson"):
+        return pd.read_json(path, lines=True, dtype=False, chunksize=batch_size)
+    return pd.read_csv(path, dtype={"id": str, "op": str}, chunksize=batch_size)
+
+
+def _normalize(delta: pd.DataFrame):
+    if "id" not in delta:
+        raise ValueError("A delta needs an 'id' column")
+    unknown = set(delta.columns) - set(COLUMNS) - {"op"}
+    if unknown:
+        raise ValueError(f"Unknown delta columns: {', '.join(sorted(unknown))}")
+    delta = delta.reset_index(drop=True)
+    delta["id"] = delta["id"].astype(str)
+    delta["op"] = delta["op"].fillna("upsert").str.lower() if "op" in delta else "upsert"
+    bad = set(delta["op"]) - set(OPS)
+    if bad:
+        raise ValueError(f"Unknown delta ops: {', '.join(sorted(bad))}")
+    # Within a batch the last line for an id wins.
+    return delta.drop_duplicates("id", keep="last").reset_index(drop=True)
+
+
+def _store_path(src):
+    src = Path(src)
+    return src if (src / "manifest.json").exists() else build_store(src)
+
+
+@contextmanager
+def _locked(path):
+    with open(Path(path) / ".ingest.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _with_discount(frame, path, rows):
+    """Fill discount_pct from price/msrp where either changed and no discount was given."""
+    if "price" not in frame and "msrp" not in frame:
+        return frame
+    current = {c: np.load(path / f"{c}.npy", mmap_mode="r") for c in ("price", "msrp")}
+    values = {}
+    for col in ("price", "msrp"):
+        old = np.full(len(frame), np.nan)
+        existing = rows < len(current[col])
+        old[existing] = current[col][rows[existing]]
+        given = pd.to_numeric(frame[col], errors="coerce").to_numpy(float) if col in frame else old
+        values[col] = np.where(np.isnan(given), old, given)
+    changed = np.zeros(len(frame), dtype=bool)
+    for col in ("price", "msrp"):
+        if col in frame:
+            changed |= frame[col].notna().to_numpy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct = np.clip(np.round((1 - values["price"] / values["msrp"]) * 100), 0, 100)
+    derived = pd.Series(np.where(changed, pct, np.nan), index=frame.index)
+    frame = frame.copy()
+    frame["discount_pct"] = frame["discount_pct"].fillna(derived) if "discount_pct" in frame else derived
+    return frame
+
+
+def apply_delta(delta: pd.DataFrame, src=PRODUCTS_CSV):
+    """Apply one batch to the store behind `src`; returns a summary with the new catalog version."""
+    t0 = time.perf_counter()
+    delta = _normalize(delta)
+    path = _store_path(src)
+    with _locked(path):
+        manifest = read_manifest(path)
+        n = manifest["rows"]
+        labels, order, row_of = StoreState(path, manifest).id_index()
+
+        ids = delta["id"].to_numpy(dtype=str)
+        pos = np.full(len(ids), -1, dtype=np.int64)
+        if len(labels) and len(ids):
+            at = order[np.minimum(np.searchsorted(labels, ids, sorter=order), len(labels) - 1)]
+            pos = np.where(labels[at] == ids, row_of[at], -1)
+        deleting = (delta["op"] == "delete").to_numpy()
+        gone = pos[deleting & (pos >= 0)]
+        updating = ~deleting & (pos >= 0)
+        inserting = ~deleting & (pos < 0)
+
+        new = delta[inserting]
+        missing = [c for c in REQUIRED if c not in new or new[c].isna().any()]
+        if len(new) and missing:
+            raise ValueError(f"New products need values for: {', '.join(missing)}")
+        frame = pd.concat([delta[updating], new], ignore_index=True)
+        rows = np.concatenate([pos[updating], np.arange(n, n + len(new))])
+        frame = _with_discount(frame, path, rows)
+        for col, default in DEFAULTS.items():
+            if len(new):
+                values = frame[col] if col in frame else pd.Series(np.nan, index=frame.index, dtype=object)
+                frame[col] = values.where(values.notna() | (rows < n), default)
+
+        # Per column: (rows, stored values); categorical values become codes here.
+        changes, grown_labels = {}, {}
+        for col in COLUMNS[1:]:
+            if col not in frame:
+                continue
+            given = frame[col].notna().to_numpy()
+            if not given.any():
+                continue
+            if col in NUMERIC:
+                values = pd.to_numeric(frame[col][given]).to_numpy(NUMERIC[col])
+            else:
+                col_labels = np.load(path / f"{col}.labels.npy")
+                text = frame[col][given].astype(str).to_numpy()
+                codes = pd.Index(col_labels).get_indexer(text)
+                fresh = pd.unique(text[codes < 0])
+                if len(fresh):
+                    grown_labels[col] = np.concatenate([col_labels, fresh.astype(str)])
+                    codes = pd.Index(grown_labels[col]).get_indexer(text)
+                values = codes
+            changes[col] = (rows[given], values)
+
+        alive_file = path / "alive.npy"
+        # Upserting a deleted id brings it back.
+        revived = pos[updating]
+        if alive_file.exists():
+            revived = revived[~np.load(alive_file, mmap_mode="r")[revived]]
+        structural = len(new) > 0 or bool(grown_labels) or not alive_file.exists()
+        if structural:
+            manifest = _rewrite(path, manifest, changes, grown_labels, new["id"].to_numpy(dtype=str),
+                                gone, revived)
+        else:
+            _write_in_place(path, changes, gone, revived)
+
+        version = manifest.get("version", 0) + 1
+        touched = set(changes) | ({"alive"} if len(gone) or len(new) or len(revived) else set())
+        (path / "changes").mkdir(exist_ok=True)
+        save_atomic(path / "changes" / f"{version}.npy", np.unique(np.concatenate([rows, gone])))
+        log = manifest.get("log", []) + [{"version": version, "columns": sorted(touched)}]
+        for old in log[:-CHANGE_LOG]:
+            (path / "changes" / f"{old['version']}.npy").unlink(missing_ok=True)
+        manifest.update(version=version, log=log[-CHANGE_LOG:])
+        if structural:
+            manifest["layout"] = manifest.get("layout", 0) + 1
+        write_manifest(path, manifest)
+
+    return {
+        "version": version,
+        "updated": int(updating.sum()),
+        "inserted": len(new),
+        "deleted": len(gone),
+        "ignored_deletes": int((deleting & (pos < 0)).sum()),
+        "reshaped": structural,
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+
+
+def _column_file(path, col):
+    return path / (f"{col}.npy" if col in NUMERIC else f"{col}.codes.npy")
+
+
+def _write_in_place(path, changes, gone, revived):
+    for col, (rows, values) in changes.items():
+        column = np.load(_column_file(path, col), mmap_mode="r+")
+        column[rows] = values
+        column.flush()
+    alive = np.load(path / "alive.npy", mmap_mode="r+")
+    alive[revived] = True
+    alive[gone] = False
+    alive.flush()
+
+
+def _rewrite(path, manifest, changes, grown_labels, new_ids, gone, revived):
+    """Rewrite column files with appended rows / new labels; returns the updated manifest."""
+    n, extra = manifest["rows"], len(new_ids)
+    for col in COLUMNS[1:]:
+        spec = manifest["columns"][col]
+        column = np.load(_column_file(path, col))
+        if col in grown_labels:
+            save_atomic(path / f"{col}.labels.npy", grown_labels[col])
+            dtype = np.min_scalar_type(-len(grown_labels[col]))  # signed, room for -1
+            if np.dtype(dtype).itemsize > column.dtype.itemsize:
+                column = column.astype(dtype)
+                spec["dtype"] = np.dtype(dtype).name
+        if extra:
+            column = np.concatenate([column, np.zeros(extra, dtype=column.dtype)])
+        if col in changes:
+            rows, values = changes[col]
+            column[rows] = values
+        save_atomic(_column_file(path, col), column)
+
+    alive_file = path / "alive.npy"
+    alive = np.load(alive_file) if alive_file.exists() else np.ones(n, dtype=bool)
+    alive = np.concatenate([alive, np.ones(extra, dtype=bool)])
+    alive[revived] = True
+    alive[gone] = False
+    save_atomic(alive_file, alive)
+
+    if extra:
+        labels = np.load(path / "id.labels.npy")
+        state = StoreState(path, manifest)
+        _, order, row_of = state.id_index()
+        sort = np.argsort(new_ids, kind="stable")
+        new_codes = len(labels) + sort
+        at = np.searchsorted(labels, new_ids[sort], sorter=order)
+        order = np.insert(np.asarray(order), at, new_codes)
+        row_of = np.concatenate([row_of, np.arange(n, n + extra)])
+        labels = np.concatenate([labels, new_ids]).astype(str)
+        codes = np.concatenate([np.load(path / "id.codes.npy"), np.arange(len(labels) - extra, len(labels))])
+        dtype = np.min_scalar_type(-len(labels))
+        manifest["columns"]["id"]["dtype"] = np.dtype(dtype).name
+        save_atomic(path / "id.codes.npy", codes.astype(dtype))
+        save_atomic(path / "id.labels.npy", labels)
+        save_atomic(path / "id.order.npy", order)
+        save_atomic(path / "id.rows.npy", row_of)
+    manifest["rows"] = n + extra
+    return manifest
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Apply delta feeds to the product catalog store.")
+    ap.add_argument("deltas", nargs="+", help="CSV or JSONL files with id, optional op, and changed columns")
+    ap.add_argument("--products", default=PRODUCTS_CSV, help="catalog source (CSV/Parquet) or store directory")
+    ap.add_argument("--batch-size", type=int, default=1_000_000, help="rows applied per catalog version")
+    args = ap.parse_args(argv)
+    for name in args.deltas:
+        for batch in read_delta(name, args.batch_size):
+            r = apply_delta(batch, args.products)
+            print(f"{name}: v{r['version']} updated {r['updated']:,}, inserted {r['inserted']:,}, "
+                  f"deleted {r['deleted']:,} in {r['seconds'] * 1000:.0f} ms"
+                  + (" (store reshaped)" if r["reshaped"] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""Lightweight timings, counters and cache gauges for the hot paths.
+
+Off unless WISHDROP_METRICS=1 (or enable() is called); while off, span()
+hands back a shared no-op context and timed() wrappers make one attribute
+check before calling through.
+
+    with span("discover.filter"): ...
+    @timed("storage.get_board")
+    def get_board(...): ...
+    count("price.simulated", n)
+
+Aggregates are process-wide (prometheus_text(), or an HTTP endpoint on
+WISHDROP_METRICS_PORT); spans are also kept per rerun for the debug panel.
+"""
+import contextlib
+import functools
+import hmac
+import io
+import os
+import threading
+import time
+
+_NULL = contextlib.nullcontext()
+
+
+class _State:
+    enabled = os.environ.get("WISHDROP_METRICS", "0") == "1"
+
+
+STATE = _State()
+_lock = threading.Lock()
+_spans = {}  # name -> [count, total seconds, max seconds]
+_counters = {}  # name -> value
+_collectors = {}  # name -> fn() -> {metric: number}
+_local = threading.local()  # per-thread (= per Streamlit session) rerun trace
+
+
+def enable(on: bool = True):
+    STATE.enabled = on
+
+
+def enabled():
+    return STATE.enabled
+
+
+# ---- Recording ----
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        _local.depth = getattr(_local, "depth", 0) + 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        _local.depth -= 1
+        trace = getattr(_local, "trace", None)
+        if trace is not None:
+            trace.append((self.name, _local.depth, self.start - _local.rerun_start, elapsed))
+        with _lock:
+            agg = _spans.get(self.name)
+            if agg is None:
+                _spans[self.name] = [1, elapsed, elapsed]
+            else:
+                agg[0] += 1
+                agg[1] += elapsed
+                agg[2] = max(agg[2], elapsed)
+        return False
+
+
+def span(name: str):
+    """Context manager timing a block under `name` (a no-op while metrics are off)."""
+    return _Span(name) if STATE.enabled else _NULL
+
+
+def timed(name: str = None):
+    """Decorator form of span(); the span defaults to module.function."""
+    def wrap(fn):
+        label = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not STATE.enabled:
+                return fn(*args, **kwargs)
+            with _Span(label):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def count(name: str, n: int = 1):
+    if STATE.enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+        trace = getattr(_local, "counts", None)
+        if trace is not None:
+            trace[name] = trace.get(name, 0) + n
+
+
+def register_collector(name: str, fn):
+    """`fn()` returns {metric: number}; read at export time (e.g. cache stats)."""
+    _collectors[name] = fn
+
+
+# ---- Per-rerun trace ----
+def begin_rerun(page: str):
+    """Start collecting spans for this script run (call at the top of a page)."""
+    if not STATE.enabled:
+        _local.trace = _local.counts = None
+        return
+    _local.page, _local.rerun_start = page, time.perf_counter()
+    _local.trace, _local.counts, _local.depth = [], {}, 0
+
+
+def rerun_trace():
+    """(spans, counts) recorded since begin_rerun in this thread: spans are (name, depth, offset s, seconds)."""
+    return list(getattr(_local, "trace", None) or []), dict(getattr(_local, "counts", None) or {})
+
+
+# ---- Export ----
+def snapshot():
+    with _lock:
+        spans = {k: tuple(v) for k, v in _spans.items()}
+        counters = dict(_counters)
+    gauges = {}
+    for name, fn in list(_collectors.items()):
+        try:
+            gauges[name] = {k: v for k, v in (fn() or {}).items() if isinstance(v, (int, float))}
+        except Exception:
+            continue
+    return {"spans": spans, "counters": counters, "gauges": gauges}
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+
+def prometheus_text():
+    """All metrics in the Prometheus text exposition format."""
+    snap = snapshot()
+    out = [
+        "# HELP wishdrop_span_seconds Time spent in instrumented code paths.",
+        "# TYPE wishdrop_span_seconds summary",
+    ]
+    for name, (n, total, _) in sorted(snap["spans"].items()):
+        out.append(f'wishdrop_span_seconds_count{{span="{name}"}} {n}')
+        out.append(f'wishdrop_span_seconds_sum{{span="{name}"}} {total:.6f}')
+    out += ["# HELP wishdrop_span_max_seconds Slowest single call per code path.",
+            "# TYPE wishdrop_span_max_seconds gauge"]
+    for name, (_, _, slowest) in sorted(snap["spans"].items()):
+        out.append(f'wishdrop_span_max_seconds{{span="{name}"}} {slowest:.6f}')
+    out += ["# HELP wishdrop_events_total Counted events.", "# TYPE wishdrop_events_total counter"]
+    for name, value in sorted(snap["counters"].items()):
+        out.append(f'wishdrop_events_total{{event="{name}"}} {value}')
+    out += ["# HELP wishdrop_cache Cache statistics.", "# TYPE wishdrop_cache gauge"]
+    for cache, values in sorted(snap["gauges"].items()):
+        for metric, value in sorted(values.items()):
+            out.append(f'wishdrop_cache{{cache="{cache}",stat="{metric}"}} {value}')
+    return "\n".join(out) + "\n"
+
+
+_server = None
+
+
+def serve(port: int, host: str = "127.0.0.1"):
+    """Expose prometheus_text() at http://host:port/metrics from a daemon thread (once per process)."""
+    global _server
+    if _server is not None:
+        return _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = prometheus_text().encode()
+            self.send_response(200 if self.path.startswith("/metrics") else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    _server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=_server.serve_forever, daemon=True, name="metrics-exporter").start()
+    return _server
+
+
+if STATE.enabled and os.environ.get("WISHDROP_METRICS_PORT"):
+    try:
+        serve(int(os.environ["WISHDROP_METRICS_PORT"]), os.environ.get("WISHDROP_METRICS_HOST", "127.0.0.1"))
+    except OSError:
+        pass  # another worker on this host already serves the port
+
+
+# ---- Profiling ----
+class Profile:
+    """cProfile (stdlib) or pyinstrument (if installed, WISHDROP_PROFILER=pyinstrument) around a block."""
+
+    def __init__(self, mode: str = None, limit: int = 30):
+        self.mode = mode or os.environ.get("WISHDROP_PROFILER", "cprofile")
+        self.limit = limit
+        self.report = ""
+
+    def start(self):
+        if self.mode == "pyinstrument":
+            from pyinstrument import Profiler
+
+            self._profiler = Profiler()
+            self._profiler.start()
+        else:
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def stop(self):
+        if self.mode == "pyinstrument":
+            self._profiler.stop()
+            self.report = self._profiler.output_text(unicode=True)
+        else:
+            import pstats
+
+            self._profiler.disable()
+            buf = io.StringIO()
+            pstats.Stats(self._profiler, stream=buf).sort_stats("cumulative").print_stats(self.limit)
+            self.report = buf.getvalue()
+        return self.report
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+# ---- Pages ----
+def debug_requested():
+    """Whether to show the debug panel; only the server's environment can allow it.
+
+    WISHDROP_DEBUG=1 shows it on every page (development). With
+    WISHDROP_DEBUG_TOKEN set, only visitors opening a page with
+    ?debug=<token> see it.
+    """
+    token = os.environ.get("WISHDROP_DEBUG_TOKEN")
+    if token:
+        import streamlit as st
+
+        # Bytes: compare_digest refuses str with non-ASCII characters.
+        given = st.query_params.get("debug", "")
+        return hmac.compare_digest(given.encode("utf-8"), token.encode("utf-8"))
+    return os.environ.get("WISHDROP_DEBUG") == "1"
+
+
+def page_start(page: str):
+    """Call at the top of a page: starts its rerun trace and, if asked from the panel, a profile."""
+    import streamlit as st
+
+    leftover = getattr(_local, "profile", None)
+    if leftover is not None:
+        # The previous run stopped (st.stop) before reaching the panel.
+        leftover.stop()
+    _local.profile = None
+    begin_rerun(page)
+    if st.session_state.get("_debug_profile") and debug_requested():
+        try:
+            _local.profile = Profile().start()
+        except ValueError:
+            pass  # another session is being profiled; one profiler per process
+
+
+def debug_panel():
+    """Sidebar panel with this rerun's spans, counters and cache hit rates (see debug_requested)."""
+    import streamlit as st
+
+    profile, _local.profile = getattr(_local, "profile", None), None
+    if profile is not None:
+        profile.stop()
+    if not debug_requested():
+        return
+    with st.sidebar.expander("⏱️ Debug: timings", expanded=True):
+        if not STATE.enabled:
+            st.caption("Metrics are off (WISHDROP_METRICS=1 turns them on at startup).")
+            if st.button("Collect metrics in this process"):
+                enable()
+                st.rerun()
+            return
+        spans, counts = rerun_trace()
+        if spans:
+            st.dataframe(
+                [{"span": "  " * depth + name, "ms": round(seconds * 1000, 2), "at ms": round(offset * 1000, 1)}
+                 for name, depth, offset, seconds in sorted(spans, key=lambda s: s[2])],
+                hide_index=True,
+            )
+        if counts:
+            st.caption(" • ".join(f"{k}: {v:,}" for k, v in sorted(counts.items())))
+        for cache, values in snapshot()["gauges"].items():
+            if "hit_rate" in values:
+                st.caption(f"{cache}: {values['hit_rate']:.0%} hit rate "
+                           f"({values.get('hits', 0):,} hits / {values.get('misses', 0):,} misses)")
+        st.checkbox("Profile each rerun", key="_debug_profile")
+        if profile is not None:
+            st.code(profile.report, language="text")
@@ -0,0 +1,288 @@
+"""Nightly batch job: price histories, buy/wait signals and profile feeds for the whole catalog.
+
+    python -m utils.precompute --workers 8
+
+The catalog is split into row shards (histories and signals) and the
+stored profiles into profile shards (each profile's default Discover feed),
+and the shards run on a process pool. Workers write straight into
+memory-mapped .npy files of a new run directory under data/.precomputed/
+(WISHDROP_PRECOMPUTED). Once every shard is done the run is published by
+rewriting current.json. Pages map the published files and use them wherever
+they still hold:
+
+- price_histories() takes a product's history from the run if it was built
+  today, at the product's current price and price-store version;
+- Discover's recommendation filter reads the signals by catalog row, and
+  recomputes only the rows a delta batch has touched since the run;
+- Discover's default feed (no search, default discount, profile-ranked)
+  uses the run's top cards while the catalog version and the profile are
+  unchanged.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils import storage
+from utils.catalog import (
+    DATA_DIR, PRODUCTS_CSV, catalog_version, load_products, read_manifest, save_atomic, store_state,
+)
+from utils.feed import first, order_keys
+from utils.index import get_index
+from utils.metrics import count
+from utils.price import build_price_histories, buy_or_wait_signals, price_histories, product_seeds
+from utils.rank import get_scorer
+from utils.timeseries import price_store
+
+RESULTS_DIR = Path(os.environ.get("WISHDROP_PRECOMPUTED", DATA_DIR / ".precomputed"))
+HISTORY_DAYS = 60
+FEED_DEPTH = 1000  # cards per profile feed; "load more" past them goes live
+DEFAULT_MIN_DISC = 10  # Discover's discount slider default
+# Profile fields the default (ranked) feed depends on.
+FEED_FIELDS = ("brands", "stores", "categories", "price_pref")
+
+
+def profile_fingerprint(profile: dict):
+    fields = [profile.get(f) for f in FEED_FIELDS]
+    return hashlib.blake2b(json.dumps(fields, sort_keys=True).encode(), digest_size=8).hexdigest()
+
+
+# ---- Shards (run in the pool) ----
+def _history_shard(src, out, lo, hi, days):
+    t0 = time.perf_counter()
+    products = load_products(src)
+    ids = products["id"].iloc[lo:hi].astype(str).tolist()
+    prices = products["price"].to_numpy()[lo:hi]
+    hist, _ = build_price_histories(ids, prices, days)
+    codes, scores = buy_or_wait_signals(hist, prices)
+    for name, values in (("histories", hist), ("prices", prices), ("signals", codes), ("scores", scores),
+                         ("seeds", product_seeds(ids))):
+        target = np.load(Path(out) / f"{name}.npy", mmap_mode="r+")
+        target[lo:hi] = values
+        target.flush()
+    return {"kind": "histories", "start": lo, "size": hi - lo, "seconds": time.perf_counter() - t0}
+
+
+def _feed_shard(src, out, lo, profiles, min_disc):
+    t0 = time.perf_counter()
+    products = load_products(src)
+    rows = get_index(products).select(min_disc=min_disc)
+    scorer = get_scorer(products)
+    feeds = np.load(Path(out) / "feeds.npy", mmap_mode="r+")
+    for n, profile in enumerate(profiles, start=lo):
+        keys = order_keys(rows, scorer.scores(scorer.weights(profile), rows))
+        feeds[n] = keys[first(keys, feeds.shape[1])]
+    feeds.flush()
+    return {"kind": "feeds", "start": lo, "size": len(profiles), "seconds": time.perf_counter() - t0}
+
+
+# ---- Job ----
+def run_job(src=PRODUCTS_CSV, out=RESULTS_DIR, workers=None, shards=None, profiles=None,
+            days=HISTORY_DAYS, depth=FEED_DEPTH, min_disc=DEFAULT_MIN_DISC, log=None):
+    """Compute and publish a run; returns its manifest (with per-shard timings)."""
+    t0 = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    shards = shards or 4 * workers
+    products = load_products(src)
+    state = store_state(products)
+    n = len(products)
+    profiles = storage.backend().items("profiles") if profiles is None else profiles
+    names = list(profiles)
+    # Built before the pool forks, so every worker inherits them.
+    rows = get_index(products).select(min_disc=min_disc)
+    if names:
+        get_scorer(products)
+
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=".build-", dir=out))
+    try:
+        for name, dtype, shape in (("histories", np.float32, (n, days)), ("prices", np.float32, (n,)),
+                                   ("signals", np.int8, (n,)), ("scores", np.int8, (n,)), ("seeds", np.uint64, (n,)),
+                                   ("feeds", np.int64, (len(names), min(depth, len(rows))))):
+            np.lib.format.open_memmap(tmp / f"{name}.npy", mode="w+", dtype=dtype, shape=shape).flush()
+
+        step = -(-n // shards) or 1
+        profile_step = -(-len(names) // shards) or 1
+        ctx = multiprocessing.get_context("fork")
+        timings = []
+        with ProcessPoolExecutor(workers, mp_context=ctx) as pool:
+            futures = [pool.submit(_history_shard, str(src), str(tmp), lo, min(n, lo + step), days)
+                       for lo in range(0, n, step)]
+            futures += [pool.submit(_feed_shard, str(src), str(tmp), lo,
+                                    [profiles[p] for p in names[lo:lo + profile_step]], min_disc)
+                        for lo in range(0, len(names), profile_step)]
+            for future in as_completed(futures):
+                timings.append(future.result())
+                if log:
+                    t = timings[-1]
+                    log(f"  {t['kind']:<9} shard {t['start']:>11,} +{t['size']:<9,} {t['seconds'] * 1000:9.1f} ms")
+
+        seeds = np.load(tmp / "seeds.npy")
+        order = np.argsort(seeds, kind="stable")
+        np.save(tmp / "seed_order.npy", order)
+        np.save(tmp / "seeds.npy", seeds[order])
+        (tmp / "profiles.json").write_text(json.dumps(
+            {name: [p, profile_fingerprint(profiles[name])] for p, name in enumerate(names)}), encoding="utf-8")
+        run = f"{date.today().isoformat()}-{time.time_ns():x}"
+        manifest = {
+            "run": run, "day": date.today().isoformat(), "days": days, "rows": n, "profiles": len(names),
+            "catalog": {"path": str(state.path), "signature": state.signature, "layout": state.layout,
+                        "version": state.version},
+            "prices_version": price_store().version(),
+            "feed": {"min_disc": min_disc, "depth": depth, "total": len(rows)},
+            "workers": workers, "seconds": time.perf_counter() - t0,
+            "shards": sorted(timings, key=lambda t: (t["kind"], t["start"])),
+        }
+        (tmp / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        os.rename(tmp, out / run)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    save_atomic(out / "current.json", json.dumps({"run": run}).encode())
+    # Processes that still map an older run keep its pages.
+    for old in out.iterdir():
+        if old.is_dir() and old.name != run and not old.name.startswith(".build-"):
+            shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+# ---- Reading a published run ----
+class PrecomputedRun:
+    """A published run, memory-mapped."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.manifest = read_manifest(self.path)
+        self.catalog = self.manifest["catalog"]
+        arrays = ("histories", "prices", "signals", "scores", "seeds", "seed_order", "feeds")
+        for name in arrays:
+            setattr(self, name, np.load(self.path / f"{name}.npy", mmap_mode="r"))
+        self.profiles = json.loads((self.path / "profiles.json").read_text(encoding="utf-8"))
+        self._signals = (None, None, None)  # (catalog, version, (codes, scores))
+        self._lock = threading.Lock()
+
+    def covers(self, products: pd.DataFrame, exact: bool = False):
+        """True if the run was computed on this catalog (at this very version if `exact`)."""
+        state = store_state(products)
+        return (state is not None and str(state.path) == self.catalog["path"]
+                and state.signature == self.catalog["signature"] and state.layout == self.catalog["layout"]
+                and (not exact or state.version == self.catalog["version"]))
+
+    def current_prices(self, version):
+        """True if the histories still hold: built today against this price-store version."""
+        return self.manifest["day"] == date.today().isoformat() and self.manifest["prices_version"] == version
+
+    def signals_for(self, products: pd.DataFrame):
+        version = catalog_version(products)
+        with self._lock:
+            if self._signals[0] is products and self._signals[1] == version:
+                return self._signals[2]
+            codes, scores = self.signals, self.scores
+            if version != self.catalog["version"]:
+                change = store_state(products).changes_since(self.catalog["version"])
+                if change is None:
+                    return None
+                touched = change[0]
+                if len(touched):
+                    sub = products.take(touched)
+                    prices = sub["price"].to_numpy()
+                    hist, _ = price_histories(sub["id"].astype(str).tolist(), prices, days=self.manifest["days"])
+                    codes, scores = np.array(codes), np.array(scores)
+                    codes[touched], scores[touched] = buy_or_wait_signals(hist, prices)
+            count("precompute.signal_hits")
+            self._signals = (products, version, (codes, scores))
+            return codes, scores
+
+
+_current = (None, None)  # (stamp of current.json, PrecomputedRun)
+_current_lock = threading.Lock()
+
+
+def current_run(out=RESULTS_DIR):
+    """The last published run, or None; reopened when the job publishes a new one."""
+    global _current
+    pointer = Path(out) / "current.json"
+    try:
+        st = pointer.stat()
+    except FileNotFoundError:
+        return None
+    stamp = (str(pointer), st.st_ino, st.st_mtime_ns)
+    with _current_lock:
+        if _current[0] == stamp:
+            return _current[1]
+        try:
+            run = PrecomputedRun(Path(out) / json.loads(pointer.read_text(encoding="utf-8"))["run"])
+        except (FileNotFoundError, KeyError, ValueError):
+            run = None
+        _current = (stamp, run)
+        return run
+
+
+def precomputed_histories(ids, prices, days: int, prices_version):
+    """The run's history row per id (None where it has none at this price)."""
+    run = current_run()
+    if run is None or run.manifest["days"] != days or not run.current_prices(prices_version) or not len(run.seeds):
+        return [None] * len(ids)
+    seeds = product_seeds([str(i) for i in ids])
+    at = np.minimum(np.searchsorted(run.seeds, seeds), len(run.seeds) - 1)
+    rows = run.seed_order[at]
+    ok = (run.seeds[at] == seeds) & (np.round(run.prices[rows].astype(np.float64), 2)
+                                     == np.round(np.asarray(prices, dtype=np.float64), 2))
+    return [run.histories[r] if hit else None for r, hit in zip(rows.tolist(), ok.tolist())]
+
+
+def precomputed_signals(products: pd.DataFrame):
+    """(signal codes, scores) per catalog row from the run, or None if it does not cover this catalog today.
+
+    Rows touched by delta batches since the run are recomputed.
+    """
+    run = current_run()
+    if run is None or not run.covers(products) or not run.current_prices(price_store().version()):
+        return None
+    return run.signals_for(products)
+
+
+def precomputed_feed(products: pd.DataFrame, name: str, profile: dict, min_disc: int):
+    """(ordering keys of the top cards, feed length) of `name`'s default feed, or None if stale."""
+    run = current_run()
+    if run is None or run.manifest["feed"]["min_disc"] != min_disc or not run.covers(products, exact=True):
+        return None
+    entry = run.profiles.get(name)
+    if entry is None or entry[1] != profile_fingerprint(profile):
+        return None
+    count("precompute.feed_hits")
+    return run.feeds[entry[0]], run.manifest["feed"]["total"]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Precompute price histories, signals and profile feeds.")
+    ap.add_argument("--products", default=PRODUCTS_CSV, help="catalog source (CSV/Parquet) or store directory")
+    ap.add_argument("--out", default=RESULTS_DIR, help="results directory")
+    ap.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    ap.add_argument("--shards", type=int, default=None, help="shards per kind of work (default: 4 per worker)")
+    ap.add_argument("--days", type=int, default=HISTORY_DAYS)
+    ap.add_argument("--feed-depth", type=int, default=FEED_DEPTH)
+    ap.add_argument("--min-disc", type=int, default=DEFAULT_MIN_DISC)
+    args = ap.parse_args(argv)
+    m = run_job(args.products, args.out, args.workers, args.shards, days=args.days, depth=args.feed_depth,
+                min_disc=args.min_disc, log=print)
+    busy = sum(t["seconds"] for t in m["shards"])
+    print(f"{m['rows']:,} products and {m['profiles']:,} profiles in {m['seconds']:.1f} s on {m['workers']} "
+          f"workers ({busy:.1f} s of shard work) -> {Path(args.out) / m['run']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,266 @@
+from datetime import date
+from functools import lru_cache
+import os
+import numpy as np, pandas as pd
+
+from utils.cache import DiskStore, LRUCache
+from utils.metrics import count, register_collector, timed
+from utils.timeseries import price_store
+
+# Products are simulated in blocks of rows so temporaries stay a few MB.
+_CHUNK = 4096
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _mix(x):
+    """SplitMix64 finalizer, in place on a uint64 array."""
+    t = np.empty_like(x)
+    for shift, mul in ((30, 0xBF58476D1CE4E5B9), (27, 0x94D049BB133111EB)):
+        np.right_shift(x, np.uint64(shift), out=t)
+        x ^= t
+        x *= np.uint64(mul)
+    np.right_shift(x, np.uint64(31), out=t)
+    x ^= t
+    return x
+
+
+def product_seeds(ids):
+    """Stable 64-bit seed per product id (same across processes and runs)."""
+    text = np.asarray(ids, dtype=str).reshape(-1)
+    n, width = len(text), text.dtype.itemsize // 4
+    # UTF-32 code points, two to a 64-bit word; a row's words past its length are skipped.
+    chars = np.zeros((n, width + width % 2), dtype=np.uint32)
+    if width:
+        chars[:, :width] = text.view(np.uint32).reshape(n, width)
+    words = chars.astype("<u4", copy=False).view(np.uint64)
+    length = np.strings.str_len(text).astype(np.uint64)
+    used = (length + 1) // 2
+    h = _mix(length + _GOLDEN)
+    for j in range(words.shape[1]):
+        mixed = _mix((h ^ words[:, j]) + _GOLDEN)
+        np.copyto(h, mixed, where=used > j)
+    return h
+
+
+def product_seed(product_id) -> int:
+    return int(product_seeds([str(product_id)])[0])
+
+
+def _uniforms(seeds, count: int):
+    # SplitMix64 over (seed, counter): each product gets its own reproducible
+    # stream without creating one Generator object per product. Each 64-bit
+    # word is read as four 16-bit uniforms (codes 0..65535), one word per two days.
+    x = _mix(seeds[:, None] + _GOLDEN * np.arange(1, (count + 3) // 4 + 1, dtype=np.uint64))
+    return x.astype("<u8", copy=False).view(np.uint16)[:, :count]
+
+
+# Daily factors from 16-bit uniform codes: a +-1.2% drift, and a 5% chance of
+# a 3-10% drop whose size reuses the same draw rescaled.
+_DRIFT_SCALE = np.float32(0.024 / (1 << 16))
+_DRIFT_BASE = np.float32(1 - 0.012 + 0.012 / (1 << 16))
+_DROP_CODES = int(0.05 * (1 << 16))
+_DROP = (0.9 + 1.4 * (np.arange(_DROP_CODES) + 0.5) / (1 << 16)).astype(np.float32)
+
+
+def _drift(u, days: int, out):
+    np.multiply(u[:, 1:1 + days], _DRIFT_SCALE, out=out, dtype=np.float32)
+    out += _DRIFT_BASE
+    return out
+
+
+def _drops(u, days: int):
+    """(flat position, factor) of every drop in a rows x days matrix."""
+    codes = u[:, 1 + days:]
+    hit = codes < _DROP_CODES
+    return np.flatnonzero(hit), _DROP[codes[hit]]
+
+
+def _simulate(seeds, prices, days: int, out):
+    u = _uniforms(seeds, 1 + 2 * days)
+    start = (prices * (0.92 + 0.14 * (u[:, 0] + 0.5) / (1 << 16))).astype(np.float32)
+    _drift(u, days, out)
+    at, factor = _drops(u, days)
+    out.reshape(-1)[at] *= factor
+    # float32 keeps a year of daily factors within a cent of float64.
+    np.cumprod(out, axis=1, out=out)
+    out *= start[:, None]
+
+    # The $5 floor applies before a drop (so a floored row also ends below $5);
+    # only those rare rows are replayed day by day.
+    low = np.flatnonzero(out.min(axis=1) < 5.0)
+    if len(low):
+        step = _drift(u[low], days, np.empty((len(low), days), dtype=np.float32))
+        jump = np.ones_like(step)
+        at, factor = _drops(u[low], days)
+        jump.reshape(-1)[at] = factor
+        p = start[low].astype(np.float64)
+        for t in range(days):
+            p = np.maximum(5.0, p * step[:, t]) * jump[:, t]
+            step[:, t] = p
+        out[low] = step
+    np.round(out, 2, out=out)
+
+
+@lru_cache(maxsize=16)
+def _dates(days: int, end: date):
+    return pd.date_range(end=end, periods=days)
+
+
+def history_dates(days: int = 60):
+    return _dates(days, date.today())
+
+
+@timed("price.simulate")
+def simulate_price_histories(ids, current_prices, days: int = 60):
+    """Histories for many products at once: an N x days float32 matrix and its dates."""
+    prices = np.asarray(current_prices, dtype=np.float64)
+    seeds = product_seeds([str(i) for i in ids])
+    out = np.empty((len(prices), days), dtype=np.float32)
+    for lo in range(0, len(prices), _CHUNK):
+        _simulate(seeds[lo:lo + _CHUNK], prices[lo:lo + _CHUNK], days, out[lo:lo + _CHUNK])
+    return out, history_dates(days)
 
-from datetime import datetime
-import random, pandas as pd
 
 def simulate_price_history(current_price: float, days: int = 60, seed=None):
-    if seed is not None:
-        random.seed(seed)
-    prices = []
-    p = current_price * random.uniform(0.92, 1.06)
-    for _ in range(days):
-        drift = random.uniform(-0.012, 0.012) * p
-        p = max(5.0, p + drift)
-        if random.random() < 0.05:
-            p *= random.uniform(0.9, 0.97)
-        prices.append(round(p, 2))
-    idx = pd.date_range(end=datetime.today(), periods=days)
-    return pd.Series(prices, index=idx)
+    if seed is None:
+        seed = int(np.random.default_rng().integers(2 ** 63))
+    matrix, dates = simulate_price_histories([seed], [current_price], days)
+    return pd.Series(matrix[0], index=dates)
+
+
+def build_price_histories(ids, current_prices, days: int = 60):
+    """Simulated histories with the observed days (utils/timeseries.py) spliced in; not cached."""
+    prices = np.asarray(current_prices, dtype=np.float64)
+    fresh, dates = simulate_price_histories(ids, prices, days)
+    store = price_store()
+    if store.version():
+        observed = store.read(ids, days)
+        seen = ~np.isnan(observed)
+        rows = np.flatnonzero(seen.any(axis=1))
+        count("price.history_observed", len(rows))
+        # Scale the simulated lead-in so it runs into the first observed price.
+        start = seen[rows].argmax(axis=1)
+        fresh[rows] *= (observed[rows, start] / fresh[rows, start])[:, None]
+        fresh = np.where(seen, observed, np.round(fresh, 2))
+    return fresh, dates
+
+
+# ---- Shared history cache ----
+# One per process, shared by every session and page. Sized and optionally
+# spilled to disk (so restarts and other workers reuse histories) via env:
+#   WISHDROP_PRICE_CACHE_MB, WISHDROP_PRICE_CACHE_TTL, WISHDROP_PRICE_CACHE_DISK
+HISTORY_CACHE = LRUCache(max_bytes=int(float(os.environ.get("WISHDROP_PRICE_CACHE_MB", 64)) * 2 ** 20))
+_history_disk = None
+
+
+def configure_history_cache(max_bytes=None, ttl=None, disk_path=None):
+    global _history_disk
+    if max_bytes is not None:
+        HISTORY_CACHE.max_bytes = max_bytes
+    HISTORY_CACHE.ttl = ttl or None
+    _history_disk = DiskStore(disk_path, ttl=ttl or None) if disk_path else None
+    HISTORY_CACHE.clear()
+
+
+configure_history_cache(
+    ttl=float(os.environ.get("WISHDROP_PRICE_CACHE_TTL", 0)),
+    disk_path=os.environ.get("WISHDROP_PRICE_CACHE_DISK"),
+)
+
+
+@timed("price.histories")
+def price_histories(ids, current_prices, days: int = 60):
+    """Price histories served through the shared cache (keyed per product and day).
+
+    Misses come from the nightly precompute run when it has today's history
+    for the product at this price, and are built otherwise: days with an
+    observed price (utils/timeseries.py) use it, the rest are simulated.
+    """
+    day = date.today().isoformat()
+    prices = np.asarray(current_prices, dtype=np.float64)
+    version = price_store().version()
+    keys = [(str(i), day, days, round(float(p), 2), version) for i, p in zip(ids, prices)]
+    out = np.empty((len(keys), days), dtype=np.float32)
+    missing = []
+    for n, key in enumerate(keys):
+        hit = HISTORY_CACHE.get(key)
+        if hit is None:
+            missing.append(n)
+        else:
+            out[n] = hit
+
+    count("price.history_memory_hits", len(keys) - len(missing))
+    if missing:
+        # The nightly run's histories (utils/precompute.py, which imports this module).
+        from utils.precompute import precomputed_histories
+        found = precomputed_histories([ids[n] for n in missing], prices[missing], days, version)
+        still = []
+        for n, row in zip(missing, found):
+            if row is None:
+                still.append(n)
+            else:
+                out[n] = row
+                HISTORY_CACHE.put(keys[n], _frozen(row))
+        count("price.history_precomputed", len(missing) - len(still))
+        missing = still
+
+    if missing and _history_disk is not None:
+        found = _history_disk.get_many([_disk_key(keys[n]) for n in missing])
+        still = []
+        for n in missing:
+            blob = found.get(_disk_key(keys[n]))
+            if blob is None:
+                still.append(n)
+            else:
+                out[n] = np.frombuffer(blob, dtype=np.float32)
+                HISTORY_CACHE.put(keys[n], _frozen(out[n]))
+        count("price.history_disk_hits", len(missing) - len(still))
+        missing = still
+
+    if missing:
+        count("price.history_simulated", len(missing))
+        fresh, _ = build_price_histories([ids[n] for n in missing], prices[missing], days)
+        out[missing] = fresh
+        for n, row in zip(missing, fresh):
+            HISTORY_CACHE.put(keys[n], _frozen(row))
+        if _history_disk is not None:
+            _history_disk.put_many({_disk_key(keys[n]): row.tobytes() for n, row in zip(missing, fresh)})
+    return out, history_dates(days)
+
+
+def price_history(product_id, current_price: float, days: int = 60):
+    matrix, dates = price_histories([product_id], [current_price], days)
+    return pd.Series(matrix[0], index=dates)
+
+
+def history_cache_stats():
+    return {
+        "memory": HISTORY_CACHE.stats(),
+        "disk": _history_disk.stats() if _history_disk is not None else None,
+    }
+
+
+register_collector("price_history", lambda: HISTORY_CACHE.stats())
+register_collector("price_history_disk", lambda: _history_disk.stats() if _history_disk is not None else {})
+
+
+def _disk_key(key):
+    return "|".join(map(str, key))
+
+
+def _frozen(row):
+    row = row.copy()
+    row.flags.writeable = False
+    return row
+
+
+SIGNALS = ("WAIT", "CONSIDER", "BUY")
+SIGNAL_NOTES = {
+    "BUY": "Current price is at/near recent lows; good time to buy.",
+    "WAIT": "Price trend is flat or rising; likely to drop later.",
+    "CONSIDER": "Decent price; not the lowest, but reasonable.",
+}
+
 
 def buy_or_wait_signal(series, current_price: float):
     last30 = series[-30:]
@@ -32,8 +278,27 @@ def buy_or_wait_signal(series, current_price: float):
         score += 1
 
     if score >= 2:
-        return "BUY", "Current price is at/near recent lows; good time to buy."
+        return "BUY", SIGNAL_NOTES["BUY"]
     elif score <= 0:
-        return "WAIT", "Price trend is flat or rising; likely to drop later."
+        return "WAIT", SIGNAL_NOTES["WAIT"]
     else:
-        return "CONSIDER", "Decent price; not the lowest, but reasonable."
+        return "CONSIDER", SIGNAL_NOTES["CONSIDER"]
+
+
+def buy_or_wait_signals(histories, current_prices, window: int = 30):
+    """buy_or_wait_signal for every row of an N x D history matrix at once.
+
+    Returns int8 signal codes (indexes into SIGNALS) and the raw scores.
+    """
+    last = np.asarray(histories)[:, -window:]
+    current = np.asarray(current_prices, dtype=last.dtype)
+    min30 = last.min(axis=1)
+    mean30 = last.mean(axis=1)
+    slope = (last[:, -1] - last[:, 0]) / max(1, last.shape[1] - 1)
+    score = (
+        2 * (current <= min30 * 1.02)
+        + (current < mean30)
+        + np.where(slope > 0, -1, 1)
+    ).astype(np.int8)
+    codes = np.where(score >= 2, 2, np.where(score <= 0, 0, 1)).astype(np.int8)
+    return codes, score
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+from utils.catalog import derived
+from utils.index import PRICE_BANDS
+
+# How much each kind of profile match adds to a product's score. Discount
+# is scaled to 0..1, so a 50% discount adds DISCOUNT / 2.
+WEIGHTS = {
+    "brand": 3.0,
+    "store": 2.0,
+    "category": 2.0,
+    "price_band": 1.5,
+    "off_band": -1.0,
+    "discount": 2.0,
+}
+# Catalog column -> profile field listing the preferred values.
+ONE_HOT = {"brand": "brands", "store": "stores", "category": "categories"}
+
+
+class FeedScorer:
+    """Sparse product features and per-profile weights; score = X @ w.
+
+    X is kept in ELL layout: every product has the same number of stored
+    entries (one brand, store and category one-hot, one flag per price band
+    and the scaled discount), held slot-major so X @ w is a few contiguous
+    gathers. Slots that always hit the same column skip the gather.
+    """
+
+    def __init__(self, products: pd.DataFrame):
+        self.vocab = {}
+        cols, vals = [], []
+        for field in ONE_HOT:
+            codes, uniques = pd.factorize(products[field])
+            base = len(self.vocab)
+            self.vocab.update({(field, v): base + i for i, v in enumerate(uniques)})
+            cols.append(np.where(codes >= 0, base + codes, 0).astype(np.int32))
+            vals.append((codes >= 0).astype(np.float32))
+        for band, rule in PRICE_BANDS.items():
+            self.vocab[("price_band", band)] = len(self.vocab)
+            cols.append(np.full(len(products), self.vocab[("price_band", band)], dtype=np.int32))
+            vals.append(rule(products).astype(np.float32))
+        self.vocab[("discount",)] = len(self.vocab)
+        cols.append(np.full(len(products), self.vocab[("discount",)], dtype=np.int32))
+        vals.append(products["discount_pct"].to_numpy(dtype=np.float32) / 100)
+
+        self.indices = np.stack(cols)
+        self.values = np.stack(vals)
+        self.size = len(products)
+        self._shortcuts()
+
+    def _shortcuts(self):
+        self._fixed = [int(c[0]) if len(c) and (c == c[0]).all() else None for c in self.indices]
+        self._ones = [bool((v == 1).all()) for v in self.values]
+
+    def update(self, rows, products: pd.DataFrame):
+        """Recompute the features of existing `rows` after they changed in `products`."""
+        sub = products.take(rows)
+        for slot, field in enumerate(ONE_HOT):
+            values = sub[field].tolist()
+            known = ~pd.isna(sub[field]).to_numpy()
+            self.indices[slot, rows] = [self.vocab.setdefault((field, v), len(self.vocab)) if ok else 0
+                                        for v, ok in zip(values, known)]
+            self.values[slot, rows] = known
+        for slot, rule in enumerate(PRICE_BANDS.values(), start=len(ONE_HOT)):
+            self.values[slot, rows] = rule(sub)
+        self.values[-1, rows] = sub["discount_pct"].to_numpy(dtype=np.float32) / 100
+        self._shortcuts()
+
+    def weights(self, profile: dict):
+        w = np.zeros(len(self.vocab), dtype=np.float32)
+        for field, pref_field in ONE_HOT.items():
+            for value in profile.get(pref_field) or []:
+                col = self.vocab.get((field, value))
+                if col is not None:
+                    w[col] = WEIGHTS[field]
+        pref = profile.get("price_pref")
+        if pref in PRICE_BANDS:
+            for band in PRICE_BANDS:
+                w[self.vocab[("price_band", band)]] = WEIGHTS["price_band" if band == pref else "off_band"]
+        w[self.vocab[("discount",)]] = WEIGHTS["discount"]
+        return w
+
+    def scores(self, w, rows=None):
+        n = self.size if rows is None else len(rows)
+        out, term = np.zeros(n, dtype=np.float32), np.empty(n, dtype=np.float32)
+        for idx, val, fixed, ones in zip(self.indices, self.values, self._fixed, self._ones):
+            if rows is not None:
+                idx, val = idx[rows], val[rows]
+            if fixed is not None:
+                if w[fixed]:
+                    out += w[fixed] * val
+            elif ones:
+                out += np.take(w, idx, out=term)
+            else:
+                out += np.multiply(np.take(w, idx, out=term), val, out=term)
+        return out
+
+    def top_k(self, profile: dict, k: int, rows=None):
+        """The k best rows for `profile`, best first (ties in catalog order)."""
+        s = self.scores(self.weights(profile), rows)
+        rows = np.arange(self.size) if rows is None else np.asarray(rows)
+        if k < len(rows):
+            part = np.argpartition(-s, k - 1)[:k]
+            rows, s = rows[part], s[part]
+        order = np.lexsort((rows, -s))
+        return rows[order], s[order]
+
+
+def get_scorer(products: pd.DataFrame):
+    columns = list(ONE_HOT) + ["msrp", "price", "discount_pct"]
+    return derived(products, "scorer", FeedScorer, columns=columns,
+                   update=lambda scorer, rows, df: scorer.update(rows, df), share=True)
@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+
+from utils.catalog import derived
+
+SEARCH_FIELDS = ["name", "brand", "category", "store"]
+
+# Fields with more distinct values than this get a trigram index; smaller
+# ones (brand, store, category) are cheaper to scan label by label.
+TRIGRAM_MIN_LABELS = 2048
+
+# Pads the end of each label so every byte offset starts a trigram; typed
+# queries never contain it.
+_PAD = b"\x1f\x1f"
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+class _Field:
+    """Lowercased distinct labels of one column, rows per label, optional trigrams."""
+
+    def __init__(self, values: pd.Series):
+        codes, uniques = pd.factorize(values)
+        self.codes = codes.astype(np.int32)  # -1 for missing values
+        self.labels = [str(v).lower() for v in uniques]
+        self.counts = np.bincount(self.codes[self.codes >= 0], minlength=len(self.labels))
+        self.bounds = np.concatenate([[0], np.cumsum(self.counts)])
+        order = np.argsort(self.codes, kind="stable")
+        self.order = order[len(order) - int(self.bounds[-1]):]
+        self.grams = None
+        if len(self.labels) > TRIGRAM_MIN_LABELS:
+            self._build_trigrams()
+
+    def _build_trigrams(self, chunk=200_000):
+        # (trigram << 32 | label) keys, built in chunks to bound memory.
+        parts = [_trigram_keys(self.labels[i:i + chunk], i) for i in range(0, len(self.labels), chunk)]
+        keys = np.sort(np.concatenate(parts))
+        self.grams, starts = np.unique(keys >> np.uint64(32), return_index=True)
+        self.gram_bounds = np.append(starts, len(keys))
+        self.gram_labels = (keys & np.uint64(0xFFFFFFFF)).astype(np.int64)
+
+    def _posting(self, lo, hi):
+        a, b = np.searchsorted(self.grams, [lo, hi])
+        return self.gram_labels[self.gram_bounds[a]:self.gram_bounds[b]]
+
+    def matching(self, q: str):
+        """Codes of the labels containing `q` (already lowercased)."""
+        if self.grams is None:
+            return np.array([i for i, label in enumerate(self.labels) if q in label], dtype=np.int64)
+        qb = q.encode()
+        if len(qb) < 3:
+            # Every offset starts a trigram, so a short query is a trigram prefix range.
+            shift = 8 * (3 - len(qb))
+            v = int.from_bytes(qb, "big")
+            hit = np.zeros(len(self.labels), dtype=bool)
+            hit[self._posting(v << shift, (v + 1) << shift)] = True
+            return np.flatnonzero(hit)
+        grams = {int.from_bytes(qb[i:i + 3], "big") for i in range(len(qb) - 2)}
+        postings = sorted((self._posting(g, g + 1) for g in grams), key=len)
+        found = postings[0]
+        for p in postings[1:]:
+            if not len(found):
+                break
+            found = np.intersect1d(found, p, assume_unique=True)
+        if len(qb) > 3 and len(found):
+            found = np.array([i for i in found.tolist() if q in self.labels[i]], dtype=np.int64)
+        return found
+
+    def word_starts(self, codes, q: str):
+        """Subset of `codes` whose label has a word starting with `q`."""
+        return np.array([c for c in codes.tolist() if _starts_word(self.labels[c], q)], dtype=np.int64)
+
+    def rows(self, codes):
+        parts = [self.order[self.bounds[c]:self.bounds[c + 1]] for c in codes.tolist()]
+        return np.concatenate(parts) if parts else _EMPTY
+
+    def mask(self, codes):
+        hit = np.zeros(len(self.labels) + 1, dtype=bool)  # last slot catches code -1
+        hit[codes] = True
+        return hit[self.codes]
+
+
+class SearchIndex:
+    """Substring, word-prefix and ranked search over the catalog's text fields."""
+
+    def __init__(self, products: pd.DataFrame, fields=SEARCH_FIELDS):
+        self.size = len(products)
+        self.fields = [_Field(products[col]) for col in fields]
+
+    def _union(self, hits):
+        total = sum(int(f.counts[c].sum()) for f, c in hits)
+        if total * 16 < self.size:
+            return np.unique(np.concatenate([f.rows(c) for f, c in hits]))
+        mask = np.zeros(self.size, dtype=bool)
+        for f, c in hits:
+            if len(c):
+                mask |= f.mask(c)
+        return np.flatnonzero(mask)
+
+    def match(self, query: str):
+        """Sorted row ids where the query is a substring of any search field."""
+        if not query:
+            return np.arange(self.size)
+        q = query.lower()
+        return self._union([(f, f.matching(q)) for f in self.fields])
+
+    def prefix(self, query: str):
+        """Sorted row ids where a word of some search field starts with the query."""
+        if not query:
+            return np.arange(self.size)
+        q = query.lower()
+        return self._union([(f, f.word_starts(f.matching(q), q)) for f in self.fields])
+
+    def rank(self, query: str, limit=None):
+        """Row ids matching any term, best first: +1 per term found, +1 more at a word start."""
+        terms = list(dict.fromkeys(query.lower().split()))
+        if not terms:
+            return _EMPTY
+        score = np.zeros(self.size, dtype=np.int16)
+        for term in terms:
+            found, start = np.zeros(self.size, dtype=bool), np.zeros(self.size, dtype=bool)
+            for f in self.fields:
+                codes = f.matching(term)
+                if len(codes):
+                    found |= f.mask(codes)
+                    start |= f.mask(f.word_starts(codes, term))
+            score += found
+            score += start
+        rows = np.flatnonzero(score)
+        if limit is not None and limit < len(rows):
+            rows = rows[np.argpartition(-score[rows], limit - 1)[:limit]]
+        return rows[np.lexsort((rows, -score[rows]))]
+
+
+def _trigram_keys(labels, first):
+    encoded = [label.encode() + _PAD for label in labels]
+    lens = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    buf = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint32)
+    grams = (buf[:-2] << 16) | (buf[1:-1] << 8) | buf[2:]
+    owner = np.repeat(np.arange(first, first + len(labels), dtype=np.uint32), lens)[:-2]
+    valid = np.ones(len(grams), dtype=bool)
+    ends = np.cumsum(lens)[:-1]
+    valid[ends - 2] = valid[ends - 1] = False
+    keys = np.sort((grams[valid].astype(np.uint64) << np.uint64(32)) | owner[valid])
+    return keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+
+
+def _starts_word(label: str, term: str):
+    return label.startswith(term) or f" {term}" in label
+
+
+def get_search_index(products: pd.DataFrame):
+    return derived(products, "search", SearchIndex, columns=SEARCH_FIELDS, share=True)
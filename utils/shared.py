@@ -0,0 +1,167 @@
+"""Derived catalog structures built once and shared by every worker process (WISHDROP_SHARED=1).
+
+    WISHDROP_SHARED=1 python -m utils.shared
+"""
+import argparse
+import fcntl
+import mmap
+import os
+import pickle
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from utils.metrics import count, span
+
+SHARED = os.environ.get("WISHDROP_SHARED", "0") == "1"
+# Arrays under a page stay inside the pickle; copying them costs less than mapping.
+MIN_SHARED_BYTES = 1 << 12
+ALIGN = 64
+
+
+def _snapshot(root, name, layout, version):
+    base = f"{name}.{layout}.{version}"
+    return root / f"{base}.pkl", root / f"{base}.bin"
+
+
+def _published(root, name, layout):
+    """Catalog versions with a complete snapshot of `name` for this layout, newest first."""
+    versions = []
+    for pkl in root.glob(f"{name}.{layout}.*.pkl"):
+        tail = pkl.name[len(f"{name}.{layout}."):-len(".pkl")]
+        if tail.isdigit():
+            versions.append(int(tail))
+    return sorted(versions, reverse=True)
+
+
+@contextmanager
+def _locked(path):
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# ---- Snapshot files ----
+def dump(value, pkl, data):
+    """Pickle `value` to `pkl` with its large arrays laid out in `data`, each renamed into place."""
+    pkl, data = Path(pkl), Path(data)
+    fd, tmp_data = tempfile.mkstemp(prefix=f".{data.name}.", dir=data.parent)
+    fd_pkl, tmp_pkl = tempfile.mkstemp(prefix=f".{pkl.name}.", dir=pkl.parent)
+    try:
+        with os.fdopen(fd, "wb") as out, os.fdopen(fd_pkl, "wb") as state:
+
+            class Pickler(pickle.Pickler):
+                def persistent_id(self, obj):
+                    if type(obj) is not np.ndarray or obj.dtype.hasobject or obj.nbytes < MIN_SHARED_BYTES:
+                        return None
+                    offset = -out.tell() % ALIGN + out.tell()
+                    out.seek(offset)
+                    out.write(np.ascontiguousarray(obj).data)
+                    return ("array", offset, obj.dtype.str, obj.shape)
+
+            Pickler(state, protocol=pickle.HIGHEST_PROTOCOL).dump(value)
+        # The pickle goes last: readers take its presence to mean the pair is complete.
+        os.replace(tmp_data, data)
+        os.replace(tmp_pkl, pkl)
+    except BaseException:
+        for tmp in (tmp_data, tmp_pkl):
+            Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def load(pkl, data):
+    """The value saved by dump(), its large arrays mapped copy-on-write from `data`."""
+    with open(data, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY) if os.fstat(f.fileno()).st_size else None
+
+    class Unpickler(pickle.Unpickler):
+        def persistent_load(self, pid):
+            _, offset, dtype, shape = pid
+            dtype = np.dtype(dtype)
+            return np.frombuffer(buf, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+
+    with open(pkl, "rb") as f:
+        return Unpickler(f).load()
+
+
+# ---- Publish / attach ----
+def attach_or_build(state, name: str, version: int, build):
+    """(value, catalog version it reflects) from the newest published snapshot, or built and published."""
+    root = state.path / "derived"
+    try:
+        root.mkdir(exist_ok=True)
+    except OSError:
+        return build(), version  # read-only store: keep it in this process
+    with _locked(root / f".{name}.lock"):
+        latest = _published(root, name, state.layout)
+        older = [v for v in latest if v <= version]
+        if older:
+            with span(f"shared.attach.{name}"):
+                value = load(*_snapshot(root, name, state.layout, older[0]))
+            count("shared.attached")
+            return value, older[0]
+        value = build()
+        if not latest:  # a newer snapshot stays for the processes that have caught up to it
+            _publish(root, name, state.layout, version, value)
+        return value, version
+
+
+def publish(state, name: str, version: int, value):
+    """Replace the published snapshot of `name` if `version` is newer than it (after a rebuild)."""
+    root = state.path / "derived"
+    try:
+        root.mkdir(exist_ok=True)
+        with _locked(root / f".{name}.lock"):
+            latest = _published(root, name, state.layout)
+            if not latest or latest[0] < version:
+                _publish(root, name, state.layout, version, value)
+    except OSError:
+        pass
+
+
+def _publish(root, name, layout, version, value):
+    with span(f"shared.publish.{name}"):
+        try:
+            dump(value, *_snapshot(root, name, layout, version))
+        except OSError:
+            return
+    count("shared.published")
+    # Drop superseded snapshots; processes that mapped them keep their pages.
+    keep = {p.name for p in _snapshot(root, name, layout, version)}
+    for old in list(root.glob(f"{name}.*.pkl")) + list(root.glob(f"{name}.*.bin")):
+        if old.name not in keep and old.name[len(name) + 1:].split(".", 1)[0].isdigit():
+            old.unlink(missing_ok=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Build and publish the shared catalog structures for all workers.")
+    ap.add_argument("--products", help="catalog source (CSV/Parquet) or store directory; default WISHDROP_PRODUCTS")
+    args = ap.parse_args(argv)
+
+    # Imported here: they import utils.catalog, which imports this module
+    # (as utils.shared, not the __main__ copy `python -m` runs).
+    from utils import shared
+    from utils.catalog import PRODUCTS_CSV, catalog_version, load_products
+    from utils.facets import get_facets
+    from utils.index import get_index
+    from utils.rank import get_scorer
+    from utils.search import get_search_index
+    from utils.similar import get_similar
+
+    shared.SHARED = True
+    products = load_products(args.products or PRODUCTS_CSV)
+    print(f"{len(products):,} products, catalog version {catalog_version(products)}")
+    for get in (get_index, get_scorer, get_search_index, get_facets, get_similar):
+        t0 = time.perf_counter()
+        get(products)
+        print(f"  {get.__name__}: {time.perf_counter() - t0:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
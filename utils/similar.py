@@ -0,0 +1,140 @@
+"""Similar products ("More like this") from a nearest-neighbour index over the catalog."""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from utils.catalog import catalog_alive, derived
+
+DIM = 64
+PROBES = 8
+# How much each part counts towards the vector, before normalising.
+WEIGHTS = {"brand": 1.0, "category": 1.0, "store": 0.5, "name": 0.8, "price": 0.6}
+PRICE_STEP = np.log(1.5)  # adjacent price bands differ by half the price
+CHUNK = 1 << 18
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+class SimilarIndex:
+    """Quantised product vectors in inverted lists around k-means centroids."""
+
+    def __init__(self, products: pd.DataFrame, lists: int = None, seed: int = 0):
+        n = len(products)
+        self.size = n
+        self._tokens = {}
+        self.vectors = np.empty((n, DIM), dtype=np.int8)
+        for lo in range(0, n, CHUNK):
+            self.vectors[lo:lo + CHUNK] = self._embed(products.iloc[lo:lo + CHUNK])
+        alive = catalog_alive(products)
+        self.alive = np.ones(n, dtype=bool) if alive is None else np.array(alive, dtype=bool)
+
+        lists = lists or int(np.clip(np.sqrt(n) / 2, 1, 4096))
+        self.centroids = self._kmeans(min(lists, max(n, 1)), np.random.default_rng(seed))
+        self.keys = np.empty(n, dtype=np.int32)  # list of each row
+        for lo in range(0, n, CHUNK):
+            self.keys[lo:lo + CHUNK] = self._nearest(self.vectors[lo:lo + CHUNK])
+        order = np.argsort(self.keys, kind="stable")
+        bounds = np.searchsorted(self.keys[order], np.arange(len(self.centroids) + 1))
+        self.postings = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+
+    # ---- Embedding ----
+    def _token(self, kind, value):
+        """Fixed pseudo-random unit vector for one label or word."""
+        key = (kind, value)
+        vec = self._tokens.get(key)
+        if vec is None:
+            seed = int.from_bytes(hashlib.blake2b(f"{kind}:{value}".encode(), digest_size=8).digest(), "little")
+            vec = np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+            vec /= np.linalg.norm(vec)
+            self._tokens[key] = vec
+        return vec
+
+    def _table(self, kind, labels, vector):
+        # One row per label plus a zero row that code -1 (missing) picks up.
+        return np.vstack([vector(kind, v) for v in labels] + [np.zeros(DIM, np.float32)])
+
+    def _name(self, kind, name):
+        words = sorted(set(str(name).lower().split()))
+        if not words:
+            return np.zeros(DIM, np.float32)
+        return sum(self._token(kind, w) for w in words) / np.float32(np.sqrt(len(words)))
+
+    def _band(self, kind, band):
+        vec = self._token(kind, band) + 0.5 * (self._token(kind, band - 1) + self._token(kind, band + 1))
+        return vec / np.linalg.norm(vec)
+
+    def _embed(self, df: pd.DataFrame):
+        """int8 unit vectors (scaled by 127) for the rows of `df`."""
+        out = np.zeros((len(df), DIM), dtype=np.float32)
+        for col in ("brand", "store", "category"):
+            codes, labels = pd.factorize(df[col])
+            out += WEIGHTS[col] * self._table(col, [str(v) for v in labels], self._token)[codes]
+        codes, labels = pd.factorize(df["name"])
+        out += WEIGHTS["name"] * self._table("word", labels, self._name)[codes]
+        price = np.maximum(df["price"].to_numpy(dtype=np.float64), 1.0)
+        codes, labels = pd.factorize(np.floor(np.log(price) / PRICE_STEP).astype(np.int64))
+        out += WEIGHTS["price"] * self._table("price", labels.tolist(), self._band)[codes]
+        out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-6)
+        return np.rint(out * 127).astype(np.int8)
+
+    # ---- Inverted lists ----
+    def _kmeans(self, k, rng, iterations=10):
+        sample = self.vectors[np.sort(rng.choice(self.size, min(self.size, 40 * k), replace=False))]
+        sample = sample.astype(np.float32) / 127
+        centroids = sample[rng.choice(len(sample), k, replace=False)]
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-6), centroids)  # empty lists keep theirs
+        return centroids.astype(np.float32)
+
+    def _nearest(self, vectors):
+        return np.argmax(vectors.astype(np.float32) @ self.centroids.T, axis=1).astype(np.int32)
+
+    # ---- Query ----
+    def similar(self, row: int, k: int = 8, probes: int = PROBES):
+        """The `k` live rows most like `row`, best first, and their cosine similarity."""
+        q = self.vectors[row].astype(np.float32) / 127
+        nearest = np.argsort(-(self.centroids @ q), kind="stable")[:probes]
+        cands = np.concatenate([self.postings[c] for c in nearest.tolist()] or [_EMPTY])
+        cands = cands[self.alive[cands] & (cands != row)]
+        scores = self.vectors[cands].astype(np.float32) @ q / 127
+        if k < len(cands):
+            part = np.argpartition(-scores, k - 1)[:k]
+            cands, scores = cands[part], scores[part]
+        order = np.lexsort((cands, -scores))
+        return cands[order], scores[order]
+
+    # ---- Incremental maintenance ----
+    def update(self, rows, products: pd.DataFrame):
+        """Re-embed `rows` (positions; positions >= size are appended) from `products`."""
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        grow = int(rows.max()) + 1 - self.size if len(rows) else 0
+        if grow > 0:
+            self.size += grow
+            self.vectors = np.concatenate([self.vectors, np.zeros((grow, DIM), np.int8)])
+            self.keys = np.concatenate([self.keys, np.full(grow, -1, np.int32)])
+            self.alive = np.concatenate([self.alive, np.zeros(grow, dtype=bool)])
+        alive = catalog_alive(products)
+        self.alive[rows] = True if alive is None else alive[rows]
+        self.vectors[rows] = self._embed(products.take(rows))
+        new = np.where(self.alive[rows], self._nearest(self.vectors[rows]), -1).astype(np.int32)
+        old = self.keys[rows]
+        changed = old != new
+        rows, old, new = rows[changed], old[changed], new[changed]
+        # Postings and `rows` are sorted: splice by position instead of re-sorting.
+        for c in np.unique(old[old >= 0]):
+            self.postings[c] = np.delete(self.postings[c], np.searchsorted(self.postings[c], rows[old == c]))
+        for c in np.unique(new[new >= 0]):
+            moved = rows[new == c]
+            self.postings[c] = np.insert(self.postings[c], np.searchsorted(self.postings[c], moved), moved)
+        self.keys[rows] = new
+
+
+def get_similar(products: pd.DataFrame):
+    """The shared SimilarIndex for this catalog."""
+    return derived(products, "similar", SimilarIndex, columns=["name", "brand", "store", "category", "price", "alive"],
+                   update=lambda index, rows, p: index.update(rows, p), share=True)
@@ -1,10 +1,26 @@
-
+import argparse
+import atexit
+import contextlib
+import copy
 import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
 from pathlib import Path
 
+from utils.metrics import count, register_collector, timed
+
 DATA_DIR = Path(__file__).resolve().parents[1] / "data"
 PROFILES = DATA_DIR / "profiles.json"
 BOARDS = DATA_DIR / "boards.json"
+DATABASE = DATA_DIR / "wishdrop.db"
+
+TABLES = {"profiles": PROFILES, "boards": BOARDS}
+
+# Board edits, each replayed onto {"saved": [...], "tracked": {id: threshold}}.
+BOARD_OPS = ("save", "unsave", "track", "untrack")
 
 def _read(path):
     if not path.exists():
@@ -16,33 +32,567 @@ def _read(path):
             return {}
 
 def _write(path, data):
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
+    # Write a sibling temp file and rename it over, so readers never see half a file.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+def apply_board_ops(board, ops):
+    """`board` (or an empty one) with (op, product_id, value) edits replayed in order."""
+    board = dict(board or {})
+    saved = dict.fromkeys(board.get("saved", []))
+    tracked = dict(board.get("tracked", {}))
+    for op, item, value in ops:
+        if op == "save":
+            saved[item] = None
+        elif op == "unsave":
+            saved.pop(item, None)
+        elif op == "track":
+            tracked[item] = value
+        elif op == "untrack":
+            tracked.pop(item, None)
+    board["saved"], board["tracked"] = list(saved), tracked
+    return board
+
+# ---- Backends ----
+class JsonBackend:
+    """The original layout: one JSON file per table, rewritten on every change."""
+
+    def __init__(self, paths=None):
+        self.paths = {t: Path(p) for t, p in (paths or TABLES).items()}
+        self._lock = threading.Lock()
+
+    def keys(self, table):
+        return list(_read(self.paths[table]).keys())
+
+    def get(self, table, key):
+        return _read(self.paths[table]).get(key)
+
+    def items(self, table):
+        return _read(self.paths[table])
+
+    def put(self, table, key, value):
+        with self._lock:
+            data = _read(self.paths[table])
+            data[key] = value
+            _write(self.paths[table], data)
+
+    def delete(self, table, key):
+        with self._lock:
+            data = _read(self.paths[table])
+            if key in data:
+                data.pop(key)
+                _write(self.paths[table], data)
+
+    def version(self, table):
+        try:
+            st = self.paths[table].stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+class SqliteBackend:
+    """One row per key in SQLite (WAL): per-key upserts, atomic, safe across processes."""
+
+    def __init__(self, path=DATABASE):
+        self.path = Path(path)
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        # Connections are per thread and must not cross a fork.
+        if conn is None or self._local.pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS board_ops (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "board TEXT NOT NULL, op TEXT NOT NULL, item TEXT NOT NULL, value TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS board_ops_board ON board_ops (board, seq)")
+            for table in TABLES:
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+                conn.execute("INSERT OR IGNORE INTO versions VALUES (?, 0)", (table,))
+                # Every committed change bumps the table's version, whichever process made it.
+                for event in ("INSERT", "UPDATE", "DELETE"):
+                    conn.execute(
+                        f"CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_version AFTER {event} ON {table} "
+                        f"BEGIN UPDATE versions SET version = version + 1 WHERE name = '{table}'; END"
+                    )
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def keys(self, table):
+        return [k for (k,) in self._conn().execute(f"SELECT key FROM {table} ORDER BY rowid")]
+
+    def get(self, table, key):
+        row = self._conn().execute(f"SELECT value FROM {table} WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def items(self, table):
+        rows = self._conn().execute(f"SELECT key, value FROM {table} ORDER BY rowid")
+        return {k: json.loads(v) for k, v in rows}
+
+    def put(self, table, key, value):
+        self._conn().execute(
+            f"INSERT INTO {table} (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, json.dumps(value)),
+        )
+
+    def put_many(self, table, items):
+        with self._transaction() as conn:
+            conn.executemany(
+                f"INSERT INTO {table} (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                [(k, json.dumps(v)) for k, v in items.items()],
+            )
+
+    def delete(self, table, key):
+        self._conn().execute(f"DELETE FROM {table} WHERE key = ?", (key,))
+
+    @contextlib.contextmanager
+    def _transaction(self, mode="IMMEDIATE"):
+        conn = self._conn()
+        conn.execute(f"BEGIN {mode}")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ---- Board op log ----
+    def append_ops(self, ops):
+        """Append (board, op, product_id, value) edits to the log in one transaction."""
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO board_ops (board, op, item, value) VALUES (?, ?, ?, ?)",
+                [(b, op, item, json.dumps(v)) for b, op, item, v in ops],
+            )
+
+    def board_and_ops(self, key):
+        """A board's snapshot and its logged, not yet compacted edits, read together."""
+        with self._transaction("DEFERRED") as conn:
+            row = conn.execute("SELECT value FROM boards WHERE key = ?", (key,)).fetchone()
+            ops = conn.execute("SELECT op, item, value FROM board_ops WHERE board = ? ORDER BY seq", (key,)).fetchall()
+        return (json.loads(row[0]) if row else None), [(op, item, json.loads(v)) for op, item, v in ops]
+
+    def compact_ops(self, limit=10_000):
+        """Fold the oldest `limit` logged edits into their board snapshots; returns how many."""
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT seq, board, op, item, value FROM board_ops ORDER BY seq LIMIT ?", (limit,)
+            ).fetchall()
+            if not rows:
+                return 0
+            edits = {}
+            for _, board, op, item, value in rows:
+                edits.setdefault(board, []).append((op, item, json.loads(value)))
+            names = list(edits)
+            snapshots = {}
+            for lo in range(0, len(names), 500):
+                chunk = names[lo:lo + 500]
+                snapshots.update(conn.execute(
+                    f"SELECT key, value FROM boards WHERE key IN ({','.join('?' * len(chunk))})", chunk))
+            conn.executemany(
+                "INSERT INTO boards (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                [(name, json.dumps(apply_board_ops(json.loads(snapshots[name]) if name in snapshots else None, ops)))
+                 for name, ops in edits.items()],
+            )
+            conn.execute("DELETE FROM board_ops WHERE seq <= ?", (rows[-1][0],))
+        return len(rows)
+
+    def pending_ops(self):
+        return self._conn().execute("SELECT COUNT(*) FROM board_ops").fetchone()[0]
+
+    def replace_board(self, key, board):
+        """Overwrite a board snapshot and drop the edits logged before it."""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO boards (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, json.dumps(board)),
+            )
+            conn.execute("DELETE FROM board_ops WHERE board = ?", (key,))
+
+    def version(self, table):
+        return self._conn().execute("SELECT version FROM versions WHERE name = ?", (table,)).fetchone()[0]
+
+    # ---- JSON import marker ----
+    def migrated(self):
+        """True once the JSON files were imported, or the tables were ever written to."""
+        conn = self._conn()
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+            return True
+        # Databases from before the marker: any write at all means they are in use.
+        return conn.execute("SELECT COALESCE(SUM(version), 0) FROM versions").fetchone()[0] > 0
+
+    def mark_migrated(self):
+        self._conn().execute("PRAGMA user_version = 1")
+
+class CachedBackend:
+    """Read-through cache over another backend.
+
+    Each table is held parsed in memory and re-read only when the backend's
+    version token for it changes (a counter bumped by SQLite triggers, or the
+    JSON file's inode/mtime/size). Writes go through and patch the cache.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        self._tables = {}  # table -> (version, {key: value})
+        self._keys = {}  # table -> (dict it was built from, [keys])
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _table(self, table):
+        version = self.inner.version(table)
+        with self._lock:
+            cached = self._tables.get(table)
+            if cached is not None and cached[0] == version:
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        data = self.inner.items(table)
+        with self._lock:
+            self._tables[table] = (version, data)
+        return data
+
+    def keys(self, table):
+        data = self._table(table)
+        with self._lock:
+            names = self._keys.get(table)
+            if names is None or names[0] is not data:
+                names = self._keys[table] = (data, list(data))
+            return names[1].copy()
+
+    def get(self, table, key):
+        data = self._table(table)
+        with self._lock:
+            return copy.deepcopy(data.get(key))
+
+    def items(self, table):
+        data = self._table(table)
+        with self._lock:
+            return copy.deepcopy(data)
+
+    def put(self, table, key, value):
+        self._write(table, key, lambda: self.inner.put(table, key, value), copy.deepcopy(value))
+
+    def delete(self, table, key):
+        self._write(table, key, lambda: self.inner.delete(table, key), None)
+
+    def _write(self, table, key, write, value):
+        before = self.inner.version(table)
+        write()
+        after = self.inner.version(table)
+        with self._lock:
+            cached = self._tables.get(table)
+            # Patch in place only if nobody else changed the table around our write.
+            if cached is None or cached[0] != before or (isinstance(after, int) and after > before + 1):
+                self._tables.pop(table, None)
+                return
+            data = cached[1]
+            if value is None:
+                data.pop(key, None)
+            else:
+                data[key] = value
+            self._keys.pop(table, None)
+            self._tables[table] = (after, data)
+
+    def version(self, table):
+        return self.inner.version(table)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+def migrate_json(backend, paths=None):
+    """Copy profiles/boards from the JSON files into `backend`; returns rows copied per table."""
+    copied = {}
+    for table, path in (paths or TABLES).items():
+        data = _read(Path(path))
+        if hasattr(backend, "put_many"):
+            backend.put_many(table, data)
+        else:
+            for key, value in data.items():
+                backend.put(table, key, value)
+        copied[table] = len(data)
+    return copied
+
+def open_backend(kind=None, path=None, cached=None):
+    """Backend named by WISHDROP_STORAGE ("sqlite", the default, or "json").
+
+    Wrapped in CachedBackend unless WISHDROP_STORAGE_CACHE=0.
+    """
+    kind = kind or os.environ.get("WISHDROP_STORAGE", "sqlite")
+    if cached is None:
+        cached = os.environ.get("WISHDROP_STORAGE_CACHE", "1") != "0"
+    if kind == "json":
+        engine = JsonBackend()
+    elif kind == "sqlite":
+        engine = SqliteBackend(path or os.environ.get("WISHDROP_DB", DATABASE))
+        if not engine.migrated():
+            # First start on an existing install: bring the JSON data along, once.
+            # Emptying the tables later must not bring it back.
+            migrate_json(engine)
+            engine.mark_migrated()
+    else:
+        raise ValueError(f"Unknown storage backend: {kind!r}")
+    return CachedBackend(engine) if cached else engine
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = open_backend()
+    return _backend
+
+def use_backend(engine):
+    global _backend, _journal
+    with _backend_lock:
+        if _journal is not None:
+            _journal.close()
+        _backend, _journal = engine, None
+
+def cache_stats():
+    engine = backend()
+    return engine.stats() if isinstance(engine, CachedBackend) else None
+
+register_collector("storage", lambda: _backend.stats() if isinstance(_backend, CachedBackend) else {})
+
+# ---- Board journal ----
+# Board edits are buffered per process and written behind: env
+#   WISHDROP_BOARD_FLUSH_MS (default 200), WISHDROP_BOARD_FLUSH_OPS (500),
+#   WISHDROP_BOARD_COMPACT_S (5)
+class BoardJournal:
+    """Write-behind log of board edits.
+
+    record() only appends to an in-memory buffer. A background thread
+    appends the buffer to the SQLite op log in one transaction every
+    `flush_interval` seconds (sooner once `flush_size` edits are waiting) and
+    folds logged edits into the board snapshots every `compact_interval`.
+    A board is read as its snapshot with the logged and buffered edits
+    replayed, so an edit shows up at once and is durable after the next
+    flush. Backends without an op log (JSON) get the buffered edits folded
+    straight into the snapshots at each flush.
+    """
+
+    def __init__(self, engine, flush_interval=0.2, flush_size=500, compact_interval=5.0):
+        inner = getattr(engine, "inner", engine)
+        # With an op log, board reads skip the read-through cache: a keyed
+        # lookup is cheap, and every compaction would otherwise make each
+        # process reload the whole boards table.
+        self.log = inner if hasattr(inner, "append_ops") else None
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.compact_interval = compact_interval
+        self._buffer = []  # (board, op, product_id, value)
+        self._flushing = []  # the batch being written, still visible to readers
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+        self._pid = None
+        self._compacted_at = time.monotonic()
+        self.recorded = self.flushed = self.flushes = self.compacted = self.errors = 0
+
+    def record(self, board, op, product_id, value=None):
+        if op not in BOARD_OPS:
+            raise ValueError(f"Unknown board op: {op!r}")
+        with self._lock:
+            self._buffer.append((board, op, str(product_id), value))
+            self.recorded += 1
+            full = len(self._buffer) >= self.flush_size
+        self._start()
+        if full:
+            self._wake.set()
+
+    def board(self, name):
+        with self._lock:
+            buffered = [(op, item, value) for b, op, item, value in self._flushing + self._buffer if b == name]
+        # Taken before the log is read: an edit committed in between is
+        # replayed twice, which is harmless since each edit sets one item's state.
+        if self.log is not None:
+            snapshot, logged = self.log.board_and_ops(name)
+        else:
+            snapshot, logged = self.engine.get("boards", name), []
+        if not logged and not buffered:
+            return snapshot or {"saved": [], "tracked": {}}
+        return apply_board_ops(snapshot, logged + buffered)
+
+    def replace(self, name, board):
+        """Overwrite a whole board; its earlier edits are dropped."""
+        with self._flush_lock:
+            with self._lock:
+                self._buffer = [e for e in self._buffer if e[0] != name]
+            if self.log is not None:
+                self.log.replace_board(name, board)
+            else:
+                self.engine.put("boards", name, board)
+
+    def flush(self):
+        """Write out the buffered edits; returns how many."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+                self._flushing = batch
+            if not batch:
+                return 0
+            try:
+                if self.log is not None:
+                    self.log.append_ops(batch)
+                else:
+                    edits = {}
+                    for board, op, item, value in batch:
+                        edits.setdefault(board, []).append((op, item, value))
+                    for board, ops in edits.items():
+                        self.engine.put("boards", board, apply_board_ops(self.engine.get("boards", board), ops))
+            except BaseException:
+                with self._lock:
+                    self._buffer = batch + self._buffer
+                raise
+            finally:
+                with self._lock:
+                    self._flushing = []
+            self.flushed += len(batch)
+            self.flushes += 1
+            count("storage.board_ops_flushed", len(batch))
+            return len(batch)
+
+    def compact(self):
+        """Fold logged edits into the board snapshots; returns how many."""
+        self._compacted_at = time.monotonic()
+        done = compact_board_ops(self.engine)
+        self.compacted += done
+        count("storage.board_ops_compacted", done)
+        return done
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+    def _start(self):
+        # Threads do not survive a fork: each process starts its own writer.
+        if self._pid == os.getpid() or self._closed:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="board-journal", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                if time.monotonic() - self._compacted_at >= self.compact_interval:
+                    self.compact()
+            except Exception:
+                # The batch went back into the buffer; retry on the next tick.
+                self.errors += 1
+                count("storage.board_ops_errors")
+
+    def stats(self):
+        with self._lock:
+            buffered = len(self._buffer)
+        return {
+            "recorded": self.recorded, "buffered": buffered, "flushed": self.flushed,
+            "flushes": self.flushes, "compacted": self.compacted, "errors": self.errors,
+            "logged": self.log.pending_ops() if self.log is not None else 0,
+        }
+
+_journal = None
+
+def board_journal():
+    global _journal
+    if _journal is None:
+        engine = backend()
+        with _backend_lock:
+            if _journal is None:
+                _journal = BoardJournal(
+                    engine,
+                    flush_interval=float(os.environ.get("WISHDROP_BOARD_FLUSH_MS", 200)) / 1000,
+                    flush_size=int(os.environ.get("WISHDROP_BOARD_FLUSH_OPS", 500)),
+                    compact_interval=float(os.environ.get("WISHDROP_BOARD_COMPACT_S", 5)),
+                )
+    return _journal
+
+def flush_boards():
+    """Write out buffered board edits and fold the op log into the snapshots."""
+    journal = _journal
+    if journal is not None:
+        journal.flush()
+        journal.compact()
+
+def compact_board_ops(engine, batch=10_000):
+    """Fold `engine`'s logged board edits into its snapshots (no-op without an op log)."""
+    compact = getattr(getattr(engine, "inner", engine), "compact_ops", None)
+    done = 0
+    while compact is not None:
+        n = compact(batch)
+        done += n
+        if n < batch:
+            break
+    return done
+
+atexit.register(lambda: _journal is not None and _journal.flush())
+register_collector("board_journal", lambda: _journal.stats() if _journal is not None else {})
 
 # ---- Profiles ----
+@timed("storage.list_profiles")
 def list_profiles():
-    return list(_read(PROFILES).keys())
+    return backend().keys("profiles")
 
+@timed("storage.get_profile")
 def get_profile(name: str):
-    return _read(PROFILES).get(name)
+    return backend().get("profiles", name)
 
+@timed("storage.save_profile")
 def save_profile(name: str, profile: dict):
-    data = _read(PROFILES)
-    data[name] = profile
-    _write(PROFILES, data)
+    backend().put("profiles", name, profile)
 
+@timed("storage.delete_profile")
 def delete_profile(name: str):
-    data = _read(PROFILES)
-    if name in data:
-        data.pop(name)
-        _write(PROFILES, data)
+    backend().delete("profiles", name)
 
 # ---- Boards / Tracking ----
+@timed("storage.get_board")
 def get_board(name: str):
-    return _read(BOARDS).get(name, {"saved": [], "tracked": {}})
+    return board_journal().board(name)
 
+@timed("storage.save_board")
 def save_board(name: str, board: dict):
-    data = _read(BOARDS)
-    data[name] = board
-    _write(BOARDS, data)
+    board_journal().replace(name, board)
+
+def record_board_op(name: str, op: str, product_id, value=None):
+    """Queue one board edit (see BOARD_OPS); it is written behind in batches."""
+    board_journal().record(name, op, product_id, value)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Copy profiles.json/boards.json into the SQLite store.")
+    ap.add_argument("command", choices=["migrate"])
+    ap.add_argument("--db", default=os.environ.get("WISHDROP_DB", DATABASE))
+    ap.add_argument("--profiles", default=PROFILES)
+    ap.add_argument("--boards", default=BOARDS)
+    args = ap.parse_args()
+    engine = SqliteBackend(args.db)
+    counts = migrate_json(engine, {"profiles": args.profiles, "boards": args.boards})
+    engine.mark_migrated()
+    print(f"Migrated {counts['profiles']} profiles and {counts['boards']} boards into {args.db}")
@@ -0,0 +1,326 @@
+"""Observed prices, one snapshot per day, in an append-only store.
+
+    python -m utils.timeseries snapshot        # record today's catalog prices (run daily)
+    python -m utils.timeseries stats
+
+Layout (WISHDROP_PRICE_STORE, default data/.prices/):
+    manifest.json       covered days and the chunk list
+    ids.npy             product id per slot; slots are only ever appended
+    order.npy           argsort of ids, for id -> slot lookups
+    first.npy           day each slot was first observed (int32 days since epoch)
+    head.npy            latest price per slot (float32, NaN if never observed)
+    chunk-<k>.base.npy  every slot's price on the chunk's first day
+    chunk-<k>.slots     for each later day, the slots whose price changed (int32) ...
+    chunk-<k>.prices    ... and their new prices (float32); the manifest holds each day's span
+
+Files are only ever appended to or replaced, never truncated, so readers
+that still map an older manifest keep valid pages.
+
+Prices move on a few percent of products a day, so a chunk is one dense row
+plus short per-day change lists. A product missing from a snapshot keeps
+its last price; days before its first snapshot read as NaN.
+"""
+import argparse
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.catalog import DATA_DIR, PRODUCTS_CSV, catalog_alive, load_products, save_atomic
+from utils.metrics import register_collector, timed
+
+PRICE_STORE = Path(os.environ.get("WISHDROP_PRICE_STORE", DATA_DIR / ".prices"))
+# Days per chunk: a read replays at most this many change lists.
+CHUNK_DAYS = 32
+_NEVER = np.iinfo(np.int32).max
+
+
+def day_number(day=None):
+    """Days since 1970-01-01 for a date / ISO string (today by default)."""
+    return int(np.datetime64(day or date.today(), "D").astype(np.int64))
+
+
+class PriceStore:
+    """Reader and writer for one store directory; safe to share across threads."""
+
+    def __init__(self, path=PRICE_STORE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._state = None  # (manifest, ids, order, first, {chunk file: (base, slots, prices)})
+
+    # ---- Reading ----
+    def _current(self):
+        """Manifest and mapped files, reloaded when a writer has published a new day."""
+        try:
+            st = (self.path / "manifest.json").stat()
+        except FileNotFoundError:
+            return None
+        stamp = (st.st_ino, st.st_mtime_ns)
+        with self._lock:
+            if stamp != self._stamp:
+                manifest = json.loads((self.path / "manifest.json").read_text(encoding="utf-8"))
+                maps = {c["file"]: self._map_chunk(c) for c in manifest["chunks"]}
+                self._state = (
+                    manifest,
+                    _mapped(self.path / "ids.npy"),
+                    _mapped(self.path / "order.npy"),
+                    _mapped(self.path / "first.npy"),
+                    maps,
+                )
+                self._stamp = stamp
+            return self._state
+
+    def _map_chunk(self, spec):
+        n = max(end for _, end in spec["spans"])
+        base = _mapped(self.path / f"{spec['file']}.base.npy")
+        if not n:
+            return base, np.empty(0, np.int32), np.empty(0, np.float32)
+        return (base,
+                np.memmap(self.path / f"{spec['file']}.slots", np.int32, "r", shape=(n,)).view(np.ndarray),
+                np.memmap(self.path / f"{spec['file']}.prices", np.float32, "r", shape=(n,)).view(np.ndarray))
+
+    def version(self):
+        """Changes whenever a snapshot is recorded (0 for an empty store)."""
+        state = self._current()
+        return state[0]["version"] if state is not None else 0
+
+    def slots(self, ids):
+        """Store slot of each product id, -1 where it was never recorded."""
+        state = self._current()
+        if state is None:
+            return np.full(len(ids), -1, dtype=np.int64)
+        return _slots(state[1], state[2], np.asarray(ids, dtype=str))
+
+    @timed("timeseries.read")
+    def read(self, ids, days: int = 60, end=None):
+        """Observed prices for `ids` over the `days` days ending at `end` (today): N x days float32, NaN where unknown."""
+        out = np.full((len(ids), days), np.nan, dtype=np.float32)
+        state = self._current()
+        if state is None or not len(ids):
+            return out
+        manifest, ids_arr, order, first, maps = state
+        slots = _slots(ids_arr, order, np.asarray(ids, dtype=str))
+        known = np.flatnonzero(slots >= 0)
+        if not len(known):
+            return out
+        slots, expand = np.unique(slots[known], return_inverse=True)
+        wanted = day_number(end) - days + 1 + np.arange(days)
+
+        # Each wanted day reads the last stored day at or before it.
+        chunks = manifest["chunks"]
+        starts = np.array([c["start"] for c in chunks])
+        chunk_of = np.searchsorted(starts, wanted, side="right") - 1
+        block = np.full((len(slots), days), np.nan, dtype=np.float32)
+        for k in np.unique(chunk_of[chunk_of >= 0]):
+            spec = chunks[k]
+            base, changed_slots, changed_prices = maps[spec["file"]]
+            cols = np.flatnonzero(chunk_of == k)
+            rows = np.minimum(wanted[cols] - spec["start"], spec["days"] - 1)
+            price = np.where(slots < len(base), base[np.minimum(slots, len(base) - 1)], np.nan)
+            # Many products: map each change to its output row instead of searching every change list.
+            position = None
+            if len(slots) * 16 > len(base):
+                position = np.full(len(base), -1, dtype=np.int64)
+                position[slots[slots < len(base)]] = np.flatnonzero(slots < len(base))
+            for row in range(rows.max() + 1):
+                lo, hi = spec["spans"][row]
+                if hi > lo:
+                    day_slots, day_prices = changed_slots[lo:hi], changed_prices[lo:hi]
+                    if position is not None:
+                        at = position[day_slots]
+                        price[at[at >= 0]] = day_prices[at >= 0]
+                    else:
+                        at = np.minimum(np.searchsorted(day_slots, slots), len(day_slots) - 1)
+                        hit = day_slots[at] == slots
+                        price[hit] = day_prices[at[hit]]
+                block[:, cols[rows == row]] = price[:, None]
+        block[wanted[None, :] < first[slots][:, None]] = np.nan
+        out[known] = block[expand]
+        return out
+
+    def history(self, product_id, days: int = 60, end=None):
+        values = self.read([product_id], days, end)[0]
+        return pd.Series(values, index=pd.date_range(end=end or date.today(), periods=days))
+
+    def stats(self):
+        state = self._current()
+        if state is None:
+            return {"products": 0, "days": 0, "bytes": 0}
+        manifest = state[0]
+        files = [f for c in manifest["chunks"] for f in self.path.glob(f"{c['file']}.*")]
+        return {
+            "products": len(state[1]),
+            "days": manifest["last_day"] - manifest["first_day"] + 1,
+            "chunks": len(manifest["chunks"]),
+            "bytes": sum(f.stat().st_size for f in files),
+            "version": manifest["version"],
+        }
+
+    # ---- Writing ----
+    @timed("timeseries.record")
+    def record(self, ids, prices, day=None):
+        """Append one day's observed prices; recording the latest day again updates it. Returns the store version."""
+        day = day_number(day)
+        prices = np.asarray(prices, dtype=np.float64)
+        seen = np.isfinite(prices)
+        ids = np.asarray(ids, dtype=str)[seen]
+        prices = np.round(prices[seen], 2).astype(np.float32)
+        self.path.mkdir(parents=True, exist_ok=True)
+        with _locked(self.path):
+            manifest, ids_arr, order, first, head = self._load_for_write()
+            if manifest["last_day"] is not None and day < manifest["last_day"]:
+                raise ValueError(f"The store already has prices up to "
+                                 f"{np.datetime64(manifest['last_day'], 'D')}; days can only be appended")
+            ids, keep = np.unique(ids[::-1], return_index=True)  # the last price per id wins
+            prices = prices[::-1][keep]
+            slots = _slots(ids_arr, order, ids)
+            new = slots < 0
+            if new.any():
+                ids_arr, order = _append_ids(ids_arr, order, ids[new])
+                slots[new] = np.arange(len(head), len(ids_arr))
+                first = np.concatenate([first, np.full(new.sum(), _NEVER, dtype=np.int32)])
+                head = np.concatenate([head, np.full(new.sum(), np.nan, dtype=np.float32)])
+                save_atomic(self.path / "ids.npy", ids_arr)
+                save_atomic(self.path / "order.npy", order)
+            first[slots] = np.minimum(first[slots], day)
+            changed = prices != head[slots]  # NaN (never seen) compares unequal
+            by_slot = np.argsort(slots[changed])
+            head[slots[changed]] = prices[changed]
+            self._write_day(manifest, day, head, slots[changed][by_slot], prices[changed][by_slot])
+            save_atomic(self.path / "first.npy", first)
+            save_atomic(self.path / "head.npy", head)
+            manifest["first_day"] = day if manifest["first_day"] is None else manifest["first_day"]
+            manifest["last_day"] = day
+            manifest["version"] += 1
+            save_atomic(self.path / "manifest.json", json.dumps(manifest).encode())
+            return manifest["version"]
+
+    def snapshot(self, products: pd.DataFrame, day=None):
+        """Record the `price` column of the catalog (rows deleted by a delta are skipped)."""
+        alive = catalog_alive(products)
+        rows = np.flatnonzero(alive) if alive is not None else np.arange(len(products))
+        ids = products["id"].to_numpy()[rows].astype(str)
+        return self.record(ids, products["price"].to_numpy(dtype=np.float64)[rows], day)
+
+    def _load_for_write(self):
+        try:
+            manifest = json.loads((self.path / "manifest.json").read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            manifest = {"first_day": None, "last_day": None, "chunks": [], "next_chunk": 0, "version": 0}
+            return (manifest, np.empty(0, dtype=str), np.empty(0, dtype=np.int64),
+                    np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+        return (manifest, np.load(self.path / "ids.npy"), np.load(self.path / "order.npy"),
+                np.load(self.path / "first.npy"), np.load(self.path / "head.npy"))
+
+    def _write_day(self, manifest, day, head, slots, prices):
+        """Add the day's changes (sorted by slot) to the open chunk, or start a chunk from `head`."""
+        chunks = manifest["chunks"]
+        last = chunks[-1] if chunks else None
+        if last is not None and day == last["start"]:
+            # The chunk's first day, recorded again: start over from the updated head.
+            chunks.pop()
+            for f in self.path.glob(f"{last['file']}.*"):
+                f.unlink()
+            last = None
+        if last is None or day - last["start"] >= CHUNK_DAYS or len(head) > last["width"]:
+            name = f"chunk-{manifest['next_chunk']}"
+            manifest["next_chunk"] += 1
+            width = len(head) + max(1024, len(head) // 8)  # headroom for new products
+            base = np.full(width, np.nan, dtype=np.float32)
+            base[: len(head)] = head
+            save_atomic(self.path / f"{name}.base.npy", base)
+            for suffix in ("slots", "prices"):
+                (self.path / f"{name}.{suffix}").touch()
+            chunks.append({"file": name, "start": day, "days": 1, "width": width, "spans": [[0, 0]]})
+            return
+
+        spans = last["spans"]
+        # New entries go past every published span (bytes a crashed writer left there are overwritten).
+        start = max(end for _, end in spans)
+        if day == manifest["last_day"]:
+            # Recording the latest day again: merge with what it already changed.
+            lo, hi = spans.pop()
+            last["days"] -= 1
+            old_slots, old_prices = (np.fromfile(self.path / f"{last['file']}.{s}", dtype=t, count=hi - lo,
+                                                 offset=lo * 4)
+                                     for s, t in (("slots", np.int32), ("prices", np.float32)))
+            keep = ~np.isin(old_slots, slots)
+            merged = np.concatenate([old_slots[keep], slots])
+            by_slot = np.argsort(merged, kind="stable")
+            slots, prices = merged[by_slot], np.concatenate([old_prices[keep], prices])[by_slot]
+        for suffix, values in (("slots", slots.astype(np.int32)), ("prices", prices.astype(np.float32))):
+            with open(self.path / f"{last['file']}.{suffix}", "r+b") as f:
+                f.seek(start * 4)
+                f.write(values.tobytes())
+        # Days skipped since the last snapshot have no changes: the last prices carry over.
+        row = day - last["start"]
+        spans += [[start, start]] * (row - last["days"]) + [[start, start + len(slots)]]
+        last["days"] = row + 1
+
+
+def _mapped(path):
+    # Plain ndarray views of the maps: np.memmap's per-slice bookkeeping dominates small reads.
+    return np.load(path, mmap_mode="r").view(np.ndarray)
+
+
+def _slots(ids, order, wanted):
+    if not len(ids) or not len(wanted):
+        return np.full(len(wanted), -1, dtype=np.int64)
+    at = np.asarray(order)[np.minimum(np.searchsorted(ids, wanted, sorter=order), len(ids) - 1)]
+    return np.where(ids[at] == wanted, at, -1).astype(np.int64)
+
+
+def _append_ids(ids, order, new):
+    at = np.searchsorted(ids, new, sorter=order)  # `new` is sorted
+    order = np.insert(np.asarray(order), at, len(ids) + np.arange(len(new)))
+    return np.concatenate([ids, new]), order
+
+
+@contextmanager
+def _locked(path):
+    with open(Path(path) / ".write.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_store = None
+
+
+def price_store():
+    """The process-wide store at WISHDROP_PRICE_STORE."""
+    global _store
+    if _store is None:
+        _store = PriceStore()
+    return _store
+
+
+register_collector("price_store", lambda: price_store().stats())
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Record and inspect observed product prices.")
+    ap.add_argument("command", choices=["snapshot", "stats"])
+    ap.add_argument("--products", default=PRODUCTS_CSV, help="catalog source (CSV/Parquet) or store directory")
+    ap.add_argument("--store", default=PRICE_STORE, help="price store directory")
+    ap.add_argument("--day", default=None, help="snapshot date, YYYY-MM-DD (default: today)")
+    args = ap.parse_args(argv)
+    store = PriceStore(args.store)
+    if args.command == "snapshot":
+        products = load_products(args.products)
+        version = store.snapshot(products, args.day)
+        print(f"Recorded {len(products):,} prices for {args.day or date.today()} (store version {version})")
+    print(json.dumps(store.stats()))
+
+
+if __name__ == "__main__":
+    main()